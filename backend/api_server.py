@@ -1,20 +1,28 @@
 """
 FastAPI server for integrating sql_agent.py with the frontend
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response, PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import os
-from sql_agent import app as sql_agent_app
+from sql_agent import app as sql_agent_app, get_sql_cache_stats, get_fast_path_stats, query_engine, async_engine, discard_unmatched_check, memory, schema_index, rendered_sql
+from db_actions.query_engine import pool_metrics
+from db_actions.result_cache import result_cache
+from db_actions.geometry_lod import DETAIL_LEVELS, get_parcel
+from db_actions.tiles import valid_tile, get_tile, tile_cache, tile_disk_cache
+from result_sets import (
+    register_result_set, get_result_set, result_sets, result_rows, take_result_rows, discard_result_rows,
+    next_cursor, parse_cursor,
+)
+from db_actions.query_engine import fetch_result_page, execute_read_only
 from langchain_core.runnables import RunnableConfig
-from shapely.geometry import mapping as shapely_mapping
-from geoalchemy2.shape import to_shape
+from cancellation import SearchCancellation, SearchCancelled, current_search
+from metrics import SearchTiming, current_timing, render_metrics
 import json
 import uuid
 import asyncio
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 
 # Initialize FastAPI app
 api_app = FastAPI(title="Solar Parcel Search API")
@@ -83,8 +91,12 @@ api_app.add_middleware(
 class QueryRequest(BaseModel):
     query: str
     session_id: Optional[str] = None
+    stream: Optional[bool] = None  # Send rows as parcels_batch events; defaults to STREAM_RESULTS
+    detail: Optional[str] = None  # Geometry detail level (see DETAIL_LEVELS); defaults to SEARCH_DETAIL_LEVEL
+    page_size: Optional[int] = None  # Return the first page plus a result handle; defaults to SEARCH_PAGE_SIZE (0 = no paging)
 
 class ParcelResponse(BaseModel):
+    parcel_id: Optional[str] = None  # Key for /api/parcels/{parcel_id}
     address: str
     county: str
     acreage: float
@@ -93,7 +105,7 @@ class ParcelResponse(BaseModel):
     total_value: float
     capacity: float  # ground_mounted_capacity_kw
     explanation: str
-    geometry: Dict[str, Any]  # GeoJSON geometry - REQUIRED
+    geometry: str  # GeoJSON geometry text (decoded in db_utils.convert_result_rows or geometry_lod.decode_geometry) - REQUIRED
 
 class SearchResponse(BaseModel):
     parcels: List[ParcelResponse]
@@ -102,77 +114,25 @@ class SearchResponse(BaseModel):
     session_id: Optional[str] = None
 
 
-def convert_geometry_to_geojson(geom_data: Any) -> Optional[Dict[str, Any]]:
-    """Convert PostGIS geometry to GeoJSON dict"""
-    if geom_data is None:
-        return None
-    
-    # Already GeoJSON dict
-    if isinstance(geom_data, dict):
-        if 'type' in geom_data and 'coordinates' in geom_data:
-            # Ensure coordinates are lists, not tuples
-            return json.loads(json.dumps(geom_data))
-        return None
-    
-    # String - could be JSON or hex-encoded WKB
-    if isinstance(geom_data, str):
-        geom_data = geom_data.strip()
-        if not geom_data:
-            return None
-        
-        # Try parsing as JSON first
-        try:
-            parsed = json.loads(geom_data)
-            if isinstance(parsed, dict) and 'type' in parsed and 'coordinates' in parsed:
-                return json.loads(json.dumps(parsed))  # Convert tuples to lists
-        except:
-            pass
-        
-        # Try as hex-encoded WKB (PostGIS returns geometry as hex WKB string)
-        if len(geom_data) > 20:
-            try:
-                from shapely import wkb
-                shapely_geom = wkb.loads(geom_data, hex=True)
-                geo_json = shapely_mapping(shapely_geom)
-                if isinstance(geo_json, dict) and 'type' in geo_json and 'coordinates' in geo_json:
-                    # Convert tuples to lists (GeoJSON requires lists, not tuples)
-                    return json.loads(json.dumps(geo_json))
-            except:
-                try:
-                    from shapely import wkb
-                    shapely_geom = wkb.loads(geom_data)
-                    geo_json = shapely_mapping(shapely_geom)
-                    if isinstance(geo_json, dict) and 'type' in geo_json and 'coordinates' in geo_json:
-                        return json.loads(json.dumps(geo_json))
-                except:
-                    pass
-    
-    # PostGIS geometry object - convert to GeoJSON
-    try:
-        shapely_geom = to_shape(geom_data)
-        geo_json = shapely_mapping(shapely_geom)
-        if isinstance(geo_json, dict) and 'type' in geo_json and 'coordinates' in geo_json:
-            return json.loads(json.dumps(geo_json))
-    except:
-        try:
-            if hasattr(geom_data, '__geo_interface__'):
-                geo_json = geom_data.__geo_interface__
-                if isinstance(geo_json, dict) and 'type' in geo_json and 'coordinates' in geo_json:
-                    return json.loads(json.dumps(geo_json))
-        except:
-            pass
-        
-        try:
-            if isinstance(geom_data, bytes):
-                from shapely import wkb
-                shapely_geom = wkb.loads(geom_data)
-                geo_json = shapely_mapping(shapely_geom)
-                if isinstance(geo_json, dict) and 'type' in geo_json and 'coordinates' in geo_json:
-                    return json.loads(json.dumps(geo_json))
-        except:
-            pass
-    
-    return None
+def parcels_json(parcels: List[ParcelResponse]) -> str:
+    """Serialize parcels to a JSON array, splicing each GeoJSON geometry text in without re-parsing it"""
+    return "[" + ",".join(
+        json.dumps(parcel.model_dump(exclude={"geometry"}))[:-1] + ', "geometry": ' + parcel.geometry + "}"
+        for parcel in parcels
+    ) + "]"
+
+
+def json_with_parcels(payload: Dict[str, Any], parcels: Optional[List[ParcelResponse]] = None) -> str:
+    """Serialize payload, adding a "parcels" array when given"""
+    body = json.dumps(payload)
+    if parcels is not None:
+        body = body[:-1] + ', "parcels": ' + parcels_json(parcels) + "}"
+    return body
+
+
+def sse_event(payload: Dict[str, Any], parcels: Optional[List[ParcelResponse]] = None) -> str:
+    """Format an SSE data event, adding a "parcels" array when given"""
+    return f"data: {json_with_parcels(payload, parcels)}\n\n"
 
 
 def transform_row_to_parcel(row: Dict[str, Any], explanation: Optional[str] = None) -> Optional[ParcelResponse]:
@@ -194,16 +154,13 @@ def transform_row_to_parcel(row: Dict[str, Any], explanation: Optional[str] = No
         except:
             capacity = 0.0
         
-        # Convert geometry to GeoJSON - this is REQUIRED
-        geom_data = row.get('geometry')
-        if geom_data is None:
-            return None
-            
-        geo_json = convert_geometry_to_geojson(geom_data)
-        if not geo_json:
+        # GeoJSON geometry text is REQUIRED
+        geo_json = row.get('geometry')
+        if not isinstance(geo_json, str) or not geo_json:
             return None
         
         return ParcelResponse(
+            parcel_id=row.get('parcel_id'),
             address=address,
             county=county,
             acreage=acreage,
@@ -232,42 +189,179 @@ async def search_parcels_options():
         }
     )
 
+# Stream result rows in batches (parcels_batch events) unless the request says otherwise
+STREAM_RESULTS = os.getenv("STREAM_RESULTS", "false").lower() == "true"
+# Geometry detail level for search results unless the request says otherwise
+SEARCH_DETAIL_LEVEL = os.getenv("SEARCH_DETAIL_LEVEL", "full")
+# Parcels per page when results are paged through /api/results/{handle} (0 = return everything)
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "0"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+def resolve_page_size(page_size: Optional[int], default: int) -> int:
+    page_size = default if page_size is None else page_size
+    if page_size < 0 or page_size > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"page_size must be between 0 and {MAX_PAGE_SIZE}")
+    return page_size
+
+def resolve_detail_level(detail: Optional[str]) -> str:
+    detail_level = detail or SEARCH_DETAIL_LEVEL
+    if detail_level not in DETAIL_LEVELS:
+        raise HTTPException(status_code=400, detail=f"Unknown detail level '{detail_level}'; expected one of {list(DETAIL_LEVELS)}")
+    return detail_level
+
+def rows_to_parcels(rows, explanation):
+    """Transform result rows to parcels, dropping rows without geometry"""
+    parcels = []
+    for row in rows:
+        parcel = transform_row_to_parcel(dict(row), explanation)
+        if parcel:
+            parcels.append(parcel)
+    return parcels
+
 # Map node names to user-friendly step names
 STEP_NAMES = {
+    "parse_fast_path": "Parsing query",
+    "parallel_front_end": "Analyzing query",
+    "fused_front_end": "Analyzing query",
     "topic_filter": "Checking topic relevance",
     "contextual_query_understanding": "Constructing contextual query",
     "resolve_vague_conditions": "Resolving vague conditions",
+    "lookup_cached_sql": "Checking query cache",
     "generate_sql": "Generating SQL query",
+    "check_sql_plan": "Checking query plan",
     "execute_sql": "Executing query",
     "validate_sql": "Validating results",
     "repair_sql": "Repairing SQL query",
     "display_results": "Finalizing results"
 }
 
-async def stream_search_parcels(request: QueryRequest):
+# How often a running search checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+
+class ClientDisconnected(Exception):
+    pass
+
+async def wait_for_disconnect(http_request: Request):
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+async def until_disconnected(events, http_request: Optional[Request]):
+    """
+    Relay graph events until the client disconnects, then raise ClientDisconnected.
+    The pending step is cancelled, which cancels the graph's running async nodes
+    (and their outstanding llm.ainvoke calls).
+    """
+    if http_request is None:
+        async for event in events:
+            yield event
+        return
+    watcher = asyncio.create_task(wait_for_disconnect(http_request))
+    try:
+        while True:
+            next_event = asyncio.ensure_future(events.__anext__())
+            await asyncio.wait({next_event, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_event.done():
+                next_event.cancel()
+                await asyncio.gather(next_event, return_exceptions=True)
+                raise ClientDisconnected()
+            try:
+                event = next_event.result()
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        watcher.cancel()
+        await events.aclose()
+
+def cancel_search(search: SearchCancellation, config: RunnableConfig):
+    """Stop an abandoned search: no new nodes, no unmatched-conditions check, cancel running statements"""
+    print(f"🛑 Client disconnected, cancelling search {search.search_id}")
+    discard_unmatched_check(config)
+    try:
+        # pg_cancel_backend needs a round trip; don't hold up the event loop for it
+        asyncio.get_running_loop().run_in_executor(None, search.cancel, query_engine)
+    except RuntimeError:
+        search.cancel(query_engine)  # Generator finalized outside the event loop
+
+async def hydrate_results(final_state: Dict[str, Any], page_size: int, detail_level: str):
+    """Rows behind the final state's result_ref, re-fetched if they expired before the graph finished"""
+    rows = take_result_rows(final_state.get('result_ref'))
+    if rows is not None or not final_state.get('result_count'):
+        return rows or []
+    print(f"Result rows {final_state.get('result_ref')} expired; fetching them again")
+    if page_size and final_state.get('result_handle'):
+        parcel_ids = get_result_set(final_state['result_handle']) or []
+        return await asyncio.to_thread(fetch_result_page, query_engine, parcel_ids[:page_size], detail_level)
+    rows, _ = await asyncio.to_thread(
+        execute_read_only, query_engine, final_state['sql_query'], detail_level, final_state.get('sql_params')
+    )
+    return rows or []
+
+async def stream_search_parcels(request: QueryRequest, http_request: Optional[Request] = None):
     """Stream search for parcels with real-time status updates"""
     session_id = request.session_id or str(uuid.uuid4())
-    config = RunnableConfig(configurable={"thread_id": session_id})
+    page_size = resolve_page_size(request.page_size, SEARCH_PAGE_SIZE)
+    # A paged search only sends its first page, so there is nothing to stream
+    stream_rows = (STREAM_RESULTS if request.stream is None else request.stream) and not page_size
+    detail_level = resolve_detail_level(request.detail)
+    config = RunnableConfig(configurable={
+        "thread_id": session_id,
+        # Identifies this search among others in the same session (see sql_agent.pending_unmatched_checks)
+        "run_id": str(uuid.uuid4()),
+        "stream_rows": stream_rows,
+        "detail_level": detail_level,
+        "page_size": page_size,
+    })
     
-    # Build state matching SQLState TypedDict
+    # Build state matching SQLState TypedDict; refinement_base is left out so it carries over from the previous turn
     state = {
         "user_query": request.query,
         "expanded_query": None,
         "sql_query": None,
+        "sql_params": None,
+        "filter_spec": None,
         "results": None,
+        "result_ref": None,
+        "result_count": None,
+        "result_handle": None,
         "error": None,
         "last_failed_sql": None,
         "attempt": 0,
+        "sql_cache_hit": None,
+        "fast_path": None,
+        "unmatched_conditions_warning": None,
         "conversation": []
     }
     
+    search = SearchCancellation(session_id)
+    timing = SearchTiming()
+
     async def generate():
+        # Context variables set here are inherited by the graph's tasks and executor threads
+        current_search.set(search)
+        current_timing.set(timing)
         try:
             # Stream the graph execution
             final_state = None
+            streamed_count = 0  # Parcels already sent in parcels_batch events
+            streamed_ids = []  # Their parcel_ids, registered as the result set for map tiles
             # Use astream_events for better streaming support
             try:
-                async for event in sql_agent_app.astream_events(state, config, version="v2"):
+                async for event in until_disconnected(sql_agent_app.astream_events(state, config, version="v2"), http_request):
+                    # Row batches dispatched by execute_sql in streaming mode
+                    if event.get("event") == "on_custom_event":
+                        if event.get("name") == "parcels_batch":
+                            batch = rows_to_parcels(event["data"]["rows"], None)
+                            streamed_count += len(batch)
+                            streamed_ids.extend(parcel.parcel_id for parcel in batch)
+                            if batch:
+                                yield sse_event({'type': 'parcels_batch'}, batch)
+                        elif event.get("name") == "parcels_reset":
+                            streamed_count = 0
+                            streamed_ids = []
+                            yield f"data: {json.dumps({'type': 'parcels_reset'})}\n\n"
+                        continue
+
                     # Check if this is a node start event
                     if event.get("event") == "on_chain_start" and "name" in event:
                         node_name = event.get("name", "")
@@ -280,14 +374,17 @@ async def stream_search_parcels(request: QueryRequest):
                     # Collect final state from events
                     if event.get("event") == "on_chain_end" and "data" in event:
                         event_data = event.get("data", {})
-                        if isinstance(event_data, dict):
+                        # Route functions also emit chain events, with a node name string as output
+                        if isinstance(event_data, dict) and isinstance(event_data.get("output"), dict):
                             if final_state is None:
                                 final_state = {}
-                            final_state.update(event_data.get("output", {}))
+                            final_state.update(event_data["output"])
+            except (ClientDisconnected, SearchCancelled):
+                raise
             except Exception as stream_error:
                 # Fallback to regular stream if astream_events doesn't work
                 print(f"astream_events failed, trying astream: {stream_error}")
-                async for chunk in sql_agent_app.astream(state, config):
+                async for chunk in until_disconnected(sql_agent_app.astream(state, config), http_request):
                     # chunk is a dict with node names as keys
                     for node_name, node_output in chunk.items():
                         if node_name in STEP_NAMES:
@@ -307,15 +404,13 @@ async def stream_search_parcels(request: QueryRequest):
             
             # After streaming is complete, get final state
             # If we didn't collect enough state from streaming, invoke once more to get final state
-            if final_state is None or not final_state.get('results'):
-                # Fallback: invoke synchronously to get final state
-                with ThreadPoolExecutor(max_workers=1) as executor:
-                    future = executor.submit(sql_agent_app.invoke, state, config)
-                    final_state = future.result(timeout=60)
+            if final_state is None or not final_state.get('result_count'):
+                # Fallback: invoke once more to get final state (ainvoke works for sync and async nodes)
+                final_state = await asyncio.wait_for(sql_agent_app.ainvoke(state, config), timeout=60)
             
             # Process final state and send results
-            sql_query = final_state.get('sql_query')
-            results = final_state.get('results')
+            # Parameterized SQL is shown with its values inlined
+            sql_query = rendered_sql(final_state) or None
             error = final_state.get('error')
             vague_conditions = final_state.get('vague_conditions', [])
             unmatched_warning = final_state.get('unmatched_conditions_warning')
@@ -344,17 +439,13 @@ async def stream_search_parcels(request: QueryRequest):
                             explanation = content
                             break
                 
-                yield f"data: {json.dumps({'type': 'result', 'parcels': [], 'summary': explanation or 'Please clarify vague conditions in your query.', 'sql': None, 'session_id': session_id})}\n\n"
+                yield f"data: {json.dumps({'type': 'result', 'parcels': [], 'summary': explanation or 'Please clarify vague conditions in your query.', 'sql': None, 'session_id': session_id, 'timing': timing.finish()})}\n\n"
                 return
             
             if error:
-                yield f"data: {json.dumps({'type': 'result', 'parcels': [], 'summary': f'Error: {error}', 'sql': sql_query, 'session_id': session_id})}\n\n"
+                yield f"data: {json.dumps({'type': 'result', 'parcels': [], 'summary': f'Error: {error}', 'sql': sql_query, 'session_id': session_id, 'timing': timing.finish()})}\n\n"
                 return
             
-            # Ensure results is a list
-            if results is None:
-                results = []
-            
             # Extract explanation from conversation
             explanation = ""
             conversation = final_state.get('conversation', [])
@@ -379,24 +470,29 @@ async def stream_search_parcels(request: QueryRequest):
                                     explanation = content
                                     break
             
-            # Convert all geometries to GeoJSON and transform to parcels
-            parcels = []
-            for row in results:
-                if not isinstance(row, dict):
-                    row_dict = {}
-                    for key, value in row.items():
-                        row_dict[key] = value
-                    row = row_dict
-                else:
-                    row = dict(row)
-                
-                parcel = transform_row_to_parcel(row, explanation)
-                if parcel:
-                    parcels.append(parcel)
+            cursor = None
+            if page_size:
+                # First page only; the rest is fetched from /api/results/{result_id}
+                parcels = rows_to_parcels(await hydrate_results(final_state, page_size, detail_level), explanation)
+                parcel_count = final_state.get('result_count') or len(parcels)
+                result_id = final_state.get('result_handle')
+                # No result set if the query couldn't be paged by parcel_id; then every row is in this page
+                cursor = next_cursor(0, page_size, parcel_count) if result_id else None
+            # Rows were already sent in parcels_batch events; the result event only carries the summary
+            elif stream_rows:
+                discard_result_rows(final_state.get('result_ref'))
+                parcels = []
+                parcel_count = streamed_count
+                # Already registered when kept as the session's refinement base
+                result_id = final_state.get('result_handle') or register_result_set(streamed_ids)
+            else:
+                parcels = rows_to_parcels(await hydrate_results(final_state, page_size, detail_level), explanation)
+                parcel_count = len(parcels)
+                result_id = final_state.get('result_handle') or register_result_set(parcel.parcel_id for parcel in parcels)
             
             # Generate summary
-            if parcels:
-                summary = f"Found {len(parcels)} parcel{'s' if len(parcels) != 1 else ''} matching your criteria."
+            if parcel_count:
+                summary = f"Found {parcel_count} parcel{'s' if parcel_count != 1 else ''} matching your criteria."
                 if explanation and explanation != user_query and explanation != expanded_query:
                     if not explanation.startswith(user_query) and not explanation.startswith(expanded_query):
                         summary += f" {explanation}"
@@ -413,15 +509,20 @@ async def stream_search_parcels(request: QueryRequest):
                 else:
                     summary = unmatched_warning
             
-            # Convert ParcelResponse objects to dictionaries for JSON serialization
-            parcels_dict = [parcel.model_dump() if hasattr(parcel, 'model_dump') else parcel.dict() if hasattr(parcel, 'dict') else parcel for parcel in parcels]
-            
             # Get SQL explanation from state (generated in sql_agent.py)
             sql_explanation = final_state.get('sql_explanation', '')
             
             # Send final result
-            yield f"data: {json.dumps({'type': 'result', 'parcels': parcels_dict, 'summary': summary, 'sql': sql_query, 'sql_explanation': sql_explanation, 'session_id': session_id})}\n\n"
+            yield sse_event({'type': 'result', 'streamed': stream_rows, 'total': parcel_count, 'result_id': result_id, 'next_cursor': cursor, 'summary': summary, 'sql': sql_query, 'sql_explanation': sql_explanation, 'session_id': session_id, 'timing': timing.finish()}, parcels)
             
+        except ClientDisconnected:
+            cancel_search(search, config)
+        except SearchCancelled:
+            pass
+        except (asyncio.CancelledError, GeneratorExit):
+            # The server cancels or closes the response stream itself when it sees the disconnect
+            cancel_search(search, config)
+            raise
         except Exception as e:
             import traceback
             error_traceback = traceback.format_exc()
@@ -440,10 +541,10 @@ async def stream_search_parcels(request: QueryRequest):
     )
 
 @api_app.post("/api/search")
-async def search_parcels(request: QueryRequest):
+async def search_parcels(request: QueryRequest, http_request: Request):
     """Search for parcels using natural language query (streaming version)"""
     print(f"Received POST request to /api/search with query: {request.query}")
-    return await stream_search_parcels(request)
+    return await stream_search_parcels(request, http_request)
 
 
 @api_app.get("/api/test")
@@ -456,6 +557,71 @@ async def test_post_endpoint():
     """Simple POST test endpoint to verify POST routing"""
     return {"message": "POST is working", "status": "ok"}
 
+@api_app.get("/api/parcels/{parcel_id}")
+def get_parcel_details(parcel_id: str):
+    """Single parcel with full-resolution geometry, fetched when a parcel is selected on the map"""
+    with query_engine.connect() as con:
+        row = get_parcel(con, parcel_id)
+    parcel = transform_row_to_parcel(row) if row else None
+    if parcel is None:
+        raise HTTPException(status_code=404, detail=f"Parcel '{parcel_id}' not found")
+    # parcels_json splices the GeoJSON text in as-is
+    return Response(content=parcels_json([parcel])[1:-1], media_type="application/json")
+
+@api_app.get("/api/results/{handle}")
+def get_results_page(handle: str, cursor: Optional[str] = None, page_size: Optional[int] = None, detail: Optional[str] = None):
+    """Next page of a search's results, using the result_id and next_cursor from the search"""
+    page_size = resolve_page_size(page_size, SEARCH_PAGE_SIZE) or MAX_PAGE_SIZE
+    detail_level = resolve_detail_level(detail)
+    parcel_ids = get_result_set(handle)
+    if parcel_ids is None:
+        raise HTTPException(status_code=404, detail=f"Result set '{handle}' not found or expired")
+    try:
+        offset = parse_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor '{cursor}'")
+    rows = fetch_result_page(query_engine, parcel_ids[offset:offset + page_size], detail_level)
+    payload = {
+        "result_id": handle,
+        "total": len(parcel_ids),
+        "next_cursor": next_cursor(offset, page_size, len(parcel_ids)),
+    }
+    return Response(content=json_with_parcels(payload, rows_to_parcels(rows, None)), media_type="application/json")
+
+@api_app.get("/api/tiles/{result_id}/{z}/{x}/{y}.pbf")
+def get_result_tile(result_id: str, z: int, x: int, y: int):
+    """Mapbox Vector Tile of a search's result parcels (layer "parcels")"""
+    if not valid_tile(z, x, y):
+        raise HTTPException(status_code=400, detail=f"Invalid tile {z}/{x}/{y}")
+    parcel_ids = get_result_set(result_id)
+    if parcel_ids is None:
+        raise HTTPException(status_code=404, detail=f"Result set '{result_id}' not found or expired")
+    tile = get_tile(query_engine, result_id, parcel_ids, z, x, y)
+    # A result set never changes, so browsers can cache its tiles too
+    return Response(
+        content=tile,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={"Cache-Control": "public, max-age=86400, immutable"},
+    )
+
+@api_app.get("/api/cache")
+async def cache_stats():
+    """Hit/miss statistics for the query caches"""
+    return {
+        "generated_sql": get_sql_cache_stats(),
+        "fast_path": get_fast_path_stats(),
+        "query_results": result_cache.stats(),
+        "result_sets": result_sets.stats(),
+        "result_rows": result_rows.stats(),
+        "tiles": tile_cache.stats(),
+        "tiles_disk": tile_disk_cache.stats(),
+    }
+
+@api_app.get("/api/metrics")
+async def prometheus_metrics():
+    """Search, graph node, LLM, query and geometry timing histograms in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @api_app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
@@ -488,6 +654,10 @@ async def health_check():
         "status": "ok" if sql_agent_loaded else "error",
         "environment_variables": env_vars if 'env_vars' in locals() else {},
         "sql_agent_loaded": sql_agent_loaded,
+        "query_pool": pool_metrics(query_engine),
+        "async_query_pool": pool_metrics(async_engine),
+        "sessions": memory.stats(),
+        "schema_retrieval": schema_index.stats(),
         "error": error,
         "traceback": traceback_str
     }
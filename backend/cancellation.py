@@ -0,0 +1,113 @@
+"""
+Cancellation of abandoned searches.
+
+api_server sets current_search for the duration of a /api/search request. Work started
+from inside the request (graph nodes, query execution) finds it through the context
+variable: nodes refuse to start once the search is cancelled, and query_engine registers
+the Postgres backend running each statement so it can be stopped with pg_cancel_backend.
+"""
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import text
+import asyncio
+import threading
+
+CANCEL_BACKEND_SQL = text("SELECT pg_cancel_backend(pid) FROM unnest(CAST(:pids AS integer[])) AS pid")
+
+
+class SearchCancelled(Exception):
+    """Raised in place of starting new work for a search whose client has gone away"""
+
+
+class SearchCancellation:
+    """Cancellation flag and running Postgres backends for one search request"""
+
+    def __init__(self, search_id: str):
+        self.search_id = search_id
+        self._cancelled = threading.Event()
+        self._backend_pids = set()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise SearchCancelled(f"Search {self.search_id} was cancelled")
+
+    def add_backend(self, pid: int) -> None:
+        with self._lock:
+            self.raise_if_cancelled()
+            self._backend_pids.add(pid)
+
+    def remove_backend(self, pid: int) -> None:
+        with self._lock:
+            self._backend_pids.discard(pid)
+
+    def cancel(self, engine) -> int:
+        """Mark the search cancelled and cancel its running statements; returns the number of backends signalled"""
+        with self._lock:
+            self._cancelled.set()
+            if not self._backend_pids:
+                return 0
+        pids = []
+        try:
+            # Connect before taking the lock: the search's own connections can't go back to the
+            # pool while it is held, so waiting for a pooled connection under it could deadlock
+            with engine.connect() as con:
+                # Hold the lock through pg_cancel_backend so a backend whose statement just finished
+                # can't be returned to the pool, and picked up by another search, before it is signalled
+                with self._lock:
+                    pids = sorted(self._backend_pids)
+                    if not pids:
+                        return 0
+                    con.execute(CANCEL_BACKEND_SQL, {"pids": pids})
+        except Exception as e:
+            print(f"Could not cancel backends {pids} for search {self.search_id}: {e}")
+            return 0
+        print(f"🛑 Cancelled {len(pids)} running statement(s) for search {self.search_id}")
+        return len(pids)
+
+
+current_search: ContextVar[Optional[SearchCancellation]] = ContextVar("current_search", default=None)
+
+
+def raise_if_cancelled() -> None:
+    search = current_search.get()
+    if search is not None:
+        search.raise_if_cancelled()
+
+
+@contextmanager
+def cancellable_backend(con):
+    """Register the backend of a sync connection with the current search while a statement runs"""
+    search = current_search.get()
+    if search is None:
+        yield
+        return
+    pid = con.connection.driver_connection.get_backend_pid()
+    search.add_backend(pid)
+    try:
+        yield
+    finally:
+        search.remove_backend(pid)
+
+
+@asynccontextmanager
+async def acancellable_backend(con):
+    """cancellable_backend for an async (asyncpg) connection"""
+    search = current_search.get()
+    if search is None:
+        yield
+        return
+    raw = await con.get_raw_connection()
+    pid = raw.driver_connection.get_server_pid()
+    # The registry lock is held through a cancel's pg_cancel_backend round trip, so take it
+    # off the event loop rather than stall every other search while waiting for it
+    await asyncio.to_thread(search.add_backend, pid)
+    try:
+        yield
+    finally:
+        await asyncio.to_thread(search.remove_backend, pid)
@@ -0,0 +1,222 @@
+"""
+Bounded LangGraph checkpointer for conversation sessions.
+
+BoundedMemorySaver is an InMemorySaver that tracks when each thread (session) was
+last used. Sessions idle for longer than ttl_seconds are dropped, and once more than
+max_sessions are held the least recently used one is evicted. With a SQLite path,
+evicted sessions are spilled to disk instead of dropped and restored on their next
+request; the file is compacted periodically (expired sessions deleted, free pages
+returned to the filesystem).
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from langgraph.checkpoint.memory import InMemorySaver
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+
+class SQLiteSessionStore:
+    """Serialized sessions in a SQLite file, keyed by thread_id"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Callers serialize access (BoundedMemorySaver holds its lock around every call)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # auto_vacuum only takes effect before the first table is created
+        self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "thread_id TEXT PRIMARY KEY, last_access REAL NOT NULL, data BLOB NOT NULL)"
+        )
+
+    def save(self, thread_id: str, data: bytes, last_access: float) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (thread_id, last_access, data) VALUES (?, ?, ?)",
+            (thread_id, last_access, data),
+        )
+
+    def take(self, thread_id: str) -> Optional[tuple]:
+        """Remove and return (data, last_access) for a session, or None"""
+        row = self._conn.execute(
+            "SELECT data, last_access FROM sessions WHERE thread_id = ?", (thread_id,)
+        ).fetchone()
+        if row is not None:
+            self.delete(thread_id)
+        return row
+
+    def delete(self, thread_id: str) -> None:
+        self._conn.execute("DELETE FROM sessions WHERE thread_id = ?", (thread_id,))
+
+    def compact(self, oldest_last_access: float) -> int:
+        """Delete sessions last used before oldest_last_access and release the freed pages"""
+        deleted = self._conn.execute("DELETE FROM sessions WHERE last_access < ?", (oldest_last_access,)).rowcount
+        self._conn.execute("PRAGMA incremental_vacuum")
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        sessions = self._conn.execute("SELECT count(*) FROM sessions").fetchone()[0]
+        page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        return {"path": self.path, "sessions": sessions, "bytes": page_count * page_size}
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """InMemorySaver with a per-session TTL, LRU eviction and an optional SQLite spill store"""
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl_seconds: Optional[float] = None,
+        sqlite_path: Optional[str] = None,
+        compact_interval_seconds: float = 600,
+    ):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.compact_interval_seconds = compact_interval_seconds
+        self.store = SQLiteSessionStore(sqlite_path) if sqlite_path else None
+        # thread_id -> last access (wall clock, so it stays meaningful on disk), least recent first
+        self._sessions: "OrderedDict[str, float]" = OrderedDict()
+        # Re-entrant: eviction calls delete_thread while the lock is held
+        self._lock = threading.RLock()
+        self._last_compaction = time.time()
+        self.evictions = 0
+        self.expirations = 0
+        self.restores = 0
+
+    # --- session bookkeeping ---
+
+    def _expired(self, last_access: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - last_access > self.ttl_seconds
+
+    def _export(self, thread_id: str) -> bytes:
+        return pickle.dumps({
+            "storage": {ns: dict(checkpoints) for ns, checkpoints in self.storage.get(thread_id, {}).items()},
+            "writes": {k: v for k, v in self.writes.items() if k[0] == thread_id},
+            "blobs": {k: v for k, v in self.blobs.items() if k[0] == thread_id},
+        })
+
+    def _restore(self, thread_id: str, now: float) -> Optional[float]:
+        row = self.store.take(thread_id)
+        if row is None:
+            return None
+        data, last_access = row
+        if self._expired(last_access, now):
+            self.expirations += 1
+            return None
+        session = pickle.loads(data)
+        for ns, checkpoints in session["storage"].items():
+            self.storage[thread_id][ns].update(checkpoints)
+        self.writes.update(session["writes"])
+        self.blobs.update(session["blobs"])
+        self.restores += 1
+        return last_access
+
+    def _drop(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+
+    def _touch(self, thread_id: str) -> None:
+        """Mark a session used, restoring it from disk if needed, then enforce the TTL and size bound"""
+        now = time.time()
+        if thread_id not in self._sessions and self.store is not None:
+            self._restore(thread_id, now)
+        self._sessions[thread_id] = now
+        self._sessions.move_to_end(thread_id)
+
+        # Least recently used first, so expired sessions are all at the front
+        while self._sessions:
+            oldest_id, last_access = next(iter(self._sessions.items()))
+            if not self._expired(last_access, now):
+                break
+            self._sessions.popitem(last=False)
+            self._drop(oldest_id)
+            self.expirations += 1
+
+        while len(self._sessions) > self.max_sessions:
+            oldest_id, last_access = self._sessions.popitem(last=False)
+            if self.store is not None:
+                self.store.save(oldest_id, self._export(oldest_id), last_access)
+            self._drop(oldest_id)
+            self.evictions += 1
+
+        if self.store is not None and self.ttl_seconds is not None and now - self._last_compaction > self.compact_interval_seconds:
+            self.expirations += self.store.compact(now - self.ttl_seconds)
+            self._last_compaction = now
+
+    @staticmethod
+    def _thread_id(config) -> Optional[str]:
+        return (config or {}).get("configurable", {}).get("thread_id")
+
+    # --- checkpointer interface (the async methods of InMemorySaver call these) ---
+
+    def get_tuple(self, config):
+        with self._lock:
+            self._touch(self._thread_id(config))
+            return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        with self._lock:
+            if self._thread_id(config) is not None:
+                self._touch(self._thread_id(config))
+            # Materialized under the lock so eviction can't change storage mid-iteration
+            items = [*super().list(config, filter=filter, before=before, limit=limit)]
+        yield from items
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            self._touch(self._thread_id(config))
+            return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._lock:
+            self._touch(self._thread_id(config))
+            return super().put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(thread_id, None)
+            if self.store is not None:
+                self.store.delete(thread_id)
+            self._drop(thread_id)
+
+    def flush(self) -> None:
+        """Write every in-memory session to the SQLite store (e.g. at shutdown)"""
+        if self.store is None:
+            return
+        with self._lock:
+            for thread_id, last_access in self._sessions.items():
+                self.store.save(thread_id, self._export(thread_id), last_access)
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the serialized checkpoints, writes and channel values held in memory"""
+        with self._lock:
+            checkpoint_bytes = sum(
+                len(checkpoint[1]) + len(metadata[1])
+                for namespaces in self.storage.values()
+                for checkpoints in namespaces.values()
+                for checkpoint, metadata, _ in checkpoints.values()
+            )
+            write_bytes = sum(len(write[2][1]) for writes in self.writes.values() for write in writes.values())
+            blob_bytes = sum(len(blob[1]) for blob in self.blobs.values())
+        return checkpoint_bytes + write_bytes + blob_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        """Session counts and memory footprint for /api/health"""
+        with self._lock:
+            stats = {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl_seconds,
+                "memory_bytes": self.memory_bytes(),
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "restores": self.restores,
+                "disk": self.store.stats() if self.store is not None else None,
+            }
+        return stats
@@ -2,7 +2,11 @@ import geopandas as gpd
 from sqlalchemy import create_engine
 import psycopg2
 import os
+import sys
 import dotenv
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from db_actions.result_cache import bump_data_generation
 
 dotenv.load_dotenv()
 
@@ -55,6 +59,10 @@ if GEOGRAPHIC_FEATURES and INFRASTRUCTURE_FEATURES and PARCELS:
 # conn = psycopg2.connect(dbname=db_name, user=user, password=password, host=host, port=port)
 cur = conn.cursor()
 
+# Data generation counters used by the API result cache
+with open("sql/data_generations.sql", "r") as f:
+    cur.execute(f.read())
+
 # Recreate geographic_features tables
 if GEOGRAPHIC_FEATURES:
     print("** Recreating geographic_features tables **")
@@ -62,6 +70,19 @@ if GEOGRAPHIC_FEATURES:
     with open(sql_geographic_features, "r") as f:
         sql = f.read()
     cur.execute(sql)
+    bump_data_generation(cur, [
+        "geographic_features.land_cover",
+        "geographic_features.land_use",
+        "geographic_features.flood_zones",
+        "geographic_features.open_spaces",
+        "geographic_features.priority_habitats",
+        "geographic_features.prime_farmland_soils",
+        "geographic_features.land_cover_subdivided",
+        "geographic_features.flood_zones_subdivided",
+        "geographic_features.open_spaces_subdivided",
+        "geographic_features.priority_habitats_subdivided",
+        "geographic_features.prime_farmland_soils_subdivided",
+    ])
 
 if PARCELS:
     print("** Recreating parcels tables **")
@@ -69,6 +90,7 @@ if PARCELS:
     with open(sql_parcels, "r") as f:
         sql = f.read()
     cur.execute(sql)
+    bump_data_generation(cur, ["parcels.parcel_details", "parcels.parcel_geometry_lod"])
 
 if INFRASTRUCTURE_FEATURES:
     print("** Recreating infrastructure tables **")
@@ -76,6 +98,26 @@ if INFRASTRUCTURE_FEATURES:
     with open(sql_infrastructure, "r") as f:
         sql = f.read()
     cur.execute(sql)
+    bump_data_generation(cur, [
+        "infrastructure_features.infrastructure",
+        "infrastructure_features.transportation",
+    ])
+
+# Derived from parcels and infrastructure, so recreated when either side is
+if PARCELS or INFRASTRUCTURE_FEATURES:
+    print("** Recreating parcel proximity table **")
+    with open("sql/parcel_proximity.sql", "r") as f:
+        sql = f.read()
+    cur.execute(sql)
+    bump_data_generation(cur, ["parcels.parcel_proximity"])
+
+# Derived from parcels and geographic features; filled by populate_tables.py
+if PARCELS or GEOGRAPHIC_FEATURES:
+    print("** Recreating parcel constraints table **")
+    with open("sql/parcel_constraints.sql", "r") as f:
+        sql = f.read()
+    cur.execute(sql)
+    bump_data_generation(cur, ["parcels.parcel_constraints"])
 
 conn.commit()
 cur.close()
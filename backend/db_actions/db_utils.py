@@ -1,37 +1,156 @@
 from sqlalchemy import text
-from geoalchemy2.shape import to_shape
-from shapely.geometry import mapping as shapely_mapping
+from db_actions.query_log import record_query, should_explain, explain, aexplain
+from db_actions.sql_params import prepared_statement
+from metrics import record_db_query, record_geometry_serialization
+import numpy as np
+import shapely
 import json
+import os
+import time
 
-def run_query(sql: str, con):
+# Parameterized statements run as PREPARE/EXECUTE on psycopg2 connections so Postgres can
+# reuse their plan (asyncpg prepares and caches statements itself). Turn off behind a
+# transaction-mode connection pooler, which doesn't keep session state between transactions.
+PREPARED_STATEMENTS = os.getenv("PREPARED_STATEMENTS", "true").lower() == "true"
+
+
+def _execute_prepared(sql: str, con, params):
+    """EXECUTE a parameterized statement, PREPAREd once per database connection"""
+    name, body, names = prepared_statement(sql)
+    # connection.info lives as long as the DBAPI connection, like the prepared statement
+    prepared = con.connection.info.setdefault("prepared_statements", set())
+    if name not in prepared:
+        con.execute(text(f"PREPARE {name} AS {body}"))
+        prepared.add(name)
+    args = f"({', '.join(':' + n for n in names)})" if names else ""
+    return con.execute(text(f"EXECUTE {name}{args}"), params)
+
+
+def run_query(sql: str, con, params=None, decode_geometry=True):
+    start = time.perf_counter()
+    try:
+        print(f'Query being run: {sql} \n\n')
+        if params and PREPARED_STATEMENTS:
+            results = _execute_prepared(sql, con, params).mappings().all()
+        else:
+            results = con.execute(text(sql), params or {}).mappings().all()
+        rows, error = convert_result_rows(results, decode_geometry), None
+    except Exception as e:
+        print("Error running query: ", str(e))
+        rows, error = None, str(e)
+    duration_ms = (time.perf_counter() - start) * 1000
+    record_db_query(duration_ms / 1000, len(rows) if rows is not None else None)
+    plan = explain(con, sql, params) if should_explain(duration_ms, error) else None
+    record_query(sql, duration_ms, len(rows) if rows is not None else None, error, plan, params)
+    return rows, error
+
+
+async def arun_query(sql: str, con, params=None, decode_geometry=True):
+    """run_query for an async (asyncpg) connection"""
+    start = time.perf_counter()
     try:
         print(f'Query being run: {sql} \n\n')
-        results = con.execute(text(sql)).mappings().all()
-        
-        # Convert PostGIS geometry objects to GeoJSON for serialization
-        converted_results = []
-        for row in results:
-            row_dict = dict(row)
-            # Check if geometry column exists and convert it
-            if 'geometry' in row_dict and row_dict['geometry'] is not None:
-                geom = row_dict['geometry']
-                # If it's already a string (hex WKB), leave it as-is for api_server to handle
-                # If it's a PostGIS object, convert to GeoJSON
-                if not isinstance(geom, str):
-                    try:
-                        shapely_geom = to_shape(geom)
-                        geo_json = shapely_mapping(shapely_geom)
-                        # Convert tuples to lists
-                        row_dict['geometry'] = json.loads(json.dumps(geo_json))
-                    except:
-                        # If conversion fails, keep original
-                        pass
-            converted_results.append(row_dict)
-        
-        return converted_results, None
+        results = (await con.execute(text(sql), params or {})).mappings().all()
+        rows, error = convert_result_rows(results, decode_geometry), None
     except Exception as e:
         print("Error running query: ", str(e))
-        return None, str(e)
+        rows, error = None, str(e)
+    duration_ms = (time.perf_counter() - start) * 1000
+    record_db_query(duration_ms / 1000, len(rows) if rows is not None else None)
+    plan = await aexplain(con, sql, params) if should_explain(duration_ms, error) else None
+    record_query(sql, duration_ms, len(rows) if rows is not None else None, error, plan, params)
+    return rows, error
+
+
+def iter_query_batches(sql: str, con, batch_size: int, params=None, decode_geometry=True):
+    """Yield converted rows in fixed-size batches from a server-side cursor"""
+    print(f'Query being streamed: {sql} \n\n')
+    # Timing includes the time the consumer spends on each batch; no plan is sampled for streams
+    start, row_count, error = time.perf_counter(), 0, None
+    try:
+        result = con.execute(text(sql), params or {}, execution_options={"yield_per": batch_size})
+        for partition in result.mappings().partitions(batch_size):
+            rows = convert_result_rows(partition, decode_geometry)
+            row_count += len(rows)
+            yield rows
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        record_db_query(duration_ms / 1000, row_count)
+        record_query(sql, duration_ms, row_count, error, params=params)
+
+
+async def aiter_query_batches(sql: str, con, batch_size: int, params=None, decode_geometry=True):
+    """iter_query_batches for an async (asyncpg) connection"""
+    print(f'Query being streamed: {sql} \n\n')
+    start, row_count, error = time.perf_counter(), 0, None
+    try:
+        result = await con.stream(text(sql), params or {})
+        async for partition in result.mappings().partitions(batch_size):
+            rows = convert_result_rows(partition, decode_geometry)
+            row_count += len(rows)
+            yield rows
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        record_db_query(duration_ms / 1000, row_count)
+        record_query(sql, duration_ms, row_count, error, params=params)
+
+
+def geometry_column_to_geojson(values):
+    """
+    Decode a whole geometry column to GeoJSON text in one vectorized pass.
+
+    PostGIS returns geometry as hex EWKB for raw SQL (bytes/WKBElement with some drivers);
+    those are decoded together with shapely.from_wkb/to_geojson. Values that are already
+    GeoJSON text (e.g. SELECT ST_AsGeoJSON(geometry) AS geometry) pass through unparsed.
+    Undecodable values become None.
+    """
+    start = time.perf_counter()
+    geojson = [None] * len(values)
+    wkb_positions, wkb_values = [], []
+    for i, value in enumerate(values):
+        if value is None:
+            continue
+        if isinstance(value, str):
+            if value.lstrip().startswith('{'):
+                geojson[i] = value
+                continue
+        elif isinstance(value, dict):
+            geojson[i] = json.dumps(value)
+            continue
+        elif isinstance(value, memoryview):
+            value = value.tobytes()
+        elif hasattr(value, 'data'):  # geoalchemy2 WKBElement
+            value = value.data
+        wkb_positions.append(i)
+        wkb_values.append(value)
+
+    if wkb_values:
+        geoms = shapely.from_wkb(np.array(wkb_values, dtype=object), on_invalid='ignore')
+        for i, text_value in zip(wkb_positions, shapely.to_geojson(geoms)):
+            geojson[i] = text_value
+    record_geometry_serialization(time.perf_counter() - start)
+    return geojson
+
+
+def convert_result_rows(results, decode_geometry=True):
+    """
+    Convert result mappings to dicts with the geometry column as GeoJSON text.
+    decode_geometry=False leaves geometry as the driver returned it, for rows whose geometry
+    will be replaced by a level-of-detail variant (geometry_lod.apply_detail_level decodes
+    whatever isn't replaced).
+    """
+    converted_results = [dict(row) for row in results]
+    if decode_geometry and converted_results and 'geometry' in converted_results[0]:
+        geometries = geometry_column_to_geojson([row['geometry'] for row in converted_results])
+        for row, geometry in zip(converted_results, geometries):
+            row['geometry'] = geometry
+    return converted_results
 
 
 def create_reprojected_geometry_col(gdf, geometry_col, new_geometry_col, srid):
@@ -0,0 +1,158 @@
+"""
+Level-of-detail geometry for search results.
+
+Generated SQL always selects full-resolution parcel geometry. When a lower detail level
+is requested, that column is left undecoded (db_utils.convert_result_rows) and swapped
+for a precomputed variant from parcels.parcel_geometry_lod (see sql/parcels.sql), looked
+up by parcel_id; only rows without a variant have their full geometry decoded. Pages of
+a registered result set are loaded by parcel_id with the variant column selected
+directly, so full geometry isn't read for them at all. Full resolution is fetched per
+parcel on demand.
+"""
+from sqlalchemy import text
+from db_actions.db_utils import geometry_column_to_geojson
+# Detail level -> parcels.parcel_geometry_lod column (None keeps the query's own geometry)
+DETAIL_LEVELS = {
+    "full": None,
+    "medium": "geometry_medium",
+    "low": "geometry_low",
+    "bbox": "bbox",
+    "centroid": "centroid",
+}
+# ~10 cm precision is plenty for display and keeps coordinates short
+GEOJSON_DECIMAL_DIGITS = 6
+
+
+
+def needs_geometry_decoding(detail_level: str) -> bool:
+    """Whether a query's own geometry is sent at this level (otherwise it is replaced and needn't be decoded)"""
+    return DETAIL_LEVELS.get(detail_level) is None
+
+
+def _parcels_by_id_sql(detail_level: str):
+    column = DETAIL_LEVELS.get(detail_level)
+    geometry, join = "pd.geometry", ""
+    if column is not None:
+        # Parcels without a variant keep full resolution
+        geometry = f"COALESCE(lod.{column}, pd.geometry)"
+        join = "LEFT JOIN parcels.parcel_geometry_lod lod ON lod.parcel_id = pd.parcel_id"
+    return text(f"""
+        SELECT pd.parcel_id, pd.full_address, pd.county_name, pd.municipality_name, pd.area_acres, pd.owner_name,
+               pd.total_value, pd.ground_mounted_capacity_kw,
+               ST_AsGeoJSON({geometry}, {GEOJSON_DECIMAL_DIGITS}) AS geometry
+        FROM parcels.parcel_details pd
+        {join}
+        WHERE pd.parcel_id = ANY(:parcel_ids)
+    """)
+
+
+def _lod_sql(detail_level: str):
+    return text(
+        f"SELECT parcel_id, ST_AsGeoJSON({DETAIL_LEVELS[detail_level]}, {GEOJSON_DECIMAL_DIGITS}) AS geometry "
+        "FROM parcels.parcel_geometry_lod WHERE parcel_id = ANY(:parcel_ids)"
+    )
+
+
+def _parcel_ids(rows, detail_level: str):
+    if not rows or DETAIL_LEVELS.get(detail_level) is None or "parcel_id" not in rows[0]:
+        return []
+    return list({row["parcel_id"] for row in rows if row.get("parcel_id") is not None})
+
+
+def _undecoded(value) -> bool:
+    return value is not None and not (isinstance(value, str) and value.lstrip().startswith("{"))
+
+
+def decode_geometry(rows):
+    """rows with any geometry still in driver form decoded to GeoJSON text"""
+    if not rows or "geometry" not in rows[0]:
+        return rows
+    pending = [i for i, row in enumerate(rows) if _undecoded(row["geometry"])]
+    if not pending:
+        return rows
+    # Copy rows rather than mutating them; they may be shared with the result cache
+    rows = list(rows)
+    for i, geometry in zip(pending, geometry_column_to_geojson([rows[i]["geometry"] for i in pending])):
+        rows[i] = {**rows[i], "geometry": geometry}
+    return rows
+
+
+def _swap_geometry(rows, lod_rows):
+    geometry_by_id = {lod["parcel_id"]: lod["geometry"] for lod in lod_rows}
+    return [
+        {**row, "geometry": geometry_by_id[row.get("parcel_id")]} if row.get("parcel_id") in geometry_by_id else row
+        for row in rows
+    ]
+
+
+def apply_detail_level(con, rows, detail_level: str):
+    """Replace each row's geometry with its detail_level variant; rows without one get their full geometry decoded"""
+    parcel_ids = _parcel_ids(rows, detail_level)
+    if not parcel_ids:
+        return decode_geometry(rows)
+    try:
+        # Savepoint so a missing LOD table doesn't abort the caller's transaction
+        with con.begin_nested():
+            lod_rows = con.execute(_lod_sql(detail_level), {"parcel_ids": parcel_ids}).mappings().all()
+    except Exception as e:
+        print(f"Could not load {detail_level} geometry, using full resolution: {e}")
+        return decode_geometry(rows)
+    return decode_geometry(_swap_geometry(rows, lod_rows))
+
+
+async def aapply_detail_level(con, rows, detail_level: str):
+    """apply_detail_level for an async connection"""
+    parcel_ids = _parcel_ids(rows, detail_level)
+    if not parcel_ids:
+        return decode_geometry(rows)
+    try:
+        async with con.begin_nested():
+            lod_rows = (await con.execute(_lod_sql(detail_level), {"parcel_ids": parcel_ids})).mappings().all()
+    except Exception as e:
+        print(f"Could not load {detail_level} geometry, using full resolution: {e}")
+        return decode_geometry(rows)
+    return decode_geometry(_swap_geometry(rows, lod_rows))
+
+
+def _in_id_order(rows, parcel_ids):
+    by_id = {row["parcel_id"]: dict(row) for row in rows}
+    return [by_id[pid] for pid in parcel_ids if pid in by_id]
+
+
+def get_parcels(con, parcel_ids, detail_level: str = "full"):
+    """Parcels with detail_level GeoJSON geometry text, in parcel_ids order"""
+    if not parcel_ids:
+        return []
+    params = {"parcel_ids": list(parcel_ids)}
+    try:
+        # Savepoint so a missing LOD table doesn't abort the caller's transaction
+        with con.begin_nested():
+            rows = con.execute(_parcels_by_id_sql(detail_level), params).mappings().all()
+    except Exception as e:
+        if needs_geometry_decoding(detail_level):
+            raise
+        print(f"Could not load {detail_level} geometry, using full resolution: {e}")
+        rows = con.execute(_parcels_by_id_sql("full"), params).mappings().all()
+    return _in_id_order(rows, parcel_ids)
+
+
+async def aget_parcels(con, parcel_ids, detail_level: str = "full"):
+    """get_parcels for an async connection"""
+    if not parcel_ids:
+        return []
+    params = {"parcel_ids": list(parcel_ids)}
+    try:
+        async with con.begin_nested():
+            rows = (await con.execute(_parcels_by_id_sql(detail_level), params)).mappings().all()
+    except Exception as e:
+        if needs_geometry_decoding(detail_level):
+            raise
+        print(f"Could not load {detail_level} geometry, using full resolution: {e}")
+        rows = (await con.execute(_parcels_by_id_sql("full"), params)).mappings().all()
+    return _in_id_order(rows, parcel_ids)
+
+
+def get_parcel(con, parcel_id: str):
+    """A single parcel with full-resolution GeoJSON geometry text, or None"""
+    rows = get_parcels(con, [parcel_id])
+    return rows[0] if rows else None
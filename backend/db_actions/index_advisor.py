@@ -0,0 +1,251 @@
+"""
+Index advisor driven by the executed-SQL log (see db_actions/query_log.py).
+
+Aggregates logged statements by table and filtered column, weighting each by the
+time its queries spent, and proposes:
+  - B-tree indexes on columns filtered by sequential scans,
+  - partial GIST indexes on geometry_26986 for equality filters on a class-like column
+    (e.g. WHERE class = 'substation' feeding a spatial join),
+  - composite B-tree indexes for columns filtered together (equality columns first).
+Predicates come from the Filter of Seq Scan nodes in sampled EXPLAIN plans, falling
+back to parsing the SQL text for queries without a plan. Proposals that match an
+existing index are dropped.
+
+Usage (from backend/):
+    python db_actions/index_advisor.py                # print proposals
+    python db_actions/index_advisor.py --apply        # create them, timing logged queries before/after
+"""
+from collections import defaultdict
+from sqlalchemy import create_engine, text
+import argparse
+import dotenv
+import os
+import re
+import statistics
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from db_actions.query_log import read_query_log, QUERY_LOG_PATH
+from db_actions.result_cache import canonicalize_sql, DATA_SCHEMAS
+from db_actions.sql_params import render_sql
+
+# Equality on these columns is selective per value but the columns themselves are low-cardinality,
+# so they get partial spatial indexes instead of a plain B-tree
+PARTIAL_INDEX_COLUMNS = {"class", "category"}
+IGNORED_COLUMNS = {"geometry", "geometry_26986"}
+
+_FROM_PATTERN = re.compile(
+    r'\b(?:from|join)\s+(' + "|".join(DATA_SCHEMAS) + r')\.(\w+)(?:\s+(?:as\s+)?(?!where|join|on|left|right|inner|cross|group|order|limit)(\w+))?',
+    re.IGNORECASE,
+)
+_SQL_PREDICATE_PATTERN = re.compile(
+    r"(?:\b(\w+)\.)?\b(\w+)\s*(=|>=|<=|<>|>|<|\bin\b|\bbetween\b)\s*('(?:[^']|'')*'|\(|-?\d)",
+    re.IGNORECASE,
+)
+# Plan filters look like ((class)::text = 'substation'::text) or (area_acres > '20'::numeric)
+_PLAN_PREDICATE_PATTERN = re.compile(
+    r"\(*(\w+)\)?(?:::[\w ]+)?\s*(=|>=|<=|<>|>|<|= ANY)\s*(?:\(?'((?:[^']|'')*)')?"
+)
+
+PG_INDEXES_SQL = text("""
+    SELECT schemaname || '.' || tablename AS table_name, indexdef
+    FROM pg_indexes
+    WHERE schemaname = ANY(:schemas)
+""")
+
+
+def _literal(value):
+    return value.replace("''", "'") if value is not None else None
+
+
+def _plan_scans(node):
+    """(schema.table, filter) for every sequential scan with a filter in a plan tree"""
+    if node.get("Node Type") == "Seq Scan" and node.get("Filter") and node.get("Schema") in DATA_SCHEMAS:
+        yield f"{node['Schema']}.{node['Relation Name']}", node["Filter"]
+    for child in node.get("Plans", []):
+        yield from _plan_scans(child)
+
+
+def predicates_from_plan(plan):
+    """{table: {column: (operator, literal)}} filtered by sequential scans in an EXPLAIN JSON plan"""
+    predicates = defaultdict(dict)
+    for table, filter_text in _plan_scans(plan.get("Plan", {})):
+        for column, operator, literal in _PLAN_PREDICATE_PATTERN.findall(filter_text):
+            if column.lower() not in IGNORED_COLUMNS and not column.isdigit():
+                predicates[table][column.lower()] = (operator.strip().lower(), _literal(literal or None))
+    return predicates
+
+
+def predicates_from_sql(sql: str):
+    """{table: {column: (operator, literal)}} parsed from WHERE/ON predicates in the SQL text"""
+    sql = canonicalize_sql(sql)
+    aliases = {}
+    for schema, table, alias in _FROM_PATTERN.findall(sql):
+        qualified = f"{schema}.{table}"
+        aliases[table] = qualified
+        if alias:
+            aliases[alias] = qualified
+    tables = set(aliases.values())
+    predicates = defaultdict(dict)
+    for alias, column, operator, value in _SQL_PREDICATE_PATTERN.findall(sql):
+        if column in IGNORED_COLUMNS or column in aliases or column.isdigit():
+            continue
+        # Unqualified columns can only be attributed when a single table is in play
+        table = aliases.get(alias) if alias else (next(iter(tables)) if len(tables) == 1 else None)
+        if table is None:
+            continue
+        literal = value[1:-1] if value.startswith("'") else None
+        predicates[table][column] = (operator.lower(), _literal(literal))
+    return predicates
+
+
+def aggregate(entries, min_duration_ms: float = 0):
+    """
+    Per (table, columns) candidate: total and count of logged time, with example queries.
+    Each logged statement contributes its predicates from its plan when it has one.
+    """
+    candidates = {}
+
+    def add(key, entry, **details):
+        candidate = candidates.setdefault(key, {"total_ms": 0.0, "count": 0, "queries": [], **details})
+        candidate["total_ms"] += entry["duration_ms"]
+        candidate["count"] += 1
+        if entry["sql"] not in candidate["queries"]:
+            candidate["queries"].append(entry["sql"])
+
+    for entry in entries:
+        if entry.get("error") or entry.get("duration_ms", 0) < min_duration_ms:
+            continue
+        # Parameterized statements are replayed and matched with their values inlined
+        entry = {**entry, "sql": render_sql(entry["sql"], entry.get("params"))}
+        predicates = predicates_from_plan(entry["plan"]) if entry.get("plan") else predicates_from_sql(entry["sql"])
+        for table, columns in predicates.items():
+            plain = []
+            for column, (operator, literal) in sorted(columns.items()):
+                if column in PARTIAL_INDEX_COLUMNS and operator == "=" and literal is not None:
+                    add(("partial", table, column, literal), entry, kind="partial", table=table,
+                        columns=[column], literal=literal)
+                else:
+                    plain.append((column, operator))
+                    add(("btree", table, column), entry, kind="btree", table=table, columns=[column])
+            if len(plain) > 1:
+                # Equality columns lead so the index serves every combination of their values
+                ordered = [c for c, op in plain if op in ("=", "in", "= any")] + [c for c, op in plain if op not in ("=", "in", "= any")]
+                add(("composite", table, *ordered), entry, kind="composite", table=table, columns=ordered)
+    return candidates
+
+
+def index_ddl(candidate) -> str:
+    table, columns = candidate["table"], candidate["columns"]
+    short_table = table.split(".")[1]
+    if candidate["kind"] == "partial":
+        literal = candidate["literal"]
+        name = re.sub(r"\W+", "_", f"{short_table}_{literal}_geometry_26986_idx").lower()
+        escaped = literal.replace("'", "''")
+        return (
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} "
+            f"USING GIST (geometry_26986) WHERE {columns[0]} = '{escaped}'"
+        )
+    name = f"{short_table}_{'_'.join(columns)}_idx"
+    return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+
+
+def _index_signature(indexdef: str):
+    """(column list, predicate) of an index definition, normalized for comparison"""
+    indexdef = indexdef.lower().replace('"', "")
+    columns = re.search(r"\(([^)]*)\)", indexdef.split(" using ")[-1]).group(1)
+    columns = ",".join(c.strip().split(" ")[0] for c in columns.split(","))
+    predicate = indexdef.split(" where ", 1)[1] if " where " in indexdef else ""
+    return columns, re.sub(r"[()\s]|::\w+( varying)?", "", predicate)
+
+
+def is_covered(candidate, existing_indexdefs) -> bool:
+    """True if an existing index already has this candidate's leading columns and predicate"""
+    proposed_columns, proposed_predicate = _index_signature(index_ddl(candidate))
+    for indexdef in existing_indexdefs:
+        columns, predicate = _index_signature(indexdef)
+        if columns.startswith(proposed_columns) and predicate == proposed_predicate:
+            return True
+    return False
+
+
+def propose(con, entries, top: int, min_count: int, min_duration_ms: float):
+    existing = defaultdict(list)
+    for row in con.execute(PG_INDEXES_SQL, {"schemas": list(DATA_SCHEMAS)}).mappings():
+        existing[row["table_name"]].append(row["indexdef"])
+    candidates = [
+        c for c in aggregate(entries, min_duration_ms).values()
+        if c["count"] >= min_count and not is_covered(c, existing[c["table"]])
+    ]
+    return sorted(candidates, key=lambda c: c["total_ms"], reverse=True)[:top]
+
+
+def time_queries(con, queries, repeats: int):
+    """Median wall time in ms for each query, run read-only"""
+    timings = []
+    for sql in queries:
+        samples = []
+        for _ in range(repeats):
+            with con.begin():
+                con.exec_driver_sql("SET TRANSACTION READ ONLY")
+                start = time.perf_counter()
+                con.execute(text(sql)).fetchall()
+                samples.append((time.perf_counter() - start) * 1000)
+        timings.append(statistics.median(samples))
+    return timings
+
+
+def apply(engine, candidate, max_queries: int, repeats: int) -> None:
+    """Create the index, timing up to max_queries of the queries that motivated it before and after"""
+    queries = candidate["queries"][:max_queries]
+    with engine.connect() as con:
+        before = time_queries(con, queries, repeats)
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as con:
+        con.exec_driver_sql(index_ddl(candidate))
+        con.exec_driver_sql(f"ANALYZE {candidate['table']}")
+    with engine.connect() as con:
+        after = time_queries(con, queries, repeats)
+    for sql, before_ms, after_ms in zip(queries, before, after):
+        speedup = before_ms / after_ms if after_ms else float("inf")
+        print(f"    {before_ms:>9.1f} ms -> {after_ms:>9.1f} ms ({speedup:.1f}x)  {canonicalize_sql(sql)[:100]}")
+
+
+def _engine():
+    dotenv.load_dotenv()
+    if os.getenv("DB_HOST", "local") == "local":
+        user, password, host, port, db_name = os.environ["DB_USER"], os.environ["DB_PASSWORD"], "localhost", "5432", os.environ["DB_NAME"]
+        return create_engine(f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db_name}")
+    return create_engine(os.getenv("SUPABASE_URL_SESSION"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose (or create) indexes from the executed-SQL log")
+    parser.add_argument("--log", default=QUERY_LOG_PATH, help="query log path")
+    parser.add_argument("--apply", action="store_true", help="create the proposed indexes and report before/after timings")
+    parser.add_argument("--top", type=int, default=10, help="maximum number of proposals")
+    parser.add_argument("--min-count", type=int, default=2, help="ignore candidates seen in fewer logged queries")
+    parser.add_argument("--min-duration-ms", type=float, default=0, help="ignore logged queries faster than this")
+    parser.add_argument("--max-queries", type=int, default=3, help="queries timed per index with --apply")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per timed query with --apply")
+    args = parser.parse_args()
+
+    entries = read_query_log(args.log)
+    print(f"Read {len(entries)} logged queries from {args.log}")
+    engine = _engine()
+    with engine.connect() as con:
+        proposals = propose(con, entries, args.top, args.min_count, args.min_duration_ms)
+    if not proposals:
+        print("No index proposals")
+        return
+
+    for candidate in proposals:
+        print(f"\n[{candidate['kind']}] {candidate['count']} queries, {candidate['total_ms'] / 1000:.1f} s total")
+        print(f"  {index_ddl(candidate)};")
+        if args.apply:
+            apply(engine, candidate, args.max_queries, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
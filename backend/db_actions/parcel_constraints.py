@@ -0,0 +1,139 @@
+"""
+Per-parcel constraint coverage.
+
+For each constraint layer, parcels.parcel_constraints (see sql/parcel_constraints.sql)
+holds the area of the parcel covered by the layer and that area as a fraction of the
+parcel. Areas are measured against the dissolved, subdivided <table>_subdivided companion
+of each source table, and pieces from overlapping categories are unioned so they are
+not counted twice. Parcels are split into parcel_id ranges and the ranges are computed in parallel
+worker processes, each with its own connection. When a single source table is
+reloaded only the layers derived from it are recomputed.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from sqlalchemy import create_engine, text
+import os
+
+CONSTRAINTS_TABLE = "parcels.parcel_constraints"
+CHUNK_SIZE = int(os.getenv("PARCEL_CONSTRAINTS_CHUNK_SIZE", "5000"))
+MAX_WORKERS = int(os.getenv("PARCEL_CONSTRAINTS_WORKERS", str(os.cpu_count() or 4)))
+
+# Layer -> (source table, extra feature filter). Column names are <layer>_area_m2 / <layer>_fraction
+LAYERS = {
+    "wetland": ("geographic_features.land_cover", "f.class = 'wetland'"),
+    "forest": ("geographic_features.land_cover", "f.class = 'forest'"),
+    "flood_zone": ("geographic_features.flood_zones", None),
+    "flood_zone_100yr": (
+        "geographic_features.flood_zones",
+        "f.category IN ('1% Annual Chance Flood Hazard', 'Regulatory Floodway')",
+    ),
+    "priority_habitat": ("geographic_features.priority_habitats", None),
+    "open_space": ("geographic_features.open_spaces", None),
+    "prime_farmland": ("geographic_features.prime_farmland_soils", None),
+}
+
+SYNC_PARCEL_IDS_SQL = [
+    f"DELETE FROM {CONSTRAINTS_TABLE} c WHERE NOT EXISTS "
+    f"(SELECT 1 FROM parcels.parcel_details p WHERE p.parcel_id = c.parcel_id)",
+    f"INSERT INTO {CONSTRAINTS_TABLE} (parcel_id) SELECT parcel_id FROM parcels.parcel_details "
+    f"ON CONFLICT (parcel_id) DO NOTHING",
+]
+
+# Every CHUNK_SIZE-th parcel_id; consecutive values bound one chunk
+CHUNK_BOUNDS_SQL = text("""
+    SELECT parcel_id FROM (
+        SELECT parcel_id, row_number() OVER (ORDER BY parcel_id) AS n FROM parcels.parcel_details
+    ) ids
+    WHERE (n - 1) % :chunk_size = 0
+    ORDER BY parcel_id
+""")
+
+_worker_engine = None
+
+
+def layers_for_tables(tables):
+    """Layers computed from any of the given tables; every layer if parcels were reloaded"""
+    tables = set(tables)
+    if "parcels.parcel_details" in tables:
+        return list(LAYERS)
+    return [layer for layer, (table, _) in LAYERS.items() if table in tables]
+
+
+def _covered_area_sql(layer: str) -> str:
+    table, feature_filter = LAYERS[layer]
+    where = "ST_Intersects(p.geometry_26986, f.geometry_26986)"
+    if feature_filter:
+        where += f" AND {feature_filter}"
+    return (
+        f"(SELECT COALESCE(ST_Area(ST_Union(ST_Intersection(p.geometry_26986, f.geometry_26986))), 0) "
+        f"FROM {table}_subdivided f WHERE {where})"
+    )
+
+
+def _chunk_sql(layers, last_chunk: bool):
+    """UPDATE for one parcel_id range, computing the area and fraction of each layer"""
+    covered = ",\n            ".join(f"{_covered_area_sql(layer)} AS {layer}" for layer in layers)
+    assignments = ",\n        ".join(
+        f"{layer}_area_m2 = round(a.{layer}::numeric, 1), "
+        f"{layer}_fraction = round(LEAST(a.{layer} / NULLIF(a.parcel_area, 0), 1)::numeric, 4)"
+        for layer in layers
+    )
+    upper = "" if last_chunk else "AND p.parcel_id < :end_id"
+    return text(f"""
+    UPDATE {CONSTRAINTS_TABLE} c SET
+        {assignments}
+    FROM (
+        SELECT p.parcel_id, ST_Area(p.geometry_26986) AS parcel_area,
+            {covered}
+        FROM parcels.parcel_details p
+        WHERE p.parcel_id >= :start_id {upper}
+    ) a
+    WHERE c.parcel_id = a.parcel_id
+    """)
+
+
+def _init_worker(db_url: str):
+    global _worker_engine
+    _worker_engine = create_engine(db_url, pool_size=1, max_overflow=0)
+
+
+def _refresh_chunk(start_id: str, end_id, layers) -> int:
+    with _worker_engine.begin() as conn:
+        result = conn.execute(_chunk_sql(layers, end_id is None), {"start_id": start_id, "end_id": end_id})
+    return result.rowcount
+
+
+def refresh_parcel_constraints(engine, tables=None, max_workers: int = MAX_WORKERS, chunk_size: int = CHUNK_SIZE):
+    """
+    Recompute parcels.parcel_constraints in parallel parcel_id chunks.
+
+    With tables=None every layer is recomputed; otherwise only the layers derived
+    from the given reloaded tables. Returns the layers that were refreshed.
+    """
+    layers = list(LAYERS) if tables is None else layers_for_tables(tables)
+    if not layers:
+        return []
+
+    with engine.begin() as conn:
+        for sql in SYNC_PARCEL_IDS_SQL:
+            conn.exec_driver_sql(sql)
+        bounds = conn.execute(CHUNK_BOUNDS_SQL, {"chunk_size": chunk_size}).scalars().all()
+
+    chunks = list(zip(bounds, bounds[1:] + [None]))
+    print(f"Computing {', '.join(layers)} coverage for {len(chunks)} parcel chunks on {max_workers} workers")
+    db_url = engine.url.render_as_string(hide_password=False)
+    # fork, so workers don't re-import the calling script (populate_tables.py runs at import time)
+    pool = ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_worker,
+        initargs=(db_url,),
+    )
+    with pool:
+        futures = [pool.submit(_refresh_chunk, start_id, end_id, layers) for start_id, end_id in chunks]
+        updated = sum(future.result() for future in futures)
+    print(f"Updated constraint coverage for {updated} parcels")
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"ANALYZE {CONSTRAINTS_TABLE}")
+    return layers
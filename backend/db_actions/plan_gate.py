@@ -0,0 +1,138 @@
+"""
+Planner check for LLM-generated SQL before it is executed.
+
+The SQL is run through EXPLAIN (no ANALYZE, so nothing executes) in the same bounded
+read-only transaction used for execution. Plans whose estimated cost or row count is
+over the configured limits, or that contain a join with no join condition, are rejected
+with a plan summary that repair_sql can act on. EXPLAIN also surfaces syntax and
+unknown-column errors without spending any execution time.
+"""
+from sqlalchemy import text
+from db_actions.query_engine import READ_ONLY_SETUP, query_stats
+from db_actions.sql_params import render_sql
+import json
+import os
+
+PLAN_GATE_ENABLED = os.getenv("PLAN_GATE_ENABLED", "true").lower() == "true"
+PLAN_MAX_COST = float(os.getenv("PLAN_MAX_COST", "50000000"))
+PLAN_MAX_ROWS = float(os.getenv("PLAN_MAX_ROWS", "2000000"))
+# Joins without a condition are tolerated below this many estimated rows (e.g. joining a single-row CTE)
+PLAN_CROSS_JOIN_MIN_ROWS = float(os.getenv("PLAN_CROSS_JOIN_MIN_ROWS", "10000"))
+# Plan lines included in the summary sent to repair_sql
+PLAN_SUMMARY_MAX_LINES = 20
+
+# Spatial functions that can't use a GIST index when they appear in a join filter
+_NON_INDEXABLE_SPATIAL = ("st_distance(", "st_area(st_intersection(")
+
+
+def _explain_sql(sql: str):
+    return text(f"EXPLAIN (FORMAT JSON) {sql.strip().rstrip(';')}")
+
+
+def _plan(explain_rows):
+    value = explain_rows[0][0]
+    if isinstance(value, str):
+        value = json.loads(value)
+    return value[0]["Plan"]
+
+
+def _walk(node, depth: int = 0):
+    yield node, depth
+    for child in node.get("Plans", []):
+        yield from _walk(child, depth + 1)
+
+
+def _node_label(node) -> str:
+    label = node["Node Type"]
+    if node.get("Relation Name"):
+        label += f" on {node.get('Schema', '')}.{node['Relation Name']}".replace(" .", " ")
+    if node.get("Index Name"):
+        label += f" using {node['Index Name']}"
+    return label
+
+
+def summarize_plan(plan) -> str:
+    """Indented one-line-per-node plan with estimated cost, rows and join/scan conditions"""
+    lines = []
+    for node, depth in _walk(plan):
+        line = f"{'  ' * depth}-> {_node_label(node)} (cost={node['Total Cost']:.0f} rows={node['Plan Rows']:.0f})"
+        for key in ("Index Cond", "Hash Cond", "Merge Cond", "Join Filter", "Filter"):
+            if node.get(key):
+                line += f" {key}: {node[key]}"
+        lines.append(line)
+    if len(lines) > PLAN_SUMMARY_MAX_LINES:
+        lines = lines[:PLAN_SUMMARY_MAX_LINES] + [f"... {len(lines) - PLAN_SUMMARY_MAX_LINES} more plan nodes"]
+    return "\n".join(lines)
+
+
+def _is_cross_join(node) -> bool:
+    # A nested loop with no join filter whose inner side has no parameterized index condition
+    if node["Node Type"] != "Nested Loop" or node.get("Join Filter") or node["Plan Rows"] < PLAN_CROSS_JOIN_MIN_ROWS:
+        return False
+    inner = node.get("Plans", [None, None])[-1]
+    return inner is not None and not any(child.get("Index Cond") for child, _ in _walk(inner))
+
+
+def plan_problems(plan) -> list:
+    """Reasons the plan should not be executed; empty if it is acceptable"""
+    problems = []
+    if plan["Total Cost"] > PLAN_MAX_COST:
+        problems.append(f"estimated cost {plan['Total Cost']:.0f} exceeds the limit of {PLAN_MAX_COST:.0f}")
+    if plan["Plan Rows"] > PLAN_MAX_ROWS:
+        problems.append(f"estimated {plan['Plan Rows']:.0f} result rows exceeds the limit of {PLAN_MAX_ROWS:.0f}")
+    for node, _ in _walk(plan):
+        if _is_cross_join(node):
+            problems.append(
+                f"nested-loop join without a join condition ({node['Plan Rows']:.0f} estimated rows); "
+                "add a join condition or a spatial predicate such as ST_Intersects/ST_DWithin"
+            )
+        join_filter = (node.get("Join Filter") or "").lower()
+        if node["Node Type"] == "Nested Loop" and any(fn in join_filter for fn in _NON_INDEXABLE_SPATIAL):
+            problems.append(
+                "spatial join filtered with ST_Distance/ST_Intersection can't use the spatial index; "
+                "use ST_DWithin or ST_Intersects in the join condition instead"
+            )
+    return list(dict.fromkeys(problems))
+
+
+def _gate_result(plan):
+    problems = plan_problems(plan)
+    if not problems:
+        return None
+    query_stats["plan_rejections"] += 1
+    return (
+        "Query plan rejected before execution: " + "; ".join(problems) + ".\n"
+        "Plan summary (EXPLAIN):\n" + summarize_plan(plan)
+    )
+
+
+def check_plan(engine, sql: str, sql_params=None):
+    """None if the SQL may be executed, otherwise an error message for repair_sql"""
+    if not PLAN_GATE_ENABLED:
+        return None
+    try:
+        with engine.connect() as con:
+            for statement, params in READ_ONLY_SETUP:
+                con.execute(statement, params)
+            plan = _plan(con.execute(_explain_sql(render_sql(sql, sql_params))).all())
+            con.rollback()
+    except Exception as e:
+        print("Error planning query: ", str(e))
+        return f"SQL error: {e}"
+    return _gate_result(plan)
+
+
+async def acheck_plan(async_engine, sql: str, sql_params=None):
+    """check_plan for the asyncpg engine"""
+    if not PLAN_GATE_ENABLED:
+        return None
+    try:
+        async with async_engine.connect() as con:
+            for statement, params in READ_ONLY_SETUP:
+                await con.execute(statement, params)
+            plan = _plan((await con.execute(_explain_sql(render_sql(sql, sql_params)))).all())
+            await con.rollback()
+    except Exception as e:
+        print("Error planning query: ", str(e))
+        return f"SQL error: {e}"
+    return _gate_result(plan)
@@ -11,6 +11,8 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from processing.parcel_processor import process_parcels
 from processing.omf_data_processor import create_all_omf_tables, extract_environmental_features, extract_landuse, extract_infrastructure, extract_transportation
 from processing.environmental_data_processor import process_fema_flood_zones, process_protected_open_spaces, process_priority_habitats, process_prime_soils
+from db_actions.result_cache import bump_data_generation
+from db_actions.parcel_constraints import refresh_parcel_constraints, layers_for_tables
 
 dotenv.load_dotenv()
 
@@ -23,6 +25,36 @@ else:
     engine = create_engine(subase_connection_string)
 
 
+# Tables reloaded by this run; derived tables refresh only what depends on them
+loaded_tables = []
+
+
+def mark_table_loaded(table_name):
+    """Bump the table's data generation so cached API results for it are invalidated"""
+    with engine.begin() as conn:
+        bump_data_generation(conn, [table_name])
+    loaded_tables.append(table_name)
+
+
+def refresh_derived_table(refresh_function, table_name, *args):
+    """Rebuild a table derived from loaded data with its SQL refresh function, then mark it loaded"""
+    placeholders = ", ".join(["%s"] * len(args))
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"SELECT {refresh_function}({placeholders})", args)
+    mark_table_loaded(table_name)
+
+
+def refresh_subdivided_layer(layer, group_column=None):
+    """Dissolve and subdivide a freshly loaded geographic_features layer into <layer>_subdivided"""
+    print(f"** Subdividing {layer} **")
+    refresh_derived_table(
+        "geographic_features.refresh_subdivided_layer",
+        f"geographic_features.{layer}_subdivided",
+        layer,
+        group_column,
+    )
+
+
 
 con = duckdb.connect()
 con.execute("INSTALL spatial; LOAD spatial;")
@@ -58,6 +90,10 @@ if parcels_only:
         if_exists="append",
         index=False
     )
+    mark_table_loaded("parcels.parcel_details")
+
+    print("** Building simplified parcel geometries **")
+    refresh_derived_table("parcels.refresh_parcel_geometry_lod", "parcels.parcel_geometry_lod")
 
 
 if geographic_features_only:
@@ -73,6 +109,8 @@ if geographic_features_only:
         if_exists="append",
         index=False
     )
+    mark_table_loaded("geographic_features.land_cover")
+    refresh_subdivided_layer("land_cover", "class")
 
     # Land Use Features
     print("** Populating land use features **")
@@ -84,6 +122,7 @@ if geographic_features_only:
         if_exists="append",
         index=False
     )
+    mark_table_loaded("geographic_features.land_use")
 
     # Protected Open Spaces
     print("** Populating protected open spaces **")
@@ -95,6 +134,8 @@ if geographic_features_only:
         if_exists="append",
         index=False
     )
+    mark_table_loaded("geographic_features.open_spaces")
+    refresh_subdivided_layer("open_spaces")
 
     # FEMA Flood Zones
     print("** Populating FEMA flood zones **")
@@ -107,6 +148,8 @@ if geographic_features_only:
         chunksize=5000,
         index=False
     )
+    mark_table_loaded("geographic_features.flood_zones")
+    refresh_subdivided_layer("flood_zones", "category")
 
     # Priority Habitats
     print("** Populating priority habitats **")
@@ -118,6 +161,8 @@ if geographic_features_only:
         if_exists="append",
         index=False
     )
+    mark_table_loaded("geographic_features.priority_habitats")
+    refresh_subdivided_layer("priority_habitats")
 
     # Prime Farmland Soils
     print("** Populating prime farmland soils **")
@@ -130,6 +175,8 @@ if geographic_features_only:
         chunksize=5000,
         index=False
     )
+    mark_table_loaded("geographic_features.prime_farmland_soils")
+    refresh_subdivided_layer("prime_farmland_soils")
 
 
 if infra_features_only:
@@ -146,6 +193,7 @@ if infra_features_only:
         if_exists="append",
         index=False
     )
+    mark_table_loaded("infrastructure_features.infrastructure")
 
     # Transportation Features
     print("** Populating transportation features **")
@@ -158,3 +206,17 @@ if infra_features_only:
         chunksize=5000,
         index=False
     )
+    mark_table_loaded("infrastructure_features.transportation")
+
+
+# Parcel proximity depends on both parcels and infrastructure, so rebuild it once after either is loaded
+if parcels_only or infra_features_only:
+    print("** Computing parcel proximity to infrastructure and roads **")
+    refresh_derived_table("parcels.refresh_parcel_proximity", "parcels.parcel_proximity")
+
+
+# Constraint coverage is recomputed only for the layers whose source table was reloaded (all of them after a parcel reload)
+if layers_for_tables(loaded_tables):
+    print("** Computing parcel constraint coverage **")
+    refresh_parcel_constraints(engine, tables=loaded_tables)
+    mark_table_loaded("parcels.parcel_constraints")
@@ -0,0 +1,280 @@
+"""
+Bounded execution layer for LLM-generated SQL.
+
+Queries run on a dedicated pooled engine inside read-only transactions with a
+per-query statement_timeout and work_mem, so a runaway query is cancelled by
+Postgres at the deadline instead of pinning a backend. While a statement runs,
+its backend is registered with the current search (see cancellation.py) so an
+abandoned search can cancel it early.
+"""
+from sqlalchemy import create_engine, text
+from db_actions.result_cache import (
+    run_query_cached, arun_query_cached, result_cache, result_cache_key, aresult_cache_key, StreamedResult,
+)
+from db_actions.db_utils import iter_query_batches, aiter_query_batches
+from db_actions.geometry_lod import apply_detail_level, aapply_detail_level, get_parcels, aget_parcels, needs_geometry_decoding
+from cancellation import cancellable_backend, acancellable_backend
+import os
+
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("QUERY_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("QUERY_POOL_MAX_OVERFLOW", "5")),
+    "pool_timeout": float(os.getenv("QUERY_POOL_TIMEOUT_SECONDS", "30")),
+    "pool_recycle": int(os.getenv("QUERY_POOL_RECYCLE_SECONDS", "1800")),
+    "pool_pre_ping": True,
+}
+STATEMENT_TIMEOUT_MS = int(os.getenv("QUERY_STATEMENT_TIMEOUT_MS", "30000"))
+WORK_MEM = os.getenv("QUERY_WORK_MEM", "64MB")
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "250"))
+
+# SET TRANSACTION must be the first statement of the transaction
+READ_ONLY_SETUP = [
+    (text("SET TRANSACTION READ ONLY"), {}),
+    (
+        text("SELECT set_config('statement_timeout', :statement_timeout, true), set_config('work_mem', :work_mem, true)"),
+        {"statement_timeout": str(STATEMENT_TIMEOUT_MS), "work_mem": WORK_MEM},
+    ),
+]
+
+query_stats = {"queries": 0, "errors": 0, "timeouts": 0, "plan_rejections": 0}
+
+
+def create_query_engine(url):
+    """Pooled engine for executing generated SQL"""
+    return create_engine(url, **POOL_OPTIONS)
+
+
+def create_async_query_engine(url):
+    """Pooled asyncpg engine for the same database as a sync engine URL"""
+    # Imported here so sync deployments don't need greenlet/asyncpg installed
+    from sqlalchemy.ext.asyncio import create_async_engine
+    connect_args = {}
+    # asyncpg doesn't understand libpq's sslmode query parameter; pass it as ssl instead
+    sslmode = url.query.get("sslmode")
+    if sslmode:
+        url = url.difference_update_query(["sslmode"])
+        connect_args["ssl"] = sslmode
+    return create_async_engine(url.set(drivername="postgresql+asyncpg"), connect_args=connect_args, **POOL_OPTIONS)
+
+
+def _record(error) -> None:
+    query_stats["queries"] += 1
+    if error:
+        query_stats["errors"] += 1
+        if "statement timeout" in error:
+            query_stats["timeouts"] += 1
+            print(f"⏱️ Query cancelled after {STATEMENT_TIMEOUT_MS} ms statement timeout")
+
+
+def execute_read_only(engine, sql: str, detail_level: str = "full", sql_params=None):
+    """Run a query in a bounded read-only transaction; returns (rows, error) like run_query"""
+    with engine.connect() as con:
+        for statement, params in READ_ONLY_SETUP:
+            con.execute(statement, params)
+        with cancellable_backend(con):
+            rows, error = run_query_cached(sql, con, sql_params, needs_geometry_decoding(detail_level))
+        if error is None:
+            rows = apply_detail_level(con, rows, detail_level)
+        # Nothing to commit in a read-only transaction
+        con.rollback()
+    _record(error)
+    return rows, error
+
+
+async def aexecute_read_only(async_engine, sql: str, detail_level: str = "full", sql_params=None):
+    """execute_read_only for the asyncpg engine"""
+    async with async_engine.connect() as con:
+        for statement, params in READ_ONLY_SETUP:
+            await con.execute(statement, params)
+        async with acancellable_backend(con):
+            rows, error = await arun_query_cached(sql, con, sql_params, needs_geometry_decoding(detail_level))
+        if error is None:
+            rows = await aapply_detail_level(con, rows, detail_level)
+        await con.rollback()
+    _record(error)
+    return rows, error
+
+
+def _subquery(sql: str) -> str:
+    return sql.strip().rstrip(';')
+
+
+def _parcel_ids_sql(sql: str) -> str:
+    # Materialize only the ids; geometry for each page is loaded separately by parcel_id.
+    # Rows are numbered as the query returns them so the ids keep its order.
+    return (
+        "SELECT parcel_id FROM ("
+        f"SELECT q.parcel_id, row_number() OVER () AS result_row FROM ({_subquery(sql)}) AS q"
+        ") AS numbered ORDER BY result_row"
+    )
+
+
+def _has_single_parcel_id(keys) -> bool:
+    return list(keys).count("parcel_id") == 1
+
+
+def _pageable(con, sql: str, sql_params) -> bool:
+    """Whether sql returns exactly one parcel_id column, so its ids can be selected on their own"""
+    try:
+        # Savepoint so a failing probe doesn't abort the transaction; LIMIT 0 only plans the query
+        with con.begin_nested():
+            keys = con.execute(text(f"SELECT * FROM ({_subquery(sql)}) AS q LIMIT 0"), sql_params or {}).keys()
+    except Exception:
+        return False  # Let the query itself report its error
+    return _has_single_parcel_id(keys)
+
+
+async def _apageable(con, sql: str, sql_params) -> bool:
+    """_pageable for an async connection"""
+    try:
+        async with con.begin_nested():
+            keys = (await con.execute(text(f"SELECT * FROM ({_subquery(sql)}) AS q LIMIT 0"), sql_params or {})).keys()
+    except Exception:
+        return False
+    return _has_single_parcel_id(keys)
+
+
+def _unique_parcel_ids(id_rows):
+    return list(dict.fromkeys(row["parcel_id"] for row in id_rows if row["parcel_id"] is not None))
+
+
+def execute_read_only_paged(engine, sql: str, page_size: int, detail_level: str = "full", sql_params=None):
+    """
+    Run a query for its parcel_ids only, then load the first page of parcels.
+    Returns (parcel_ids, first_page_rows, error); parcel_ids are deduplicated in result order.
+    A query without exactly one parcel_id column is run unpaged instead: parcel_ids is None
+    and the rows are all of its results.
+    """
+    parcel_ids, page = None, None
+    with engine.connect() as con:
+        for statement, params in READ_ONLY_SETUP:
+            con.execute(statement, params)
+        with cancellable_backend(con):
+            if _pageable(con, sql, sql_params):
+                id_rows, error = run_query_cached(_parcel_ids_sql(sql), con, sql_params)
+                if error is None:
+                    parcel_ids = _unique_parcel_ids(id_rows)
+            else:
+                print("Query has no single parcel_id column; running it without paging")
+                page, error = run_query_cached(sql, con, sql_params, needs_geometry_decoding(detail_level))
+        if error is None:
+            if parcel_ids is not None:
+                page = get_parcels(con, parcel_ids[:page_size], detail_level)
+            else:
+                page = apply_detail_level(con, page, detail_level)
+        con.rollback()
+    _record(error)
+    return parcel_ids, page, error
+
+
+async def aexecute_read_only_paged(async_engine, sql: str, page_size: int, detail_level: str = "full", sql_params=None):
+    """execute_read_only_paged for the asyncpg engine"""
+    parcel_ids, page = None, None
+    async with async_engine.connect() as con:
+        for statement, params in READ_ONLY_SETUP:
+            await con.execute(statement, params)
+        async with acancellable_backend(con):
+            if await _apageable(con, sql, sql_params):
+                id_rows, error = await arun_query_cached(_parcel_ids_sql(sql), con, sql_params)
+                if error is None:
+                    parcel_ids = _unique_parcel_ids(id_rows)
+            else:
+                print("Query has no single parcel_id column; running it without paging")
+                page, error = await arun_query_cached(sql, con, sql_params, needs_geometry_decoding(detail_level))
+        if error is None:
+            if parcel_ids is not None:
+                page = await aget_parcels(con, parcel_ids[:page_size], detail_level)
+            else:
+                page = await aapply_detail_level(con, page, detail_level)
+        await con.rollback()
+    _record(error)
+    return parcel_ids, page, error
+
+
+def fetch_result_page(engine, parcel_ids, detail_level: str = "full"):
+    """Load parcels for one page of a result set in a bounded read-only transaction"""
+    with engine.connect() as con:
+        for statement, params in READ_ONLY_SETUP:
+            con.execute(statement, params)
+        rows = get_parcels(con, parcel_ids, detail_level)
+        con.rollback()
+    return rows
+
+
+def stream_read_only(engine, sql: str, on_batch, batch_size: int = STREAM_BATCH_SIZE, detail_level: str = "full", sql_params=None):
+    """
+    Run a query in a bounded read-only transaction, handing converted rows to on_batch
+    in fixed-size batches from a server-side cursor instead of materializing them all.
+    Returns a StreamedResult with the row count, the first batch as a preview, and any error.
+    """
+    with engine.connect() as con:
+        for statement, params in READ_ONLY_SETUP:
+            con.execute(statement, params)
+        key = result_cache_key(sql, con, sql_params)
+        streamed = StreamedResult(key)
+        cached_rows = result_cache.get(key) if key is not None else None
+        if cached_rows is not None:
+            print(f"⚡ Result cache hit ({len(cached_rows)} rows)")
+            for i in range(0, len(cached_rows), batch_size):
+                batch = cached_rows[i:i + batch_size]
+                streamed.add(batch)
+                on_batch(apply_detail_level(con, batch, detail_level))
+        else:
+            try:
+                with cancellable_backend(con):
+                    for batch in iter_query_batches(sql, con, batch_size, sql_params, needs_geometry_decoding(detail_level)):
+                        streamed.add(batch)
+                        on_batch(apply_detail_level(con, batch, detail_level))
+            except Exception as e:
+                streamed.error = str(e)
+                print("Error running query: ", streamed.error)
+            streamed.finish()
+        con.rollback()
+    _record(streamed.error)
+    return streamed
+
+
+async def astream_read_only(async_engine, sql: str, on_batch, batch_size: int = STREAM_BATCH_SIZE, detail_level: str = "full", sql_params=None):
+    """stream_read_only for the asyncpg engine; on_batch is awaited"""
+    async with async_engine.connect() as con:
+        for statement, params in READ_ONLY_SETUP:
+            await con.execute(statement, params)
+        key = await aresult_cache_key(sql, con, sql_params)
+        streamed = StreamedResult(key)
+        cached_rows = result_cache.get(key) if key is not None else None
+        if cached_rows is not None:
+            print(f"⚡ Result cache hit ({len(cached_rows)} rows)")
+            for i in range(0, len(cached_rows), batch_size):
+                batch = cached_rows[i:i + batch_size]
+                streamed.add(batch)
+                await on_batch(await aapply_detail_level(con, batch, detail_level))
+        else:
+            try:
+                async with acancellable_backend(con):
+                    async for batch in aiter_query_batches(sql, con, batch_size, sql_params, needs_geometry_decoding(detail_level)):
+                        streamed.add(batch)
+                        await on_batch(await aapply_detail_level(con, batch, detail_level))
+            except Exception as e:
+                streamed.error = str(e)
+                print("Error running query: ", streamed.error)
+            streamed.finish()
+        await con.rollback()
+    _record(streamed.error)
+    return streamed
+
+
+def pool_metrics(engine) -> dict:
+    """Connection pool usage and query counters for /api/health"""
+    if engine is None:
+        return None
+    pool = engine.pool
+    return {
+        "status": pool.status(),
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": POOL_OPTIONS["max_overflow"],
+        "statement_timeout_ms": STATEMENT_TIMEOUT_MS,
+        "work_mem": WORK_MEM,
+        **query_stats,
+    }
@@ -0,0 +1,123 @@
+"""
+Executed-SQL log for the index advisor.
+
+Every statement run through run_query / arun_query (and the streaming variants) is
+appended to a JSON-lines file with its duration, row count and error. A sample of the
+slow ones is planned with a plain EXPLAIN (planning only, the query is not run again) in
+the same transaction and the plan is stored with the record. Entries are written by a
+background thread, so the request path does no file I/O. db_actions/index_advisor.py
+aggregates the log.
+"""
+from sqlalchemy import text
+from cache_utils import CACHE_DIR
+from db_actions.sql_params import render_sql
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import random
+import threading
+import time
+
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "true").lower() == "true"
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", os.path.join(CACHE_DIR, "query_log.jsonl"))
+# The log is rotated to <path>.1 once it grows past this size
+QUERY_LOG_MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+# Only queries at least this slow are candidates for an EXPLAIN sample
+QUERY_LOG_EXPLAIN_MIN_MS = float(os.getenv("QUERY_LOG_EXPLAIN_MIN_MS", "200"))
+# EXPLAIN still costs a planning round trip inside the request, so only a fraction of slow queries are explained
+QUERY_LOG_EXPLAIN_SAMPLE_RATE = float(os.getenv("QUERY_LOG_EXPLAIN_SAMPLE_RATE", "0.1"))
+
+_lock = threading.Lock()
+# One worker, so entries are appended in the order they were recorded
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-log")
+
+
+def _explain_sql(sql: str):
+    # Not ANALYZE: that would run a slow query a second time before its rows are returned.
+    # The index advisor only needs the scan nodes and their filters.
+    return text(f"EXPLAIN (FORMAT JSON) {sql.strip().rstrip(';')}")
+
+
+def should_explain(duration_ms: float, error) -> bool:
+    return (
+        QUERY_LOG_ENABLED
+        and error is None
+        and duration_ms >= QUERY_LOG_EXPLAIN_MIN_MS
+        and random.random() < QUERY_LOG_EXPLAIN_SAMPLE_RATE
+    )
+
+
+def _plan(explain_rows):
+    # FORMAT JSON returns one row holding a one-element list
+    value = explain_rows[0][0]
+    if isinstance(value, str):
+        value = json.loads(value)
+    return value[0]
+
+
+def explain(con, sql: str, params=None):
+    """EXPLAIN plan for sql, or None if it can't be produced"""
+    try:
+        # Savepoint so a failed EXPLAIN doesn't abort the caller's transaction
+        with con.begin_nested():
+            return _plan(con.execute(_explain_sql(render_sql(sql, params))).all())
+    except Exception as e:
+        print(f"Could not EXPLAIN query for the query log: {e}")
+        return None
+
+
+async def aexplain(con, sql: str, params=None):
+    """explain for an async connection"""
+    try:
+        async with con.begin_nested():
+            return _plan((await con.execute(_explain_sql(render_sql(sql, params)))).all())
+    except Exception as e:
+        print(f"Could not EXPLAIN query for the query log: {e}")
+        return None
+
+
+def record_query(sql: str, duration_ms: float, rows, error, plan=None, params=None) -> None:
+    """Queue one executed statement (and its bind parameters, if any) for the query log; never raises"""
+    if not QUERY_LOG_ENABLED:
+        return
+    entry = {
+        "ts": time.time(),
+        "sql": sql,
+        "duration_ms": round(duration_ms, 2),
+        "rows": rows,
+        "error": error,
+        "plan": plan,
+        "params": params,
+    }
+    try:
+        _writer.submit(_write_entry, entry)
+    except RuntimeError:
+        pass  # Interpreter shutting down
+
+
+def _write_entry(entry: dict) -> None:
+    try:
+        line = json.dumps(entry, default=str) + "\n"
+        with _lock:
+            os.makedirs(os.path.dirname(QUERY_LOG_PATH) or ".", exist_ok=True)
+            if os.path.exists(QUERY_LOG_PATH) and os.path.getsize(QUERY_LOG_PATH) > QUERY_LOG_MAX_BYTES:
+                os.replace(QUERY_LOG_PATH, QUERY_LOG_PATH + ".1")
+            with open(QUERY_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line)
+    except Exception as e:
+        print(f"Could not write query log entry: {e}")
+
+
+def read_query_log(path: str = QUERY_LOG_PATH):
+    """Query log entries, oldest first, including the rotated file; unreadable lines are skipped"""
+    entries = []
+    for log_path in (path + ".1", path):
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return entries
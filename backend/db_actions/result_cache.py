@@ -0,0 +1,189 @@
+"""
+Versioned cache for post-processed query results.
+
+Entries are keyed on the canonicalized SQL text and its bind parameters plus the data
+generation of every table the SQL references. create_db.py / populate_tables.py bump the generation of
+each table they rewrite, so a reload invalidates cached results without any
+explicit flush.
+
+Rows are cached as run_query returned them, so their geometry may still be in driver
+form (see db_utils.convert_result_rows); geometry_lod.apply_detail_level decodes it
+on the way out.
+"""
+from sqlalchemy import text
+from cache_utils import LRUTTLCache
+from db_actions.db_utils import run_query, arun_query
+from db_actions.sql_params import params_key
+import os
+import re
+
+# Schemas whose tables can appear in generated SQL
+DATA_SCHEMAS = ("parcels", "geographic_features", "infrastructure_features")
+
+BUMP_DATA_GENERATION_SQL = """
+    INSERT INTO metadata.data_generations (table_name, generation, updated_at)
+    VALUES (%(table_name)s, 1, now())
+    ON CONFLICT (table_name) DO UPDATE
+    SET generation = metadata.data_generations.generation + 1, updated_at = now()
+"""
+
+result_cache = LRUTTLCache(
+    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "64")),
+    ttl_seconds=float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600")),
+    name="query_results",
+)
+# Larger result sets are not cached to keep worker memory bounded
+RESULT_CACHE_MAX_ROWS = int(os.getenv("RESULT_CACHE_MAX_ROWS", "5000"))
+
+_TABLE_PATTERN = re.compile(r'\b(' + "|".join(DATA_SCHEMAS) + r')\s*\.\s*"?(\w+)"?', re.IGNORECASE)
+_QUOTED_PATTERN = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+
+def canonicalize_sql(sql: str) -> str:
+    """Normalize SQL text so formatting-only differences map to the same cache key.
+
+    Comments are removed, whitespace is collapsed and unquoted text is lowercased.
+    String literals and quoted identifiers are kept verbatim.
+    """
+    sql = re.sub(r"/\*.*?\*/", " ", sql or "", flags=re.DOTALL)
+    parts = _QUOTED_PATTERN.split(sql)
+    canonical = []
+    for i, part in enumerate(parts):
+        if i % 2 == 1:
+            canonical.append(part)  # Quoted literal or identifier
+        else:
+            part = re.sub(r"--[^\n]*", " ", part)
+            canonical.append(re.sub(r"\s+", " ", part).lower())
+    return "".join(canonical).strip().rstrip(";").strip()
+
+
+def referenced_tables(sql: str) -> list:
+    """Fully qualified data tables referenced by a SQL statement"""
+    return sorted({f"{schema.lower()}.{table.lower()}" for schema, table in _TABLE_PATTERN.findall(sql or "")})
+
+
+def bump_data_generation(con, tables) -> None:
+    """Increment the data generation of each table.
+
+    Accepts a SQLAlchemy connection or a psycopg2 cursor; the caller commits.
+    """
+    execute = getattr(con, "exec_driver_sql", None) or con.execute
+    for table_name in tables:
+        execute(BUMP_DATA_GENERATION_SQL, {"table_name": table_name})
+        print(f"Bumped data generation for {table_name}")
+
+
+GET_DATA_GENERATIONS_SQL = text(
+    "SELECT table_name, generation FROM metadata.data_generations WHERE table_name = ANY(:tables)"
+)
+
+
+def _generations_by_table(tables, rows) -> dict:
+    generations = {table_name: 0 for table_name in tables}
+    generations.update({row[0]: row[1] for row in rows})
+    return generations
+
+
+def get_data_generations(con, tables) -> dict:
+    """Current generation of each table (0 if never loaded), or None if the counters can't be read"""
+    if not tables:
+        return {}
+    try:
+        # Savepoint keeps the surrounding transaction usable for the actual query if this fails
+        with con.begin_nested():
+            rows = con.execute(GET_DATA_GENERATIONS_SQL, {"tables": list(tables)}).all()
+    except Exception as e:
+        print(f"Could not read data generations, bypassing result cache: {e}")
+        return None
+    return _generations_by_table(tables, rows)
+
+
+async def aget_data_generations(con, tables) -> dict:
+    """get_data_generations for an async connection"""
+    if not tables:
+        return {}
+    try:
+        async with con.begin_nested():
+            rows = (await con.execute(GET_DATA_GENERATIONS_SQL, {"tables": list(tables)})).all()
+    except Exception as e:
+        print(f"Could not read data generations, bypassing result cache: {e}")
+        return None
+    return _generations_by_table(tables, rows)
+
+
+def _result_key(sql: str, params, generations: dict):
+    if generations is None:
+        return None
+    return (canonicalize_sql(sql), params_key(params), tuple(sorted(generations.items())))
+
+
+def result_cache_key(sql: str, con, params=None):
+    """Cache key for a query at the current data generations, or None if the cache can't be used"""
+    return _result_key(sql, params, get_data_generations(con, referenced_tables(sql)))
+
+
+async def aresult_cache_key(sql: str, con, params=None):
+    """result_cache_key for an async connection"""
+    return _result_key(sql, params, await aget_data_generations(con, referenced_tables(sql)))
+
+
+def run_query_cached(sql: str, con, params=None, decode_geometry=True):
+    """run_query with results served from the versioned result cache when possible"""
+    key = result_cache_key(sql, con, params)
+    if key is None:
+        return run_query(sql, con, params, decode_geometry)
+
+    cached_rows = result_cache.get(key)
+    if cached_rows is not None:
+        print(f"⚡ Result cache hit ({len(cached_rows)} rows)")
+        return cached_rows, None
+
+    rows, error = run_query(sql, con, params, decode_geometry)
+    _store_result(key, rows, error)
+    return rows, error
+
+
+async def arun_query_cached(sql: str, con, params=None, decode_geometry=True):
+    """run_query_cached for an async connection"""
+    key = await aresult_cache_key(sql, con, params)
+    if key is None:
+        return await arun_query(sql, con, params, decode_geometry)
+
+    cached_rows = result_cache.get(key)
+    if cached_rows is not None:
+        print(f"⚡ Result cache hit ({len(cached_rows)} rows)")
+        return cached_rows, None
+
+    rows, error = await arun_query(sql, con, params, decode_geometry)
+    _store_result(key, rows, error)
+    return rows, error
+
+
+def _store_result(key, rows, error) -> None:
+    if key is not None and error is None and rows is not None and len(rows) <= RESULT_CACHE_MAX_ROWS:
+        result_cache.set(key, rows)
+
+
+class StreamedResult:
+    """Tracks a streamed query: row count, parcel_ids, a preview batch, and rows to cache while under the size limit"""
+
+    def __init__(self, key):
+        self.key = key
+        self.row_count = 0
+        self.parcel_ids = []
+        self.preview = []
+        self.error = None
+        self._rows = [] if key is not None else None
+
+    def add(self, batch) -> None:
+        self.row_count += len(batch)
+        self.parcel_ids.extend(row.get("parcel_id") for row in batch)
+        if not self.preview:
+            self.preview = batch
+        if self._rows is not None:
+            self._rows.extend(batch)
+            if len(self._rows) > RESULT_CACHE_MAX_ROWS:
+                self._rows = None  # Too large to cache; stop buffering
+
+    def finish(self) -> None:
+        _store_result(self.key, self._rows, self.error)
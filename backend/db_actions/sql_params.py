@@ -0,0 +1,55 @@
+"""
+Helpers for parameterized SQL (":name" bind parameters, as in sqlalchemy.text).
+
+Compiled filter specs (see filter_spec.py) are executed with their values as
+bind parameters so the statement text, and with it the prepared statement and its
+plan, is shared by every search of the same shape. render_sql inlines the values for
+the places that need self-contained SQL text: EXPLAIN, the query log, repair prompts
+and the SQL shown to the user.
+"""
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import re
+
+# ":name", but not the second colon of a "::type" cast or a time literal like '12:30'
+_PARAM_PATTERN = re.compile(r"(?<![:\w]):(\w+)")
+
+
+def param_names(sql: str) -> list:
+    """Bind parameter names in order of first appearance"""
+    return list(dict.fromkeys(_PARAM_PATTERN.findall(sql)))
+
+
+def _literal(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return "ARRAY[" + ", ".join(_literal(v) for v in value) + "]"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def render_sql(sql: str, params: Optional[Dict[str, Any]]) -> str:
+    """sql with its bind parameters replaced by literals (unchanged without params)"""
+    if not params:
+        return sql
+    return _PARAM_PATTERN.sub(lambda m: _literal(params[m.group(1)]) if m.group(1) in params else m.group(0), sql)
+
+
+def prepared_statement(sql: str):
+    """(statement name, PREPARE body with $n placeholders, parameter names in $n order)"""
+    names = param_names(sql)
+    body = _PARAM_PATTERN.sub(lambda m: f"${names.index(m.group(1)) + 1}", sql.strip().rstrip(";"))
+    name = "stmt_" + hashlib.sha1(body.encode("utf-8")).hexdigest()[:16]
+    return name, body, names
+
+
+def params_key(params: Optional[Dict[str, Any]]):
+    """Hashable digest of a parameter dict for cache keys (parameters can hold long parcel_id lists)"""
+    if not params:
+        return None
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
@@ -0,0 +1,76 @@
+"""
+Mapbox Vector Tiles for registered search result sets.
+
+Tiles are rendered with ST_AsMVT over parcels.parcel_details and cached in memory
+(LRU) and on disk (LRU by total size). A result set's parcel_ids never change
+after registration, so cached tiles never need invalidating, only evicting.
+"""
+from sqlalchemy import text
+from cache_utils import LRUTTLCache, DiskLRUCache, CACHE_DIR
+from db_actions.query_engine import READ_ONLY_SETUP
+import os
+
+MAX_ZOOM = 22
+# Tile extent and clipping buffer in tile coordinates (ST_AsMVTGeom defaults)
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+
+# The tile envelope is projected to EPSG:26986 so the filter uses the geometry_26986 GIST index
+TILE_SQL = text(f"""
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(:z, :x, :y) AS geom
+    ),
+    tile AS (
+        SELECT
+            ST_AsMVTGeom(ST_Transform(p.geometry, 3857), bounds.geom, {TILE_EXTENT}, {TILE_BUFFER}, true) AS geom,
+            p.parcel_id,
+            p.full_address,
+            p.municipality_name,
+            p.area_acres,
+            p.ground_mounted_capacity_kw
+        FROM parcels.parcel_details p, bounds
+        WHERE p.parcel_id = ANY(:parcel_ids)
+          AND p.geometry_26986 && ST_Transform(bounds.geom, 26986)
+    )
+    SELECT ST_AsMVT(tile, 'parcels', {TILE_EXTENT}, 'geom') FROM tile
+""")
+
+tile_cache = LRUTTLCache(
+    max_entries=int(os.getenv("TILE_CACHE_MAX_ENTRIES", "4096")),
+    ttl_seconds=float(os.getenv("TILE_CACHE_TTL_SECONDS", "86400")),
+    name="tiles",
+)
+tile_disk_cache = DiskLRUCache(
+    os.path.join(CACHE_DIR, "tiles"),
+    max_bytes=int(os.getenv("TILE_CACHE_DISK_MAX_MB", "512")) * 1024 * 1024,
+    name="tiles_disk",
+)
+
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def render_tile(engine, parcel_ids, z: int, x: int, y: int) -> bytes:
+    """Render one tile of the given parcels in a bounded read-only transaction"""
+    with engine.connect() as con:
+        for statement, params in READ_ONLY_SETUP:
+            con.execute(statement, params)
+        tile = con.execute(TILE_SQL, {"z": z, "x": x, "y": y, "parcel_ids": list(parcel_ids)}).scalar()
+        con.rollback()
+    # ST_AsMVT returns NULL (or empty bytea) when nothing intersects the tile
+    return bytes(tile) if tile else b""
+
+
+def get_tile(engine, result_id: str, parcel_ids, z: int, x: int, y: int) -> bytes:
+    """Tile for a result set, from the memory cache, the disk cache, or rendered"""
+    key = (result_id, z, x, y)
+    tile = tile_cache.get(key)
+    if tile is not None:
+        return tile
+    tile = tile_disk_cache.get(key)
+    if tile is None:
+        tile = render_tile(engine, parcel_ids, z, x, y)
+        tile_disk_cache.set(key, tile)
+    tile_cache.set(key, tile)
+    return tile
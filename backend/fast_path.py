@@ -0,0 +1,301 @@
+"""
+Rule-based parser for formulaic parcel searches.
+
+Much of the traffic is acreage thresholds, a county or municipality, capacity in MW/kW,
+parcel value and "within X miles of a substation". FastPathParser recognizes those
+shapes (with unit conversion) and builds the SQL directly, so the search skips the
+topic filter, vague-condition check, SQL generation and explanation LLM calls.
+
+A query is only handled when every word is accounted for: each recognized phrase is
+removed, and anything left over other than filler words ("find", "parcels", "in", ...)
+means the parser doesn't understand the query and it goes to the LLM unchanged.
+Phrases without an explicit number or comparator ("large", "near") are deliberately
+not recognized; resolve_vague_conditions handles those.
+"""
+from typing import Iterable, List, Optional
+import re
+
+# Massachusetts counties, as stored (uppercase, no "County" suffix) in parcels.parcel_details.county_name
+COUNTIES = (
+    "BARNSTABLE", "BERKSHIRE", "BRISTOL", "DUKES", "ESSEX", "FRANKLIN", "HAMPDEN",
+    "HAMPSHIRE", "MIDDLESEX", "NANTUCKET", "NORFOLK", "PLYMOUTH", "SUFFOLK", "WORCESTER",
+)
+
+# Columns every search returns (see the output instructions in prompts/text_to_sql_prompts.py)
+SELECT_COLUMNS = (
+    "pd.parcel_id", "pd.geometry", "pd.full_address", "pd.county_name", "pd.area_acres",
+    "pd.municipality_name", "pd.owner_name", "pd.total_value", "pd.ground_mounted_capacity_kw",
+)
+
+NUMBER = r"(\d+(?:\.\d+)?)"
+# Comparator phrase -> SQL operator; longer phrases first so "no more than" wins over "more than"
+COMPARATORS = [
+    (r"no less than|not less than|at least|minimum of|minimum|min\.?|>=", ">="),
+    (r"no more than|not more than|at most|maximum of|maximum|max\.?|up to|<=", "<="),
+    (r"more than|greater than|bigger than|larger than|over|above|exceeding|>", ">"),
+    (r"less than|fewer than|smaller than|under|below|<", "<"),
+]
+COMPARATOR = "|".join(phrase for phrase, _ in COMPARATORS)
+# "20 acres or more", "20+ acres"
+SUFFIX_COMPARATORS = [
+    (r"or (?:more|larger|bigger|greater|above)", ">="),
+    (r"or (?:less|smaller|fewer|below)", "<="),
+]
+SUFFIX_COMPARATOR = "|".join(phrase for phrase, _ in SUFFIX_COMPARATORS)
+
+AREA_UNITS = [
+    (r"acres?|ac", 1.0),
+    (r"hectares?|ha", 2.4710538),
+    (r"square (?:meters|metres|meter|metre)|sq\.? ?m|m2", 1 / 4046.8564224),
+    (r"square (?:feet|foot)|sq\.? ?ft|ft2", 1 / 43560.0),
+]
+CAPACITY_UNITS = [
+    (r"megawatts?|mw", 1000.0),
+    (r"kilowatts?|kw", 1.0),
+]
+DISTANCE_UNITS = [
+    (r"miles?|mi", 1609.344),
+    (r"kilometers?|kilometres?|km", 1000.0),
+    (r"meters?|metres?|m", 1.0),
+    (r"feet|foot|ft", 0.3048),
+    (r"yards?|yd", 0.9144),
+]
+VALUE_MULTIPLIERS = {"k": 1e3, "thousand": 1e3, "m": 1e6, "mm": 1e6, "million": 1e6}
+
+# Distance comparators: "within 1 mile of" is <=, "at least 2 km from" is >=
+DISTANCE_COMPARATORS = [
+    (r"within|less than|under|closer than|no more than|no farther than|no further than|at most|up to", "<="),
+    (r"more than|over|beyond|farther than|further than|at least|no closer than|not within|outside(?: of)?", ">="),
+]
+DISTANCE_COMPARATOR = "|".join(phrase for phrase, _ in DISTANCE_COMPARATORS)
+# Feature phrase -> (parcels.parcel_proximity column, description)
+DISTANCE_FEATURES = [
+    (r"(?:electric(?:al)? )?substations?", "substation_distance_m", "a substation"),
+    (r"(?:(?:electric(?:al)?|power|transmission|electric transmission) )+lines?|power ?lines?", "power_line_distance_m", "a power line"),
+    (r"highways?|motorways?|interstates?", "motorway_distance_m", "a motorway"),
+    (r"roads?", "road_distance_m", "a road"),
+]
+
+# Words that may remain once every condition has been recognized. Connectives like "or"
+# are deliberately absent: every predicate is ANDed, so a leftover "or" means a disjunction
+# the parser can't express and the query goes to the LLM
+FILLER_WORDS = {
+    "a", "all", "an", "and", "any", "are", "available", "be", "can", "development", "developments",
+    "do", "find", "for", "get", "give", "have", "having", "i", "in", "is", "land", "list", "located",
+    "looking", "lot", "lots", "ma", "massachusetts", "me", "need", "of", "parcel", "parcels", "please",
+    "properties", "property", "search", "show", "site", "sites", "solar", "state", "that", "the",
+    "there", "which", "with", "want", "what", "where", "whose", "you", "to", "size", "area", "acreage",
+    "capacity", "each", "every", "potential", "candidate", "candidates", "possible",
+    "it", "they", "them", "their", "its", "were", "those", "these",
+}
+
+
+def _alternation(phrases) -> str:
+    return "|".join(f"(?:{phrase})" for phrase in phrases)
+
+
+def _lookup(pairs, text: str):
+    """Value of the first (pattern, value) pair whose pattern fully matches text"""
+    for pattern, value in pairs:
+        if re.fullmatch(pattern, text):
+            return value
+    raise KeyError(text)
+
+
+def _number(value: float) -> str:
+    return f"{value:.6g}" if value != int(value) else str(int(value))
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+OPERATOR_WORDS = {">=": "at least", ">": "more than", "<=": "at most", "<": "less than"}
+
+
+class FastPathParser:
+    """Parses formulaic parcel searches into SQL; None for anything it can't fully cover"""
+
+    def __init__(self, municipalities: Iterable[str] = ()):
+        self.municipalities = sorted({m.upper() for m in municipalities if m}, key=len, reverse=True)
+        counties = _alternation(re.escape(c.lower()) for c in COUNTIES)
+        self._county = re.compile(
+            rf"\b(?:in\s+)?((?:{counties})(?:\s*(?:,\s*)?(?:or|and|,)\s*(?:{counties}))*)\s+count(?:y|ies)\b"
+        )
+        self._county_name = re.compile(counties)
+        self._municipality = None
+        if self.municipalities:
+            towns = _alternation(re.escape(m.lower()) for m in self.municipalities)
+            self._municipality = re.compile(
+                rf"\b(?:in|within)\s+(?:the\s+)?(?:(?:town|city)\s+of\s+)?({towns})\b(?:\s+(?:town|city))?"
+            )
+
+        area_units = _alternation(p for p, _ in AREA_UNITS)
+        self._area_between = re.compile(
+            rf"\bbetween\s+{NUMBER}\s*(?:and|to|-)\s*{NUMBER}\s*({area_units})\b"
+        )
+        self._area = re.compile(
+            rf"(?:\b({COMPARATOR})\s+)?{NUMBER}\s*(\+)?[\s-]*({area_units})\b(?:\s+({SUFFIX_COMPARATOR})\b)?"
+        )
+        capacity_units = _alternation(p for p, _ in CAPACITY_UNITS)
+        self._capacity = re.compile(
+            rf"(?:\b({COMPARATOR})\s+)?{NUMBER}\s*(\+)?[\s-]*({capacity_units})\b(?:\s+({SUFFIX_COMPARATOR})\b)?"
+            rf"(?:\s+(?:of\s+)?(?:(?:ground[- ]mounted|solar)\s+)*capacity\b)?"
+        )
+        multipliers = _alternation(VALUE_MULTIPLIERS)
+        value_words = r"(?:(?:total|assessed)\s+)?(?:value[ds]?|worth|priced)"
+        self._value_before = re.compile(
+            rf"\b{value_words}\s+(?:(?:of|at)\s+)?(?:({COMPARATOR})\s+)?\$\s?{NUMBER}\s*({multipliers})?\b"
+        )
+        self._value_after = re.compile(
+            rf"(?:\b({COMPARATOR})\s+)?\$\s?{NUMBER}\s*({multipliers})?\b(?:\s+(?:in\s+)?{value_words}\b)?"
+        )
+        distance_units = _alternation(p for p, _ in DISTANCE_UNITS)
+        features = _alternation(p for p, _, _ in DISTANCE_FEATURES)
+        self._distance = re.compile(
+            rf"\b({DISTANCE_COMPARATOR})\s+{NUMBER}\s*({distance_units})\s+(?:away\s+)?(?:of|from|to)\s+"
+            rf"(?:(?:an?|the|any|nearest|closest)\s+)*({features})\b"
+        )
+        self._distance_suffix = re.compile(
+            rf"\b{NUMBER}\s*({distance_units})\s+(?:or\s+(more|further|farther|less|closer)\s+)?(?:away\s+)?(?:of|from)\s+"
+            rf"(?:(?:an?|the|any|nearest|closest)\s+)*({features})\b"
+        )
+
+    # --- condition parsers: each returns (predicate, description, needs_proximity) and the text with the phrase removed ---
+
+    def _take(self, pattern, text: str, handler, conditions: list) -> str:
+        def replace(match):
+            conditions.append(handler(match))
+            return " "
+        return pattern.sub(replace, text)
+
+    @staticmethod
+    def _operator(comparator: Optional[str], plus: Optional[str], suffix: Optional[str]) -> str:
+        if comparator:
+            return _lookup(COMPARATORS, comparator)
+        if suffix:
+            return _lookup(SUFFIX_COMPARATORS, suffix)
+        # A bare number means "at least" (same rule the SQL prompt gives the LLM)
+        return ">="
+
+    def _area_condition(self, match):
+        comparator, number, plus, unit, suffix = match.groups()
+        acres = float(number) * _lookup(AREA_UNITS, unit)
+        operator = self._operator(comparator, plus, suffix)
+        return f"pd.area_acres {operator} {_number(round(acres, 4))}", f"of {OPERATOR_WORDS[operator]} {_number(round(acres, 2))} acres", False
+
+    def _area_between_condition(self, match):
+        low, high, unit = match.groups()
+        factor = _lookup(AREA_UNITS, unit)
+        low, high = sorted((float(low) * factor, float(high) * factor))
+        return (
+            f"pd.area_acres BETWEEN {_number(round(low, 4))} AND {_number(round(high, 4))}",
+            f"of between {_number(round(low, 2))} and {_number(round(high, 2))} acres",
+            False,
+        )
+
+    def _capacity_condition(self, match):
+        comparator, number, plus, unit, suffix = match.groups()
+        kw = float(number) * _lookup(CAPACITY_UNITS, unit)
+        operator = self._operator(comparator, plus, suffix)
+        return (
+            f"pd.ground_mounted_capacity_kw {operator} {_number(kw)}",
+            f"with {OPERATOR_WORDS[operator]} {_number(kw)} kW of ground-mounted capacity",
+            False,
+        )
+
+    def _value_condition(self, match):
+        comparator, number, multiplier = match.groups()
+        dollars = float(number) * VALUE_MULTIPLIERS.get(multiplier or "", 1)
+        operator = _lookup(COMPARATORS, comparator) if comparator else ">="
+        return f"pd.total_value {operator} {_number(dollars)}", f"valued at {OPERATOR_WORDS[operator]} ${dollars:,.0f}", False
+
+    def _distance_condition(self, match):
+        comparator, number, unit, feature = match.groups()
+        return self._distance_predicate(_lookup(DISTANCE_COMPARATORS, comparator), number, unit, feature)
+
+    def _distance_suffix_condition(self, match):
+        number, unit, direction, feature = match.groups()
+        if direction is None:
+            # "2 miles from a substation" doesn't say within or beyond
+            raise _Ambiguous()
+        operator = ">=" if direction in ("more", "further", "farther") else "<="
+        return self._distance_predicate(operator, number, unit, feature)
+
+    @staticmethod
+    def _distance_predicate(operator: str, number: str, unit: str, feature: str):
+        meters = float(number) * _lookup(DISTANCE_UNITS, unit)
+        column, description = next((col, desc) for pattern, col, desc in DISTANCE_FEATURES if re.fullmatch(pattern, feature))
+        words = "within {} of" if operator == "<=" else "at least {} from"
+        return (
+            f"pp.{column} {operator} {_number(round(meters, 1))}",
+            words.format(f"{_number(float(number))} {unit} ({_number(round(meters))} m)") + f" {description}",
+            True,
+        )
+
+    def _county_condition(self, match):
+        names = [name.upper() for name in self._county_name.findall(match.group(1))]
+        names = list(dict.fromkeys(names))
+        if len(names) == 1:
+            return f"pd.county_name = {_quote(names[0])}", f"in {names[0].title()} County", False
+        return (
+            f"pd.county_name IN ({', '.join(_quote(n) for n in names)})",
+            f"in {' or '.join(n.title() for n in names)} County",
+            False,
+        )
+
+    def _municipality_condition(self, match):
+        name = match.group(1).upper()
+        return f"pd.municipality_name = {_quote(name)}", f"in {name.title()}", False
+
+    # --- query parsing ---
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        text = query.lower()
+        text = re.sub(r"(?<=\d),(?=\d{3}\b)", "", text)  # 1,000 -> 1000
+        text = re.sub(r"[?!;:\"()]|\.(?!\d)", " ", text)
+        return re.sub(r"\s+", " ", text).strip()
+
+    def parse(self, query: Optional[str]):
+        """(sql, explanation) if every part of the query was recognized, otherwise None"""
+        if not query:
+            return None
+        text = self._normalize(query)
+        conditions = []
+        try:
+            # Order matters: "between" before single bounds, counties before towns that share their name
+            text = self._take(self._area_between, text, self._area_between_condition, conditions)
+            text = self._take(self._distance, text, self._distance_condition, conditions)
+            text = self._take(self._distance_suffix, text, self._distance_suffix_condition, conditions)
+            text = self._take(self._area, text, self._area_condition, conditions)
+            text = self._take(self._capacity, text, self._capacity_condition, conditions)
+            text = self._take(self._value_before, text, self._value_condition, conditions)
+            text = self._take(self._value_after, text, self._value_condition, conditions)
+            text = self._take(self._county, text, self._county_condition, conditions)
+            if self._municipality is not None:
+                text = self._take(self._municipality, text, self._municipality_condition, conditions)
+        except (_Ambiguous, KeyError):
+            return None
+
+        leftover = [word for word in re.split(r"[\s,]+", text) if word and word not in FILLER_WORDS]
+        if not conditions or leftover:
+            return None
+        return self._sql(conditions), self._explanation(conditions)
+
+    @staticmethod
+    def _sql(conditions: List[tuple]) -> str:
+        sql = f"SELECT {', '.join(SELECT_COLUMNS)}\nFROM parcels.parcel_details pd"
+        if any(needs_proximity for _, _, needs_proximity in conditions):
+            sql += "\nJOIN parcels.parcel_proximity pp ON pp.parcel_id = pd.parcel_id"
+        predicates = list(dict.fromkeys(predicate for predicate, _, _ in conditions))
+        return sql + "\nWHERE " + "\n  AND ".join(predicates) + ";"
+
+    @staticmethod
+    def _explanation(conditions: List[tuple]) -> str:
+        descriptions = list(dict.fromkeys(description for _, description, _ in conditions))
+        return "This search looks for parcels " + ", ".join(descriptions) + "."
+
+
+class _Ambiguous(Exception):
+    """A recognized phrase that doesn't pin down the condition (the query goes to the LLM)"""
@@ -0,0 +1,206 @@
+"""
+Typed filter specs for parcel searches, compiled to parameterized SQL.
+
+With SQL_GENERATION_MODE=filter_spec the LLM fills in a FilterSpec (structured output)
+instead of writing SQL. compile_filter_spec turns it into SQL from the fixed templates
+below: attribute ranges on parcels.parcel_details, counties and municipalities,
+distances from the precomputed parcels.parcel_proximity columns, coverage fractions
+from parcels.parcel_constraints, and exclusions against the *_subdivided constraint
+layers with ST_Intersects/ST_DWithin on geometry_26986, so every predicate can use an
+index. Values are bind parameters and predicates are emitted in a fixed order, so
+every spec of the same shape compiles to the same statement text and reuses one
+prepared statement and plan (see db_actions/db_utils.py).
+
+Specs the LLM marks unsupported (anything the templates can't express) fall back to
+free-form SQL generation.
+
+A follow-up that only narrows the previous turn's spec (tighter ranges, a subset of
+its counties, new attribute filters) can only match parcels the previous turn
+returned, so narrows() lets sql_agent compile it restricted to that parcel_id set
+instead of re-running the spatial filters over every parcel. Relaxing a constraint or
+adding one against another layer needs the full query.
+"""
+from typing import Any, Dict, List, Literal, Optional, Tuple
+from pydantic import BaseModel, Field
+from db_actions.parcel_constraints import LAYERS
+from fast_path import COUNTIES, SELECT_COLUMNS
+
+AttributeName = Literal["area_acres", "total_value", "ground_mounted_capacity_kw"]
+ProximityFeature = Literal[
+    "substation", "power_line", "power_line_under_69kv", "power_line_69_to_138kv", "power_line_138kv_plus",
+    "road", "motorway", "primary_road", "secondary_road", "tertiary_road", "unclassified_road",
+    "residential_road", "living_street", "service_road",
+]
+ConstraintLayer = Literal[tuple(LAYERS)]
+
+
+class AttributeRange(BaseModel):
+    """Inclusive range on a parcels.parcel_details column"""
+    attribute: AttributeName = Field(description="area_acres (acres), total_value (USD) or ground_mounted_capacity_kw (kW; 1 MW = 1000 kW)")
+    min: Optional[float] = Field(None, description="Inclusive lower bound, converted to the attribute's unit")
+    max: Optional[float] = Field(None, description="Inclusive upper bound, converted to the attribute's unit")
+
+
+class ProximityConstraint(BaseModel):
+    """Distance from the parcel boundary to the nearest feature of a kind"""
+    feature: ProximityFeature
+    max_distance_m: Optional[float] = Field(None, description="Within this many meters (e.g. 'within 1 mile' is 1609.344)")
+    min_distance_m: Optional[float] = Field(None, description="At least this many meters away")
+
+
+class CoverageConstraint(BaseModel):
+    """Fraction (0 to 1) of the parcel covered by a constraint layer"""
+    layer: ConstraintLayer
+    max_fraction: Optional[float] = Field(None, description="e.g. 'less than 5% wetlands' is 0.05; 'no wetlands' is 0")
+    min_fraction: Optional[float] = None
+
+
+class ExclusionConstraint(BaseModel):
+    """No part of the constraint layer within buffer_m of the parcel"""
+    layer: ConstraintLayer
+    buffer_m: float = Field(0, description="0 means the parcel must not touch the layer at all")
+
+
+class FilterSpec(BaseModel):
+    """Parcel search expressed with the supported filters only"""
+    supported: bool = Field(description="False if any part of the question can't be expressed with these filters")
+    unsupported_reason: Optional[str] = None
+    attributes: List[AttributeRange] = Field(default_factory=list)
+    counties: List[str] = Field(default_factory=list, description="Massachusetts county names without 'County'")
+    municipalities: List[str] = Field(default_factory=list, description="City or town names")
+    proximity: List[ProximityConstraint] = Field(default_factory=list)
+    coverage: List[CoverageConstraint] = Field(default_factory=list)
+    exclusions: List[ExclusionConstraint] = Field(default_factory=list)
+
+
+# Constraint kinds evaluated against a proximity or constraint layer; adding one needs the full query
+LAYER_CONSTRAINTS = {"proximity", "coverage", "exclusion"}
+
+
+def _counties(spec: FilterSpec) -> List[str]:
+    return sorted({county.upper().removesuffix(" COUNTY").strip() for county in spec.counties})
+
+
+def _municipalities(spec: FilterSpec) -> List[str]:
+    return sorted({m.upper().strip() for m in spec.municipalities})
+
+
+def _bounds(spec: FilterSpec) -> Dict[tuple, tuple]:
+    """(kind, name) -> (lower, upper) bound, intersected over repeated constraints"""
+    bounds = {}
+
+    def add(key, low, high):
+        old_low, old_high = bounds.get(key, (None, None))
+        bounds[key] = (
+            low if old_low is None else old_low if low is None else max(old_low, low),
+            high if old_high is None else old_high if high is None else min(old_high, high),
+        )
+
+    for attribute in spec.attributes:
+        add(("attribute", attribute.attribute), attribute.min, attribute.max)
+    for proximity in spec.proximity:
+        add(("proximity", proximity.feature), proximity.min_distance_m, proximity.max_distance_m)
+    for coverage in spec.coverage:
+        add(("coverage", coverage.layer), coverage.min_fraction, coverage.max_fraction)
+    for exclusion in spec.exclusions:
+        # A wider buffer excludes more, so it is a lower bound
+        add(("exclusion", exclusion.layer), exclusion.buffer_m, None)
+    return bounds
+
+
+def narrows(base: FilterSpec, spec: FilterSpec) -> bool:
+    """True if every parcel matching spec matches base and spec adds no constraint against a new layer"""
+    base_bounds, bounds = _bounds(base), _bounds(spec)
+    for key, (low, high) in base_bounds.items():
+        if key not in bounds:
+            return False
+        new_low, new_high = bounds[key]
+        if low is not None and (new_low is None or new_low < low):
+            return False
+        if high is not None and (new_high is None or new_high > high):
+            return False
+    if any(kind in LAYER_CONSTRAINTS and (kind, name) not in base_bounds for kind, name in bounds):
+        return False
+    for values in (_counties, _municipalities):
+        base_values, new_values = set(values(base)), set(values(spec))
+        if base_values and not (new_values and new_values <= base_values):
+            return False
+    return True
+
+
+def _range_predicates(column: str, name: str, low, high, params: Dict[str, Any]) -> List[str]:
+    predicates = []
+    if low is not None:
+        params[f"{name}_min"] = low
+        predicates.append(f"{column} >= :{name}_min")
+    if high is not None:
+        params[f"{name}_max"] = high
+        predicates.append(f"{column} <= :{name}_max")
+    return predicates
+
+
+def _exclusion_predicate(layer: str, buffer_m: float, params: Dict[str, Any]) -> str:
+    table, feature_filter = LAYERS[layer]
+    if buffer_m > 0:
+        params[f"{layer}_buffer_m"] = buffer_m
+        spatial = f"ST_DWithin(f.geometry_26986, pd.geometry_26986, :{layer}_buffer_m)"
+    else:
+        spatial = "ST_Intersects(f.geometry_26986, pd.geometry_26986)"
+    conditions = [feature_filter, spatial] if feature_filter else [spatial]
+    return f"NOT EXISTS (SELECT 1 FROM {table}_subdivided f WHERE {' AND '.join(conditions)})"
+
+
+def compile_filter_spec(spec: FilterSpec, within: Optional[List[str]] = None) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    (SQL with :name bind parameters, parameters), or None if the spec is unsupported, has no
+    filters or contradicts itself (repeated constraints on a column with no overlap).
+    within restricts the search to those parcel_ids (the previous result set of a narrowing follow-up).
+    """
+    if not spec.supported:
+        return None
+    counties = _counties(spec)
+    if any(county not in COUNTIES for county in counties):
+        return None
+    # Repeated constraints on the same column compile to their intersection, the same bounds narrows() compares
+    bounds = _bounds(spec)
+    if any(low is not None and high is not None and low > high for low, high in bounds.values()):
+        return None
+
+    params: Dict[str, Any] = {}
+    predicates = []
+    if within is not None:
+        # First, so the planner starts from the primary key lookups
+        params["within_parcel_ids"] = list(within)
+        predicates.append("pd.parcel_id = ANY(:within_parcel_ids)")
+
+    def ranges(kind):
+        # Sorted so the statement text depends only on which filters are used, not the order the LLM listed them in
+        return sorted((name, low, high) for (k, name), (low, high) in bounds.items() if k == kind)
+
+    for attribute, low, high in ranges("attribute"):
+        predicates += _range_predicates(f"pd.{attribute}", attribute, low, high, params)
+    if counties:
+        params["counties"] = counties
+        predicates.append("pd.county_name = ANY(:counties)")
+    municipalities = _municipalities(spec)
+    if municipalities:
+        params["municipalities"] = municipalities
+        predicates.append("pd.municipality_name = ANY(:municipalities)")
+    for feature, low, high in ranges("proximity"):
+        column = f"{feature}_distance_m"
+        predicates += _range_predicates(f"pp.{column}", column, low, high, params)
+    for layer, low, high in ranges("coverage"):
+        column = f"{layer}_fraction"
+        predicates += _range_predicates(f"pc.{column}", column, low, high, params)
+    # The lower bound of an exclusion is its widest buffer, which implies the others
+    for layer, buffer_m, _ in ranges("exclusion"):
+        predicates.append(_exclusion_predicate(layer, buffer_m, params))
+    if len(predicates) == (within is not None):
+        return None
+
+    sql = f"SELECT {', '.join(SELECT_COLUMNS)}\nFROM parcels.parcel_details pd"
+    if any(p.startswith("pp.") for p in predicates):
+        sql += "\nJOIN parcels.parcel_proximity pp ON pp.parcel_id = pd.parcel_id"
+    if any(p.startswith("pc.") for p in predicates):
+        sql += "\nJOIN parcels.parcel_constraints pc ON pc.parcel_id = pd.parcel_id"
+    return sql + "\nWHERE " + "\n  AND ".join(predicates) + ";", params
@@ -0,0 +1,196 @@
+"""
+Search latency and LLM token metrics.
+
+Process-wide histograms, exported in the Prometheus text format at /api/metrics, plus
+a SearchTiming for each search. api_server sets current_timing for the duration of a
+/api/search request (like cancellation.current_search); graph nodes, LLM calls, query
+execution and geometry decoding record into both, and the search's totals are sent as
+the timing block of its final SSE event.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 5000, 10000, 50000, 100000)
+
+
+def _format_value(value) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    """Histogram with optional labels, rendered with cumulative buckets like prometheus_client's"""
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...], labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labels = labels
+        # label values -> [per-bucket counts (not cumulative), sum, count]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        # Buckets are "less than or equal", so a value on a boundary counts in that bucket
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, [list(counts), total, count]) for key, (counts, total, count) in self._series.items())
+        for key, (counts, total, count) in series:
+            label_pairs = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key)]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = ",".join(label_pairs + [f'le="{_format_value(bound)}"'])
+                lines.append(f"{self.name}_bucket{{{le}}} {cumulative}")
+            le = ",".join(label_pairs + ['le="+Inf"'])
+            lines.append(f"{self.name}_bucket{{{le}}} {count}")
+            suffix = f"{{{','.join(label_pairs)}}}" if label_pairs else ""
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+SEARCH_DURATION = Histogram("search_duration_seconds", "Wall time of a /api/search request up to its final event", LATENCY_BUCKETS)
+NODE_DURATION = Histogram("search_node_duration_seconds", "Wall time of a graph node", LATENCY_BUCKETS, ("node",))
+LLM_DURATION = Histogram("llm_call_duration_seconds", "Wall time of an LLM call", LATENCY_BUCKETS, ("node",))
+LLM_PROMPT_TOKENS = Histogram("llm_prompt_tokens", "Prompt tokens per LLM call", TOKEN_BUCKETS, ("node",))
+LLM_COMPLETION_TOKENS = Histogram("llm_completion_tokens", "Completion tokens per LLM call", TOKEN_BUCKETS, ("node",))
+DB_DURATION = Histogram("db_query_duration_seconds", "Query execution time, including result conversion", LATENCY_BUCKETS)
+DB_ROWS = Histogram("db_query_rows", "Rows returned per query", ROW_BUCKETS)
+GEOMETRY_DURATION = Histogram("geometry_serialization_seconds", "Time decoding a geometry column to GeoJSON", LATENCY_BUCKETS)
+
+HISTOGRAMS = [
+    SEARCH_DURATION, NODE_DURATION, LLM_DURATION, LLM_PROMPT_TOKENS, LLM_COMPLETION_TOKENS,
+    DB_DURATION, DB_ROWS, GEOMETRY_DURATION,
+]
+
+
+def render_metrics() -> str:
+    """All histograms in the Prometheus text exposition format"""
+    return "\n".join(line for histogram in HISTOGRAMS for line in histogram.render()) + "\n"
+
+
+class SearchTiming:
+    """Per-search totals; nodes and the unmatched check can record from other threads"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.nodes: Dict[str, Dict[str, float]] = {}
+        self.llm = {"calls": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+        self.db = {"queries": 0, "seconds": 0.0, "rows": 0}
+        self.geometry_seconds = 0.0
+        self.total_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add_node(self, node: str, seconds: float) -> None:
+        with self._lock:
+            totals = self.nodes.setdefault(node, {"calls": 0, "seconds": 0.0})
+            totals["calls"] += 1
+            totals["seconds"] += seconds
+
+    def add_llm_call(self, seconds: float, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.llm["calls"] += 1
+            self.llm["seconds"] += seconds
+            self.llm["prompt_tokens"] += prompt_tokens
+            self.llm["completion_tokens"] += completion_tokens
+
+    def add_query(self, seconds: float, rows: int) -> None:
+        with self._lock:
+            self.db["queries"] += 1
+            self.db["seconds"] += seconds
+            self.db["rows"] += rows
+
+    def add_geometry(self, seconds: float) -> None:
+        with self._lock:
+            self.geometry_seconds += seconds
+
+    def finish(self) -> dict:
+        """Record the search's total time (once) and return its summary"""
+        with self._lock:
+            first = self.total_seconds is None
+            if first:
+                self.total_seconds = time.perf_counter() - self.start
+        if first:
+            SEARCH_DURATION.observe(self.total_seconds)
+        return self.summary()
+
+    def summary(self) -> dict:
+        with self._lock:
+            total = self.total_seconds if self.total_seconds is not None else time.perf_counter() - self.start
+            return {
+                "total_seconds": round(total, 4),
+                "nodes": {
+                    node: {"calls": int(totals["calls"]), "seconds": round(totals["seconds"], 4)}
+                    for node, totals in self.nodes.items()
+                },
+                "llm": {**self.llm, "seconds": round(self.llm["seconds"], 4)},
+                "db": {**self.db, "seconds": round(self.db["seconds"], 4)},
+                "geometry_serialization_seconds": round(self.geometry_seconds, 4),
+            }
+
+
+current_timing: ContextVar[Optional[SearchTiming]] = ContextVar("current_timing", default=None)
+# Graph node currently running, so LLM calls can be attributed to it
+current_node: ContextVar[Optional[str]] = ContextVar("current_node", default=None)
+
+
+@contextmanager
+def timed_node(node: str):
+    """Time a graph node (or background check) and attribute the LLM calls made inside it"""
+    token = current_node.set(node)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        current_node.reset(token)
+        NODE_DURATION.observe(seconds, node=node)
+        timing = current_timing.get()
+        if timing is not None:
+            timing.add_node(node, seconds)
+
+
+def record_llm_call(seconds: float, prompt_tokens: int, completion_tokens: int, node: Optional[str] = None) -> None:
+    node = node or current_node.get() or "unknown"
+    LLM_DURATION.observe(seconds, node=node)
+    LLM_PROMPT_TOKENS.observe(prompt_tokens, node=node)
+    LLM_COMPLETION_TOKENS.observe(completion_tokens, node=node)
+    timing = current_timing.get()
+    if timing is not None:
+        timing.add_llm_call(seconds, prompt_tokens, completion_tokens)
+
+
+def record_db_query(seconds: float, rows: Optional[int]) -> None:
+    DB_DURATION.observe(seconds)
+    if rows is not None:
+        DB_ROWS.observe(rows)
+    timing = current_timing.get()
+    if timing is not None:
+        timing.add_query(seconds, rows or 0)
+
+
+def record_geometry_serialization(seconds: float) -> None:
+    GEOMETRY_DURATION.observe(seconds)
+    timing = current_timing.get()
+    if timing is not None:
+        timing.add_geometry(seconds)
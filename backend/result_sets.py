@@ -0,0 +1,108 @@
+"""
+Server-side registry of search result sets.
+
+Each search registers the parcel_ids it returned under a result_id, so follow-up
+requests (map tiles) can refer to the set without the client sending it back.
+Sets live in memory and are mirrored to disk so other workers and restarts can
+still resolve a result_id. A result_id doubles as the handle for paging through a
+search's results; cursors are offsets into the (immutable) id list.
+
+The rows a search returned are kept out of the graph state as well: execute_sql stores
+them here under a result_ref and the state only carries the ref, the row count and a
+small preview, so checkpoints stay small. api_server hydrates the rows by ref once the
+graph has finished. Rows are only held in memory, briefly; the request that produced
+them is the only reader.
+"""
+from cache_utils import LRUTTLCache, DiskLRUCache, CACHE_DIR
+from typing import List, Optional
+import json
+import os
+import uuid
+
+result_sets = LRUTTLCache(
+    max_entries=int(os.getenv("RESULT_SET_MAX_ENTRIES", "256")),
+    ttl_seconds=float(os.getenv("RESULT_SET_TTL_SECONDS", "86400")),
+    name="result_sets",
+)
+result_sets_disk = DiskLRUCache(
+    os.path.join(CACHE_DIR, "result_sets"),
+    max_bytes=int(os.getenv("RESULT_SET_DISK_MAX_MB", "64")) * 1024 * 1024,
+    name="result_sets_disk",
+)
+result_rows = LRUTTLCache(
+    max_entries=int(os.getenv("RESULT_ROWS_MAX_ENTRIES", "64")),
+    ttl_seconds=float(os.getenv("RESULT_ROWS_TTL_SECONDS", "600")),
+    name="result_rows",
+)
+# Rows copied into the graph state (without geometry) alongside a result_ref
+RESULT_PREVIEW_ROWS = int(os.getenv("RESULT_PREVIEW_ROWS", "5"))
+PREVIEW_DROPPED_COLUMNS = ("geometry",)
+
+
+def register_result_set(parcel_ids) -> Optional[str]:
+    """Store a search's parcel_ids and return its result_id (None for an empty set)"""
+    # Deduplicate, keeping result order
+    parcel_ids = list(dict.fromkeys(pid for pid in parcel_ids if pid is not None))
+    if not parcel_ids:
+        return None
+    result_id = uuid.uuid4().hex
+    result_sets.set(result_id, parcel_ids)
+    result_sets_disk.set(result_id, json.dumps(parcel_ids).encode("utf-8"))
+    return result_id
+
+
+def get_result_set(result_id: str) -> Optional[List[str]]:
+    """parcel_ids registered under result_id, or None if unknown or evicted"""
+    parcel_ids = result_sets.get(result_id)
+    if parcel_ids is None:
+        raw = result_sets_disk.get(result_id)
+        if raw is None:
+            return None
+        parcel_ids = json.loads(raw)
+        result_sets.set(result_id, parcel_ids)
+    return parcel_ids
+
+
+def store_result_rows(rows) -> Optional[str]:
+    """Hold a query's rows out of band and return their result_ref (None for no rows)"""
+    if not rows:
+        return None
+    result_ref = uuid.uuid4().hex
+    result_rows.set(result_ref, rows)
+    return result_ref
+
+
+def take_result_rows(result_ref: Optional[str]):
+    """Rows stored under result_ref, removing them; None if unknown or expired"""
+    if not result_ref:
+        return None
+    # get() applies the TTL; pop() alone would hand back expired rows
+    rows = result_rows.get(result_ref)
+    result_rows.pop(result_ref)
+    return rows
+
+
+def discard_result_rows(result_ref: Optional[str]) -> None:
+    if result_ref:
+        result_rows.pop(result_ref)
+
+
+def preview_rows(rows) -> List[dict]:
+    """First few rows as plain dicts without geometry, small enough to checkpoint"""
+    return [
+        {k: v for k, v in dict(row).items() if k not in PREVIEW_DROPPED_COLUMNS}
+        for row in (rows or [])[:RESULT_PREVIEW_ROWS]
+    ]
+
+
+def next_cursor(offset: int, page_size: int, total: int) -> Optional[str]:
+    """Cursor for the page after the one starting at offset, or None at the end"""
+    return str(offset + page_size) if offset + page_size < total else None
+
+
+def parse_cursor(cursor: Optional[str]) -> int:
+    """Offset for a cursor returned by next_cursor; raises ValueError if malformed"""
+    offset = int(cursor or 0)
+    if offset < 0:
+        raise ValueError(cursor)
+    return offset
@@ -0,0 +1,220 @@
+"""
+Schema retrieval for the LLM prompts.
+
+The full schema (every table, column and comment) is thousands of prompt tokens and
+grows with every layer. SchemaIndex indexes the tables and columns locally with TF-IDF
+over their names and comments, plus a small map from user vocabulary to schema
+vocabulary, and returns only the tables and columns relevant to a query.
+parcels.parcel_details is always included because every search selects its columns.
+
+catalog() is the compact, query-independent view used to decide whether a requested
+feature exists at all: every table with its column names, and comments only for the
+class-like columns, which list the available values.
+"""
+from collections import Counter, namedtuple
+from typing import Any, Dict, List, Optional
+import math
+import os
+import re
+
+SCHEMA_RETRIEVAL_ENABLED = os.getenv("SCHEMA_RETRIEVAL_ENABLED", "true").lower() == "true"
+SCHEMA_RETRIEVAL_MAX_TABLES = int(os.getenv("SCHEMA_RETRIEVAL_MAX_TABLES", "6"))
+SCHEMA_RETRIEVAL_MIN_SCORE = float(os.getenv("SCHEMA_RETRIEVAL_MIN_SCORE", "0.05"))
+# Tables with at most this many columns are sent whole; wider ones only with their matching columns
+SCHEMA_RETRIEVAL_FULL_TABLE_COLUMNS = int(os.getenv("SCHEMA_RETRIEVAL_FULL_TABLE_COLUMNS", "16"))
+
+ALWAYS_TABLES = ("parcels.parcel_details",)
+# Sent with every retrieved table: join keys, geometry and the columns holding feature classes
+KEY_COLUMNS = {"parcel_id", "geometry", "geometry_26986", "class", "category", "name"}
+CATALOG_COLUMNS = {"class", "category"}
+
+# Table names count for more than any single column when scoring a table
+TABLE_NAME_WEIGHT = 3
+
+# User vocabulary -> schema vocabulary (tokens as produced by tokenize)
+SYNONYMS = {
+    "transmission": "power line",
+    "powerline": "power line",
+    "grid": "substation power line",
+    "interconnection": "substation power line",
+    "floodplain": "flood zone",
+    "floodway": "flood zone",
+    "flooding": "flood zone",
+    "farm": "farmland",
+    "agricultural": "farmland",
+    "woods": "forest",
+    "wooded": "forest",
+    "marsh": "wetland",
+    "swamp": "wetland",
+    "protected": "open space",
+    "conservation": "open space",
+    "park": "open space",
+    "endangered": "priority habitat",
+    "species": "priority habitat",
+    "highway": "motorway road",
+    "street": "road",
+    "acre": "area acre",
+    "size": "area acre",
+    "large": "area acre",
+    "small": "area acre",
+    "big": "area acre",
+    "town": "municipality",
+    "city": "municipality",
+    "value": "total value",
+    "price": "total value",
+    "mw": "capacity kw",
+    "megawatt": "capacity kw",
+    "kilowatt": "capacity kw",
+    "near": "distance",
+    "close": "distance",
+    "within": "distance",
+    "far": "distance",
+    "away": "distance",
+    "mile": "distance",
+    "km": "distance",
+    "meter": "distance",
+    "percent": "fraction",
+    "coverage": "fraction",
+    "covered": "fraction",
+}
+
+STOPWORDS = {
+    "a", "an", "and", "any", "are", "at", "be", "by", "e", "for", "from", "g", "i", "in", "is", "it",
+    "me", "of", "on", "or", "show", "than", "that", "the", "this", "to", "use", "want", "with",
+    "find", "all", "sites", "site", "parcel", "parcels", "more", "less", "not", "no", "values",
+}
+
+Column = namedtuple("Column", ["name", "type", "comment", "nullable"])
+Table = namedtuple("Table", ["name", "columns"])
+
+
+def _stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: Optional[str], expand: bool = False) -> List[str]:
+    """Lowercased, crudely stemmed word tokens (snake_case split); expand adds SYNONYMS"""
+    tokens = []
+    for word in re.split(r"[^a-z0-9]+", (text or "").lower()):
+        word = _stem(word)
+        if not word or word in STOPWORDS:
+            continue
+        tokens.append(word)
+        if expand and word in SYNONYMS:
+            tokens.extend(SYNONYMS[word].split())
+    return tokens
+
+
+def format_column(column: Column) -> str:
+    col_str = f"  - {column.name}: {column.type}, comments: {column.comment}"
+    if column.nullable is False:
+        col_str += " (NOT NULL)"
+    return col_str
+
+
+def format_table(table: Table, columns: Optional[List[Column]] = None) -> str:
+    columns = table.columns if columns is None else columns
+    return f"Table: {table.name}\nColumns:\n" + "\n".join(format_column(col) for col in columns)
+
+
+def format_schema(tables: List[Table]) -> str:
+    return "\n\n".join(format_table(table) for table in tables)
+
+
+class SchemaIndex:
+    """TF-IDF index over table and column descriptions"""
+
+    def __init__(self, tables: List[Table]):
+        self.tables = tables
+        self.full_text = format_schema(tables)
+        self._column_tokens = {
+            (table.name, col.name): Counter(tokenize(f"{col.name} {col.comment or ''}"))
+            for table in tables for col in table.columns
+        }
+        self._table_tokens = {}
+        for table in tables:
+            tokens = Counter({token: TABLE_NAME_WEIGHT for token in tokenize(table.name.replace(".", " "))})
+            for col in table.columns:
+                tokens.update(self._column_tokens[(table.name, col.name)])
+            self._table_tokens[table.name] = tokens
+
+        documents = list(self._table_tokens.values()) + list(self._column_tokens.values())
+        document_frequency = Counter(token for doc in documents for token in doc)
+        self._idf = {token: math.log((1 + len(documents)) / (1 + df)) + 1 for token, df in document_frequency.items()}
+        self._table_vectors = {name: self._vector(tokens) for name, tokens in self._table_tokens.items()}
+        self._column_vectors = {key: self._vector(tokens) for key, tokens in self._column_tokens.items()}
+        self.catalog_text = "\n\n".join(self._catalog_entry(table) for table in tables)
+        self.calls = 0
+        self.tables_sent = 0
+        self.chars_sent = 0
+
+    @staticmethod
+    def _catalog_entry(table: Table) -> str:
+        lines = [f"Table: {table.name}", "Columns: " + ", ".join(col.name for col in table.columns)]
+        lines.extend(format_column(col) for col in table.columns if col.name in CATALOG_COLUMNS)
+        return "\n".join(lines)
+
+    def _vector(self, tokens: Counter) -> Dict[str, float]:
+        vector = {token: (1 + math.log(count)) * self._idf.get(token, 0.0) for token, count in tokens.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {token: w / norm for token, w in vector.items()}
+
+    @staticmethod
+    def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+        if len(a) > len(b):
+            a, b = b, a
+        return sum(w * b.get(token, 0.0) for token, w in a.items())
+
+    def retrieve(self, query: Optional[str]) -> List[tuple]:
+        """(table, columns) relevant to the query, most relevant first; empty if nothing matches"""
+        query_vector = self._vector(Counter(tokenize(query, expand=True)))
+        if not query_vector:
+            return []
+        scores = {name: self._cosine(query_vector, vector) for name, vector in self._table_vectors.items()}
+        ranked = [name for name in sorted(scores, key=scores.get, reverse=True) if scores[name] >= SCHEMA_RETRIEVAL_MIN_SCORE]
+        if not ranked:
+            return []
+        selected = list(dict.fromkeys([*ALWAYS_TABLES, *ranked]))[:max(SCHEMA_RETRIEVAL_MAX_TABLES, len(ALWAYS_TABLES))]
+
+        retrieved = []
+        for table in self.tables:
+            if table.name not in selected:
+                continue
+            columns = table.columns
+            if len(columns) > SCHEMA_RETRIEVAL_FULL_TABLE_COLUMNS:
+                columns = [
+                    col for col in columns
+                    if col.name in KEY_COLUMNS or self._cosine(query_vector, self._column_vectors[(table.name, col.name)]) > 0
+                ]
+            retrieved.append((table, columns))
+        retrieved.sort(key=lambda item: selected.index(item[0].name))
+        return retrieved
+
+    def schema_for(self, query: Optional[str]) -> str:
+        """Schema text for the query: the retrieved subset, or the full schema if retrieval is off or finds nothing"""
+        retrieved = self.retrieve(query) if SCHEMA_RETRIEVAL_ENABLED else []
+        text = "\n\n".join(format_table(table, columns) for table, columns in retrieved) if retrieved else self.full_text
+        self.calls += 1
+        self.tables_sent += len(retrieved) if retrieved else len(self.tables)
+        self.chars_sent += len(text)
+        return text
+
+    def catalog(self) -> str:
+        """Every table's column names plus the class-like column comments; the full schema if retrieval is off"""
+        return self.catalog_text if SCHEMA_RETRIEVAL_ENABLED else self.full_text
+
+    def stats(self) -> Dict[str, Any]:
+        """Average schema size sent per prompt, against the full schema"""
+        return {
+            "enabled": SCHEMA_RETRIEVAL_ENABLED,
+            "calls": self.calls,
+            "tables": len(self.tables),
+            "full_schema_chars": len(self.full_text),
+            "catalog_chars": len(self.catalog_text),
+            "avg_tables_sent": round(self.tables_sent / self.calls, 2) if self.calls else None,
+            "avg_schema_chars_sent": round(self.chars_sent / self.calls) if self.calls else None,
+        }
@@ -0,0 +1,11 @@
+-- data generation counters (read by the API result cache, bumped by create_db.py / populate_tables.py)
+CREATE SCHEMA IF NOT EXISTS metadata;
+
+CREATE TABLE IF NOT EXISTS metadata.data_generations (
+    table_name character varying(1000) PRIMARY KEY,
+    generation bigint NOT NULL DEFAULT 0,
+    updated_at timestamp with time zone NOT NULL DEFAULT now()
+);
+
+COMMENT ON TABLE metadata.data_generations IS 'Per-table load counter; incremented every time a table is recreated or repopulated';
+COMMENT ON COLUMN metadata.data_generations.table_name IS 'Fully qualified table name, e.g. "parcels.parcel_details"';
@@ -71,4 +71,88 @@ CREATE INDEX ON geographic_features.land_use USING GIST (geometry_26986);
 CREATE INDEX ON geographic_features.flood_zones USING GIST (geometry_26986);
 CREATE INDEX ON geographic_features.open_spaces USING GIST (geometry_26986);
 CREATE INDEX ON geographic_features.priority_habitats USING GIST (geometry_26986);
-CREATE INDEX ON geographic_features.prime_farmland_soils USING GIST (geometry_26986);
\ No newline at end of file
+CREATE INDEX ON geographic_features.prime_farmland_soils USING GIST (geometry_26986);
+
+-- subdivided constraint layers for spatial predicates
+-- Each source layer is unioned per class (dissolving overlaps and shared edges), then cut with
+-- ST_Subdivide into pieces of at most 256 vertices, so GIST lookups return small geometries and
+-- ST_Intersects/ST_DWithin only test the pieces near a parcel. Rebuilt by
+-- geographic_features.refresh_subdivided_layer() after each source table is loaded.
+DROP TABLE IF EXISTS geographic_features.land_cover_subdivided;
+CREATE TABLE geographic_features.land_cover_subdivided (
+    piece_id bigserial PRIMARY KEY,
+    class character varying(1000) NOT NULL,
+    geometry_26986 geometry(Geometry, 26986) NOT NULL
+);
+
+COMMENT ON TABLE geographic_features.land_cover_subdivided IS 'Land cover dissolved by class and split into small pieces; use instead of land_cover for ST_Intersects/ST_DWithin overlap and exclusion predicates (rows are pieces, not individual features)';
+COMMENT ON COLUMN geographic_features.land_cover_subdivided.class IS 'Class of the land cover; values are "wetland" or "forest"';
+
+DROP TABLE IF EXISTS geographic_features.flood_zones_subdivided;
+CREATE TABLE geographic_features.flood_zones_subdivided (
+    piece_id bigserial PRIMARY KEY,
+    category character varying(1000) NOT NULL,
+    geometry_26986 geometry(Geometry, 26986) NOT NULL
+);
+
+COMMENT ON TABLE geographic_features.flood_zones_subdivided IS 'FEMA flood zones dissolved by category and split into small pieces; use instead of flood_zones for ST_Intersects/ST_DWithin overlap and exclusion predicates (rows are pieces, not individual zones)';
+COMMENT ON COLUMN geographic_features.flood_zones_subdivided.category IS 'Flood hazard category; values are "1% Annual Chance Flood Hazard", "0.2% Annual Chance Flood Hazard" or "Regulatory Floodway"';
+
+DROP TABLE IF EXISTS geographic_features.open_spaces_subdivided;
+CREATE TABLE geographic_features.open_spaces_subdivided (
+    piece_id bigserial PRIMARY KEY,
+    geometry_26986 geometry(Geometry, 26986) NOT NULL
+);
+
+COMMENT ON TABLE geographic_features.open_spaces_subdivided IS 'Protected and recreational open space dissolved and split into small pieces; use instead of open_spaces for ST_Intersects/ST_DWithin overlap and exclusion predicates (rows are pieces, not individual open spaces)';
+
+DROP TABLE IF EXISTS geographic_features.priority_habitats_subdivided;
+CREATE TABLE geographic_features.priority_habitats_subdivided (
+    piece_id bigserial PRIMARY KEY,
+    geometry_26986 geometry(Geometry, 26986) NOT NULL
+);
+
+COMMENT ON TABLE geographic_features.priority_habitats_subdivided IS 'Priority habitats dissolved and split into small pieces; use instead of priority_habitats for ST_Intersects/ST_DWithin overlap and exclusion predicates (rows are pieces, not individual habitats)';
+
+DROP TABLE IF EXISTS geographic_features.prime_farmland_soils_subdivided;
+CREATE TABLE geographic_features.prime_farmland_soils_subdivided (
+    piece_id bigserial PRIMARY KEY,
+    geometry_26986 geometry(Geometry, 26986) NOT NULL
+);
+
+COMMENT ON TABLE geographic_features.prime_farmland_soils_subdivided IS 'Prime farmland soils dissolved and split into small pieces; use instead of prime_farmland_soils for ST_Intersects/ST_DWithin overlap and exclusion predicates (rows are pieces, not individual soil units)';
+
+CREATE INDEX ON geographic_features.land_cover_subdivided USING GIST (geometry_26986);
+CREATE INDEX ON geographic_features.land_cover_subdivided (class);
+CREATE INDEX ON geographic_features.flood_zones_subdivided USING GIST (geometry_26986);
+CREATE INDEX ON geographic_features.flood_zones_subdivided (category);
+CREATE INDEX ON geographic_features.open_spaces_subdivided USING GIST (geometry_26986);
+CREATE INDEX ON geographic_features.priority_habitats_subdivided USING GIST (geometry_26986);
+CREATE INDEX ON geographic_features.prime_farmland_soils_subdivided USING GIST (geometry_26986);
+
+-- Rebuild <source_table>_subdivided; group_column is the class column to dissolve by (NULL dissolves everything)
+CREATE OR REPLACE FUNCTION geographic_features.refresh_subdivided_layer(source_table text, group_column text DEFAULT NULL)
+RETURNS void AS $$
+DECLARE
+    target_table text := source_table || '_subdivided';
+BEGIN
+    EXECUTE format('TRUNCATE geographic_features.%I', target_table);
+    IF group_column IS NULL THEN
+        EXECUTE format(
+            'INSERT INTO geographic_features.%I (geometry_26986)
+             SELECT ST_Subdivide(ST_CollectionExtract(ST_Union(ST_MakeValid(geometry_26986)), 3), 256)
+             FROM geographic_features.%I',
+            target_table, source_table
+        );
+    ELSE
+        EXECUTE format(
+            'INSERT INTO geographic_features.%1$I (%3$I, geometry_26986)
+             SELECT %3$I, ST_Subdivide(ST_CollectionExtract(ST_Union(ST_MakeValid(geometry_26986)), 3), 256)
+             FROM geographic_features.%2$I
+             GROUP BY %3$I',
+            target_table, source_table, group_column
+        );
+    END IF;
+    EXECUTE format('ANALYZE geographic_features.%I', target_table);
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,48 @@
+-- parcel constraints: how much of each parcel is covered by each constraint layer
+-- Derived from parcels.parcel_details and geographic_features.*; filled by
+-- db_actions/parcel_constraints.py (all layers, or only the layers whose table was reloaded)
+CREATE SCHEMA IF NOT EXISTS parcels;
+
+DROP TABLE IF EXISTS parcels.parcel_constraints;
+CREATE TABLE parcels.parcel_constraints (
+    parcel_id character varying(1000) PRIMARY KEY,
+    wetland_area_m2 numeric,
+    wetland_fraction numeric,
+    forest_area_m2 numeric,
+    forest_fraction numeric,
+    flood_zone_area_m2 numeric,
+    flood_zone_fraction numeric,
+    flood_zone_100yr_area_m2 numeric,
+    flood_zone_100yr_fraction numeric,
+    priority_habitat_area_m2 numeric,
+    priority_habitat_fraction numeric,
+    open_space_area_m2 numeric,
+    open_space_fraction numeric,
+    prime_farmland_area_m2 numeric,
+    prime_farmland_fraction numeric
+);
+
+COMMENT ON COLUMN parcels.parcel_constraints.parcel_id IS 'Parcel identifier; JOIN to parcels.parcel_details on parcel_id. Use the precomputed area/fraction columns in this table for overlap or exclusion filters on wetlands, forest, flood zones, priority habitats, open space and prime farmland instead of ST_Intersects/ST_Intersection against geographic_features tables';
+COMMENT ON COLUMN parcels.parcel_constraints.wetland_area_m2 IS 'Area in square meters of the parcel covered by wetlands (land_cover class "wetland")';
+COMMENT ON COLUMN parcels.parcel_constraints.wetland_fraction IS 'Fraction (0 to 1) of the parcel area covered by wetlands; e.g. "less than 5% wetlands" is wetland_fraction < 0.05, "no wetlands" is wetland_fraction = 0';
+COMMENT ON COLUMN parcels.parcel_constraints.forest_area_m2 IS 'Area in square meters of the parcel covered by forest (land_cover class "forest")';
+COMMENT ON COLUMN parcels.parcel_constraints.forest_fraction IS 'Fraction (0 to 1) of the parcel area covered by forest';
+COMMENT ON COLUMN parcels.parcel_constraints.flood_zone_area_m2 IS 'Area in square meters of the parcel inside any FEMA flood hazard zone (1% or 0.2% annual chance, or regulatory floodway)';
+COMMENT ON COLUMN parcels.parcel_constraints.flood_zone_fraction IS 'Fraction (0 to 1) of the parcel area inside any FEMA flood hazard zone';
+COMMENT ON COLUMN parcels.parcel_constraints.flood_zone_100yr_area_m2 IS 'Area in square meters of the parcel in the 100-year floodplain (1% annual chance flood hazard or regulatory floodway)';
+COMMENT ON COLUMN parcels.parcel_constraints.flood_zone_100yr_fraction IS 'Fraction (0 to 1) of the parcel area in the 100-year floodplain';
+COMMENT ON COLUMN parcels.parcel_constraints.priority_habitat_area_m2 IS 'Area in square meters of the parcel inside NHESP priority habitats of rare species';
+COMMENT ON COLUMN parcels.parcel_constraints.priority_habitat_fraction IS 'Fraction (0 to 1) of the parcel area inside NHESP priority habitats';
+COMMENT ON COLUMN parcels.parcel_constraints.open_space_area_m2 IS 'Area in square meters of the parcel inside protected or recreational open space';
+COMMENT ON COLUMN parcels.parcel_constraints.open_space_fraction IS 'Fraction (0 to 1) of the parcel area inside protected or recreational open space';
+COMMENT ON COLUMN parcels.parcel_constraints.prime_farmland_area_m2 IS 'Area in square meters of the parcel on prime farmland soils';
+COMMENT ON COLUMN parcels.parcel_constraints.prime_farmland_fraction IS 'Fraction (0 to 1) of the parcel area on prime farmland soils';
+
+-- Indexes
+CREATE INDEX ON parcels.parcel_constraints (wetland_fraction);
+CREATE INDEX ON parcels.parcel_constraints (forest_fraction);
+CREATE INDEX ON parcels.parcel_constraints (flood_zone_fraction);
+CREATE INDEX ON parcels.parcel_constraints (flood_zone_100yr_fraction);
+CREATE INDEX ON parcels.parcel_constraints (priority_habitat_fraction);
+CREATE INDEX ON parcels.parcel_constraints (open_space_fraction);
+CREATE INDEX ON parcels.parcel_constraints (prime_farmland_fraction);
@@ -0,0 +1,111 @@
+-- parcel proximity: nearest distances from each parcel to infrastructure and roads
+-- Derived from parcels.parcel_details and infrastructure_features.*; rebuilt by
+-- parcels.refresh_parcel_proximity() after either side is loaded (see populate_tables.py)
+CREATE SCHEMA IF NOT EXISTS parcels;
+
+DROP TABLE IF EXISTS parcels.parcel_proximity;
+CREATE TABLE parcels.parcel_proximity (
+    parcel_id character varying(1000) PRIMARY KEY,
+    substation_distance_m numeric,
+    power_line_distance_m numeric,
+    power_line_under_69kv_distance_m numeric,
+    power_line_69_to_138kv_distance_m numeric,
+    power_line_138kv_plus_distance_m numeric,
+    road_distance_m numeric,
+    motorway_distance_m numeric,
+    primary_road_distance_m numeric,
+    secondary_road_distance_m numeric,
+    tertiary_road_distance_m numeric,
+    unclassified_road_distance_m numeric,
+    residential_road_distance_m numeric,
+    living_street_distance_m numeric,
+    service_road_distance_m numeric
+);
+
+COMMENT ON COLUMN parcels.parcel_proximity.parcel_id IS 'Parcel identifier; JOIN to parcels.parcel_details on parcel_id. Use the precomputed distance columns in this table for distance filters to substations, power lines and roads instead of ST_DWithin/ST_Distance against infrastructure_features tables';
+COMMENT ON COLUMN parcels.parcel_proximity.substation_distance_m IS 'Distance in meters from the parcel boundary to the nearest substation (0 if touching)';
+COMMENT ON COLUMN parcels.parcel_proximity.power_line_distance_m IS 'Distance in meters to the nearest power line of any voltage';
+COMMENT ON COLUMN parcels.parcel_proximity.power_line_under_69kv_distance_m IS 'Distance in meters to the nearest power line with a known voltage below 69 kV';
+COMMENT ON COLUMN parcels.parcel_proximity.power_line_69_to_138kv_distance_m IS 'Distance in meters to the nearest power line from 69 kV up to (not including) 138 kV';
+COMMENT ON COLUMN parcels.parcel_proximity.power_line_138kv_plus_distance_m IS 'Distance in meters to the nearest power line of 138 kV or more (high-voltage transmission)';
+COMMENT ON COLUMN parcels.parcel_proximity.road_distance_m IS 'Distance in meters to the nearest road of any class';
+COMMENT ON COLUMN parcels.parcel_proximity.motorway_distance_m IS 'Distance in meters to the nearest motorway (highway)';
+COMMENT ON COLUMN parcels.parcel_proximity.primary_road_distance_m IS 'Distance in meters to the nearest primary road';
+COMMENT ON COLUMN parcels.parcel_proximity.secondary_road_distance_m IS 'Distance in meters to the nearest secondary road';
+COMMENT ON COLUMN parcels.parcel_proximity.tertiary_road_distance_m IS 'Distance in meters to the nearest tertiary road';
+COMMENT ON COLUMN parcels.parcel_proximity.unclassified_road_distance_m IS 'Distance in meters to the nearest unclassified (minor public) road';
+COMMENT ON COLUMN parcels.parcel_proximity.residential_road_distance_m IS 'Distance in meters to the nearest residential road';
+COMMENT ON COLUMN parcels.parcel_proximity.living_street_distance_m IS 'Distance in meters to the nearest living street';
+COMMENT ON COLUMN parcels.parcel_proximity.service_road_distance_m IS 'Distance in meters to the nearest service road (driveways, parking aisles, access roads)';
+
+-- Indexes (distance filters become B-tree range scans)
+CREATE INDEX ON parcels.parcel_proximity (substation_distance_m);
+CREATE INDEX ON parcels.parcel_proximity (power_line_distance_m);
+CREATE INDEX ON parcels.parcel_proximity (power_line_under_69kv_distance_m);
+CREATE INDEX ON parcels.parcel_proximity (power_line_69_to_138kv_distance_m);
+CREATE INDEX ON parcels.parcel_proximity (power_line_138kv_plus_distance_m);
+CREATE INDEX ON parcels.parcel_proximity (road_distance_m);
+CREATE INDEX ON parcels.parcel_proximity (motorway_distance_m);
+CREATE INDEX ON parcels.parcel_proximity (primary_road_distance_m);
+CREATE INDEX ON parcels.parcel_proximity (secondary_road_distance_m);
+CREATE INDEX ON parcels.parcel_proximity (tertiary_road_distance_m);
+CREATE INDEX ON parcels.parcel_proximity (unclassified_road_distance_m);
+CREATE INDEX ON parcels.parcel_proximity (residential_road_distance_m);
+CREATE INDEX ON parcels.parcel_proximity (living_street_distance_m);
+CREATE INDEX ON parcels.parcel_proximity (service_road_distance_m);
+
+-- Each distance is a KNN (<->) index scan for the single nearest feature, then an exact ST_Distance
+CREATE OR REPLACE FUNCTION parcels.refresh_parcel_proximity() RETURNS void AS $$
+DECLARE
+    road_class text;
+BEGIN
+    -- Partial GIST indexes so KNN scans for a class don't wade through features of other classes.
+    -- Created here because the feature tables are recreated on reload.
+    CREATE INDEX IF NOT EXISTS infrastructure_substation_geometry_26986_idx
+        ON infrastructure_features.infrastructure USING GIST (geometry_26986) WHERE class = 'substation';
+    CREATE INDEX IF NOT EXISTS infrastructure_power_line_geometry_26986_idx
+        ON infrastructure_features.infrastructure USING GIST (geometry_26986) WHERE class = 'power_line';
+    FOREACH road_class IN ARRAY ARRAY['motorway', 'primary', 'secondary', 'tertiary', 'unclassified', 'residential', 'living_street', 'service'] LOOP
+        EXECUTE format(
+            'CREATE INDEX IF NOT EXISTS %I ON infrastructure_features.transportation USING GIST (geometry_26986) WHERE class = %L',
+            'transportation_' || road_class || '_geometry_26986_idx', road_class
+        );
+    END LOOP;
+
+    TRUNCATE parcels.parcel_proximity;
+    INSERT INTO parcels.parcel_proximity
+    SELECT
+        p.parcel_id,
+        (SELECT round(ST_Distance(p.geometry_26986, f.geometry_26986)::numeric, 1) FROM infrastructure_features.infrastructure f
+          WHERE f.class = 'substation' ORDER BY p.geometry_26986 <-> f.geometry_26986 LIMIT 1),
+        (SELECT round(ST_Distance(p.geometry_26986, f.geometry_26986)::numeric, 1) FROM infrastructure_features.infrastructure f
+          WHERE f.class = 'power_line' ORDER BY p.geometry_26986 <-> f.geometry_26986 LIMIT 1),
+        (SELECT round(ST_Distance(p.geometry_26986, f.geometry_26986)::numeric, 1) FROM infrastructure_features.infrastructure f
+          WHERE f.class = 'power_line' AND f.voltage > 0 AND f.voltage < 69000 ORDER BY p.geometry_26986 <-> f.geometry_26986 LIMIT 1),
+        (SELECT round(ST_Distance(p.geometry_26986, f.geometry_26986)::numeric, 1) FROM infrastructure_features.infrastructure f
+          WHERE f.class = 'power_line' AND f.voltage >= 69000 AND f.voltage < 138000 ORDER BY p.geometry_26986 <-> f.geometry_26986 LIMIT 1),
+        (SELECT round(ST_Distance(p.geometry_26986, f.geometry_26986)::numeric, 1) FROM infrastructure_features.infrastructure f
+          WHERE f.class = 'power_line' AND f.voltage >= 138000 ORDER BY p.geometry_26986 <-> f.geometry_26986 LIMIT 1),
+        (SELECT round(ST_Distance(p.geometry_26986, t.geometry_26986)::numeric, 1) FROM infrastructure_features.transportation t
+          ORDER BY p.geometry_26986 <-> t.geometry_26986 LIMIT 1),
+        (SELECT round(ST_Distance(p.geometry_26986, t.geometry_26986)::numeric, 1) FROM infrastructure_features.transportation t
+          WHERE t.class = 'motorway' ORDER BY p.geometry_26986 <-> t.geometry_26986 LIMIT 1),
+        (SELECT round(ST_Distance(p.geometry_26986, t.geometry_26986)::numeric, 1) FROM infrastructure_features.transportation t
+          WHERE t.class = 'primary' ORDER BY p.geometry_26986 <-> t.geometry_26986 LIMIT 1),
+        (SELECT round(ST_Distance(p.geometry_26986, t.geometry_26986)::numeric, 1) FROM infrastructure_features.transportation t
+          WHERE t.class = 'secondary' ORDER BY p.geometry_26986 <-> t.geometry_26986 LIMIT 1),
+        (SELECT round(ST_Distance(p.geometry_26986, t.geometry_26986)::numeric, 1) FROM infrastructure_features.transportation t
+          WHERE t.class = 'tertiary' ORDER BY p.geometry_26986 <-> t.geometry_26986 LIMIT 1),
+        (SELECT round(ST_Distance(p.geometry_26986, t.geometry_26986)::numeric, 1) FROM infrastructure_features.transportation t
+          WHERE t.class = 'unclassified' ORDER BY p.geometry_26986 <-> t.geometry_26986 LIMIT 1),
+        (SELECT round(ST_Distance(p.geometry_26986, t.geometry_26986)::numeric, 1) FROM infrastructure_features.transportation t
+          WHERE t.class = 'residential' ORDER BY p.geometry_26986 <-> t.geometry_26986 LIMIT 1),
+        (SELECT round(ST_Distance(p.geometry_26986, t.geometry_26986)::numeric, 1) FROM infrastructure_features.transportation t
+          WHERE t.class = 'living_street' ORDER BY p.geometry_26986 <-> t.geometry_26986 LIMIT 1),
+        (SELECT round(ST_Distance(p.geometry_26986, t.geometry_26986)::numeric, 1) FROM infrastructure_features.transportation t
+          WHERE t.class = 'service' ORDER BY p.geometry_26986 <-> t.geometry_26986 LIMIT 1)
+    FROM parcels.parcel_details p;
+
+    ANALYZE parcels.parcel_proximity;
+END;
+$$ LANGUAGE plpgsql;
@@ -1,6 +1,7 @@
 -- parcels
 CREATE SCHEMA IF NOT EXISTS parcels;
 
+DROP TABLE IF EXISTS parcels.parcel_geometry_lod;
 DROP TABLE IF EXISTS parcels.parcel_details;
 CREATE TABLE parcels.parcel_details (
     parcel_id character varying(1000) PRIMARY KEY,
@@ -30,4 +31,32 @@ COMMENT ON COLUMN parcels.parcel_details.source IS 'Source dataset or data provi
 COMMENT ON COLUMN parcels.parcel_details.ground_mounted_capacity_kw IS 'Ground-mounted solar capacity in kilowatts';
 
 -- Indexes
-CREATE INDEX ON parcels.parcel_details USING GIST (geometry_26986);
\ No newline at end of file
+CREATE INDEX ON parcels.parcel_details USING GIST (geometry_26986);
+
+-- level-of-detail geometry for map display (not used in generated SQL)
+-- Simplification is done in EPSG:26986 so tolerances are in meters
+CREATE TABLE parcels.parcel_geometry_lod (
+    parcel_id character varying(1000) PRIMARY KEY REFERENCES parcels.parcel_details (parcel_id) ON DELETE CASCADE,
+    geometry_medium geometry(Geometry, 4326) NOT NULL,
+    geometry_low geometry(Geometry, 4326) NOT NULL,
+    centroid geometry(Point, 4326) NOT NULL,
+    bbox geometry(Geometry, 4326) NOT NULL
+);
+
+COMMENT ON TABLE parcels.parcel_geometry_lod IS 'Simplified parcel boundaries served to the map; rebuilt by parcels.refresh_parcel_geometry_lod() after every parcel load';
+COMMENT ON COLUMN parcels.parcel_geometry_lod.geometry_medium IS 'Parcel boundary simplified with a 5 m tolerance (EPSG:4326)';
+COMMENT ON COLUMN parcels.parcel_geometry_lod.geometry_low IS 'Parcel boundary simplified with a 25 m tolerance (EPSG:4326)';
+COMMENT ON COLUMN parcels.parcel_geometry_lod.centroid IS 'Point guaranteed to lie on the parcel (ST_PointOnSurface, EPSG:4326)';
+COMMENT ON COLUMN parcels.parcel_geometry_lod.bbox IS 'Bounding box of the parcel (EPSG:4326)';
+
+CREATE OR REPLACE FUNCTION parcels.refresh_parcel_geometry_lod() RETURNS void AS $$
+    TRUNCATE parcels.parcel_geometry_lod;
+    INSERT INTO parcels.parcel_geometry_lod (parcel_id, geometry_medium, geometry_low, centroid, bbox)
+    SELECT
+        parcel_id,
+        ST_Transform(ST_SimplifyPreserveTopology(geometry_26986, 5), 4326),
+        ST_Transform(ST_SimplifyPreserveTopology(geometry_26986, 25), 4326),
+        ST_PointOnSurface(geometry),
+        ST_Envelope(geometry)
+    FROM parcels.parcel_details;
+$$ LANGUAGE sql;
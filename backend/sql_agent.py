@@ -2,15 +2,37 @@ from typing import Annotated, Optional, List, Dict, Any, TypedDict
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
+from langchain_core.runnables import RunnableConfig
+from langchain_core.callbacks import BaseCallbackHandler, dispatch_custom_event, adispatch_custom_event
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.memory import MemorySaver
 from sqlalchemy import create_engine, text, inspect
-from prompts.text_to_sql_prompts import write_sql_template, topic_filter_template
+from pydantic import BaseModel, Field
+from prompts.text_to_sql_prompts import write_sql_template, filter_spec_template, topic_filter_template, fused_front_end_template
 import os
 import dotenv
 import re
-from db_actions.db_utils import run_query
+import time
+import hashlib
+import asyncio
+import atexit
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from db_actions.query_engine import (
+    create_query_engine, create_async_query_engine, execute_read_only, aexecute_read_only,
+    stream_read_only, astream_read_only, execute_read_only_paged, aexecute_read_only_paged,
+)
+from db_actions.plan_gate import check_plan, acheck_plan
+from db_actions.sql_params import render_sql
+from result_sets import register_result_set, get_result_set, store_result_rows, discard_result_rows, preview_rows
+from cache_utils import LRUTTLCache
+from cancellation import raise_if_cancelled
+from metrics import timed_node, record_llm_call
+from checkpointer import BoundedMemorySaver
+from schema_retrieval import SchemaIndex, Table, Column, format_schema
+from fast_path import FastPathParser
+from filter_spec import FilterSpec, compile_filter_spec, narrows
 dotenv.load_dotenv()
 
 # --- DEBUG: Print all environment variables (without sensitive values) ---
@@ -104,7 +126,82 @@ else:
     print(f"Creating engine with connection string: postgresql+psycopg2://{user}:***@{host}:{port}/{db_name}")
     engine = create_engine(connection_string)
 
-llm = ChatOpenAI(model="gpt-4.1", temperature=0.2)
+# ASYNC_NODES=true selects the async graph nodes (llm.ainvoke + asyncpg) at startup,
+# so one worker can drive many concurrent searches without a thread per step
+ASYNC_NODES = os.getenv("ASYNC_NODES", "false").lower() == "true"
+
+# Generated SQL runs on a separate pooled engine with read-only, time-limited transactions;
+# `engine` is only used for schema inspection
+query_engine = create_query_engine(engine.url)
+async_engine = create_async_query_engine(engine.url) if ASYNC_NODES else None
+if ASYNC_NODES:
+    print("Using async graph nodes with asyncpg engine")
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Records the duration and token usage of every LLM call, attributed to the running node (see metrics.py)"""
+
+    # Called in the caller's thread/task, so metrics.current_node and current_timing are visible
+    run_inline = True
+
+    def __init__(self):
+        self._starts = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        if start is None:
+            return
+        prompt_tokens, completion_tokens = _token_usage(response)
+        record_llm_call(time.perf_counter() - start, prompt_tokens, completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._starts.pop(run_id, None)
+
+def _token_usage(response):
+    """(prompt, completion) tokens from an LLMResult; OpenAI reports them in llm_output, newer models on the message"""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += metadata.get("input_tokens", 0)
+            completion_tokens += metadata.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+llm = ChatOpenAI(model="gpt-4.1", temperature=0.2, callbacks=[LLMMetricsHandler()])
+
+# Thread pool for LLM calls that run concurrently with other graph work
+llm_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LLM_WORKERS", "32")),
+    thread_name_prefix="llm",
+)
+
+def submit_llm_work(fn, *args):
+    """Run fn on llm_executor in a copy of the caller's context (the search's cancellation and timing)"""
+    return llm_executor.submit(contextvars.copy_context().run, fn, *args)
+
+def timed(fn, name: str):
+    """Wrap a sync or async node so its wall time and LLM calls are recorded under name (see metrics.py)"""
+    # functools.wraps keeps the signature LangGraph inspects to decide whether to pass config
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_timed(*args, **kwargs):
+            with timed_node(name):
+                return await fn(*args, **kwargs)
+        return async_timed
+
+    @functools.wraps(fn)
+    def sync_timed(*args, **kwargs):
+        with timed_node(name):
+            return fn(*args, **kwargs)
+    return sync_timed
 
 # --- STATE ---
 class SQLState(TypedDict):
@@ -114,9 +211,18 @@ class SQLState(TypedDict):
     user_query: str
     expanded_query: Optional[str]
     sql_query: Optional[str]
+    sql_params: Optional[Dict[str, Any]]  # Bind parameters of sql_query when it was compiled from a filter spec
+    filter_spec: Optional[Dict[str, Any]]  # The filter spec sql_query was compiled from, if any
+    # result_id and filter spec of the last compiled search with results; a follow-up that only
+    # narrows that spec is evaluated against its parcel_ids (see filter_spec.narrows)
+    refinement_base: Optional[Dict[str, Any]]
 
     # Results
-    results: Optional[Any]
+    # Rows are held out of band (result_sets.store_result_rows) so checkpoints stay small
+    results: Optional[Any]  # Preview: the first few rows, without geometry
+    result_ref: Optional[str]  # Key of the stored rows (all rows, the first page, or the first streamed batch)
+    result_count: Optional[int]  # Total number of rows returned by the query
+    result_handle: Optional[str]  # result_id of the materialized parcel_id list (paged results, or a refinement base)
 
     # Error tracking
     relevant_query_topic: Optional[bool]
@@ -134,35 +240,89 @@ class SQLState(TypedDict):
     # SQL explanation
     sql_explanation: Optional[str]  # Natural language explanation of the SQL query
 
+    # SQL cache tracking
+    sql_cache_hit: Optional[bool]  # True if sql_query was served from the generated-SQL cache
+    fast_path: Optional[bool]  # True if sql_query was built by the rule-based parser (fast_path.py)
+
     # Persistent multi-turn memory
     conversation: Annotated[List[Dict[str, str]], add_messages]
 
 # --- FUNCTIONS ---
-def get_all_tables_schema(_):
-    """Get schema information for all tables in all schemas"""
+# Tables used only to serve results to the map; kept out of the LLM's schema
+DISPLAY_ONLY_TABLES = {"parcels.parcel_geometry_lod"}
+
+def get_schema_tables() -> List[Table]:
+    """Tables and columns (with comments) of every schema the LLM may query"""
     inspector = inspect(engine)
     # schemas = inspector.get_schema_names()
     schemas = ['parcels', 'geographic_features', 'infrastructure_features']
     
-    all_tables_info = []
+    all_tables = []
     
     for schema in schemas:
         tables = inspector.get_table_names(schema=schema)
         for table in tables:
-            columns = inspector.get_columns(table, schema=schema)
-            column_info = []
-            for col in columns:
-                col_str = f"  - {col['name']}: {col['type']}, comments: {col['comment']}"
-                if col.get('nullable') is False:
-                    col_str += " (NOT NULL)"
-                column_info.append(col_str)
-            
-            table_info = f"Table: {schema}.{table}\nColumns:\n" + "\n".join(column_info)
-            all_tables_info.append(table_info)
+            if f"{schema}.{table}" in DISPLAY_ONLY_TABLES:
+                continue
+            columns = [
+                Column(col['name'], col['type'], col['comment'], col.get('nullable'))
+                for col in inspector.get_columns(table, schema=schema)
+            ]
+            all_tables.append(Table(f"{schema}.{table}", columns))
     
-    return "\n\n".join(all_tables_info)
+    return all_tables
 
-SCHEMA_TEXT = get_all_tables_schema("")
+def get_all_tables_schema(_):
+    """Get schema information for all tables in all schemas"""
+    return format_schema(get_schema_tables())
+
+# Prompts get only the part of the schema relevant to the query (see schema_retrieval.py)
+schema_index = SchemaIndex(get_schema_tables())
+SCHEMA_TEXT = schema_index.full_text
+
+# --- SQL CACHE ---
+# Generated SQL keyed on (schema version, normalized expanded query). A schema change
+# produces a new version, so stale SQL is never served against a different schema.
+SCHEMA_VERSION = hashlib.sha256(SCHEMA_TEXT.encode("utf-8")).hexdigest()[:12]
+sql_cache = LRUTTLCache(
+    max_entries=int(os.getenv("SQL_CACHE_MAX_ENTRIES", "512")),
+    ttl_seconds=float(os.getenv("SQL_CACHE_TTL_SECONDS", "86400")),
+    name="generated_sql",
+)
+# Running totals of generate_sql latency, used to estimate time saved by cache hits
+sql_generation_timing = {"calls": 0, "seconds": 0.0}
+
+# SQL_GENERATION_MODE=filter_spec has the LLM fill in a typed filter spec that is compiled
+# to parameterized SQL (see filter_spec.py); questions the spec can't express fall back to SQL
+SQL_GENERATION_MODE = os.getenv("SQL_GENERATION_MODE", "sql").lower()
+filter_spec_stats = {"compiled": 0, "fallbacks": 0}
+
+# Follow-ups that only narrow the previous compiled search run against its result set instead
+# of all parcels; larger result sets aren't kept, as a long id list stops being cheaper
+REFINEMENT_ENABLED = os.getenv("REFINEMENT_ENABLED", "true").lower() == "true"
+REFINEMENT_MAX_PARCELS = int(os.getenv("REFINEMENT_MAX_PARCELS", "5000"))
+refinement_stats = {"refined": 0, "full_queries": 0}
+
+def normalize_query(query: Optional[str]) -> str:
+    """Normalize a natural language query for cache lookups (case, whitespace, trailing punctuation)."""
+    query = re.sub(r"\s+", " ", (query or "").lower())
+    return query.strip().rstrip(".?! ")
+
+def sql_cache_key(expanded_query: Optional[str]):
+    return (SCHEMA_VERSION, normalize_query(expanded_query))
+
+def get_sql_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counts for the generated-SQL cache plus the estimated LLM time saved"""
+    stats = sql_cache.stats()
+    calls = sql_generation_timing["calls"]
+    avg_seconds = sql_generation_timing["seconds"] / calls if calls else 0.0
+    stats["schema_version"] = SCHEMA_VERSION
+    stats["avg_generate_sql_seconds"] = round(avg_seconds, 3)
+    stats["estimated_seconds_saved"] = round(stats["hits"] * avg_seconds, 3)
+    stats["generation_mode"] = SQL_GENERATION_MODE
+    stats["filter_spec"] = filter_spec_stats
+    stats["refinement"] = {**refinement_stats, "enabled": REFINEMENT_ENABLED}
+    return stats
 
 # --- HELPER FUNCTIONS ---
 def clean_sql(sql: str) -> str:
@@ -186,31 +346,91 @@ def clean_sql(sql: str) -> str:
     
     return sql.strip()
 
+def message_role_content(msg) -> tuple:
+    """(role, content) of a conversation entry: a dict, or a message object after add_messages"""
+    if isinstance(msg, dict):
+        return msg.get("role", "unknown"), msg.get("content", "")
+    if hasattr(msg, 'type'):  # AIMessage or HumanMessage
+        return ("assistant" if msg.type == "ai" else "user"), getattr(msg, 'content', str(msg))
+    if hasattr(msg, 'content'):  # Generic message object
+        return "assistant", msg.content
+    return "unknown", str(msg)
+
+def format_conversation(conversation, last_n: Optional[int] = None) -> str:
+    """Conversation as "role: content" lines, optionally only the last_n entries"""
+    lines = [f"{role}: {content}" for role, content in map(message_role_content, conversation or [])]
+    return "\n".join(lines[-last_n:] if last_n else lines)
+
+def rendered_sql(state: SQLState) -> str:
+    """sql_query with any bind parameters inlined, for prompts and display"""
+    # A refinement's parcel_id list stays a placeholder; it can be thousands of ids
+    params = {k: v for k, v in (state.get("sql_params") or {}).items() if k != "within_parcel_ids"}
+    return render_sql(state.get("sql_query") or "", params)
+
+# --- FAST PATH ---
+# FAST_PATH_ENABLED=true lets formulaic first-turn searches (acreage, county/town, capacity,
+# value, distance to infrastructure) skip the LLM entirely; see fast_path.py
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+fast_path_stats = {"hits": 0, "misses": 0}
+_fast_path_parser: Optional[FastPathParser] = None
+
+def get_fast_path_parser() -> FastPathParser:
+    """The fast-path parser, built on first use with the municipality names in parcels.parcel_details"""
+    global _fast_path_parser
+    if _fast_path_parser is None:
+        try:
+            with query_engine.connect() as con:
+                municipalities = con.execute(text("SELECT DISTINCT municipality_name FROM parcels.parcel_details")).scalars().all()
+        except Exception as e:
+            print(f"Could not load municipality names for the fast path: {e}")
+            municipalities = []
+        _fast_path_parser = FastPathParser(municipalities)
+    return _fast_path_parser
+
+def get_fast_path_stats() -> Dict[str, Any]:
+    """Searches answered by the rule-based parser vs. sent to the LLM"""
+    total = fast_path_stats["hits"] + fast_path_stats["misses"]
+    return {**fast_path_stats, "enabled": FAST_PATH_ENABLED, "hit_rate": round(fast_path_stats["hits"] / total, 4) if total else 0.0}
+
 # --- NODES ---
-def topic_filter(state: SQLState):
-    """Filter the user's query to ensure it is related to solar site selection."""
+# Each LLM node is split into prompt construction and output handling, shared by the
+# sync node and its async twin (a-prefixed, selected with ASYNC_NODES=true).
+def _fast_path_update(state: SQLState, parser: Optional[FastPathParser]):
+    # Follow-ups go through contextual_query_understanding, which needs the conversation
+    parsed = parser.parse(state.get("user_query")) if parser is not None and not state.get("conversation") else None
+    if parsed is None:
+        fast_path_stats["misses"] += 1
+        return {"fast_path": False}
+    sql, explanation = parsed
+    fast_path_stats["hits"] += 1
+    print("⚡ Fast path: SQL built without the LLM")
     user_query = state.get("user_query", "")
-    conversation = state.get("conversation", [])
-    
-    # Build conversation context string
-    conversation_context = ""
-    if conversation:
-        conversation_parts = []
-        for msg in conversation:
-            if isinstance(msg, dict):
-                role = msg.get("role", "unknown")
-                content = msg.get("content", "")
-            elif hasattr(msg, 'type'):  # AIMessage or HumanMessage
-                role = "assistant" if msg.type == "ai" else "user"
-                content = msg.content if hasattr(msg, 'content') else str(msg)
-            elif hasattr(msg, 'content'):  # Generic message object
-                role = "assistant"  # Default to assistant if we can't determine
-                content = msg.content
-            else:
-                continue  # Skip unknown message types
-            
-            conversation_parts.append(f"{role}: {content}")
-        conversation_context = "\n".join(conversation_parts[-6:])  # Last 6 messages for context
+    return {
+        "fast_path": True,
+        "relevant_query_topic": True,
+        "vague_conditions": [],
+        "expanded_query": user_query,
+        "sql_query": sql,
+        "sql_params": None,
+        "filter_spec": None,
+        "sql_cache_hit": False,
+        "sql_explanation": explanation,
+        "conversation": [{"role": "user", "content": user_query}],
+    }
+
+def parse_fast_path(state: SQLState):
+    """Build SQL for a formulaic search with the rule-based parser, skipping the LLM front end."""
+    return _fast_path_update(state, get_fast_path_parser() if FAST_PATH_ENABLED else None)
+
+async def aparse_fast_path(state: SQLState):
+    """Async parse_fast_path; the first call loads the municipality names off the event loop."""
+    parser = await asyncio.to_thread(get_fast_path_parser) if FAST_PATH_ENABLED else None
+    return _fast_path_update(state, parser)
+
+def _topic_filter_chain(state: SQLState):
+    """Build the topic filter chain and its inputs."""
+    user_query = state.get("user_query", "")
+    conversation_context = format_conversation(state.get("conversation"), last_n=6)  # Last 6 messages for context
     
     # Create enhanced prompt with conversation context
     if conversation_context:
@@ -232,8 +452,9 @@ Conversation context:
         )
     
     chain = prompt | llm | JsonOutputParser()
-    data = chain.invoke({"user_query": user_query})
-    
+    return chain, {"user_query": user_query}
+
+def _topic_filter_update(data: Dict[str, Any]):
     is_relevant = data.get("solar_query", False)
     
     if not is_relevant:
@@ -246,30 +467,20 @@ Conversation context:
     
     return {"relevant_query_topic": True}
 
-def contextual_query_understanding(state: SQLState):
-    """Rewrite user's query in context using conversation memory."""
-    conversation = state.get("conversation", [])
+def topic_filter(state: SQLState):
+    """Filter the user's query to ensure it is related to solar site selection."""
+    chain, inputs = _topic_filter_chain(state)
+    return _topic_filter_update(chain.invoke(inputs))
+
+async def atopic_filter(state: SQLState):
+    """Async topic_filter."""
+    chain, inputs = _topic_filter_chain(state)
+    return _topic_filter_update(await chain.ainvoke(inputs))
+
+def _contextual_query_prompt(state: SQLState) -> str:
+    """Build the query rewrite prompt from conversation memory."""
     user_query = state.get("user_query", "")
-    
-    # Convert conversation messages to dicts if they're AIMessage objects
-    conversation_str = ""
-    if conversation:
-        conversation_parts = []
-        for msg in conversation:
-            if isinstance(msg, dict):
-                role = msg.get("role", "unknown")
-                content = msg.get("content", "")
-            elif hasattr(msg, 'type'):  # AIMessage or HumanMessage
-                role = "assistant" if msg.type == "ai" else "user"
-                content = msg.content if hasattr(msg, 'content') else str(msg)
-            elif hasattr(msg, 'content'):  # Generic message object with content
-                role = "assistant"  # Default to assistant if we can't determine
-                content = msg.content
-            else:
-                role = "unknown"
-                content = str(msg)
-            conversation_parts.append(f"{role}: {content}")
-        conversation_str = "\n".join(conversation_parts)
+    conversation_str = format_conversation(state.get("conversation"))
     
     prompt = f"""
     You are a helpful assistant that interprets user questions about a parcel database.
@@ -284,7 +495,10 @@ def contextual_query_understanding(state: SQLState):
     Rewrite the latest query so it can be executed independently.
     Return only the rewritten text.
     """
-    rewritten = llm.invoke(prompt).content.strip()
+    return prompt
+
+def _contextual_query_update(state: SQLState, rewritten: str):
+    user_query = state.get("user_query", "")
     return {
         "expanded_query": rewritten,
         "conversation": [
@@ -293,19 +507,21 @@ def contextual_query_understanding(state: SQLState):
         ],
     }
 
-def resolve_vague_conditions(state: SQLState):
-    """
-    Detect vague or underspecified conditions in the user's query.
-    Attempt to infer reasonable replacements using schema + geography context.
-    Ask user to confirm or refine.
-    """
-    user_query = state.get("user_query", "")
-    
-    prompt_template_str = """
+def contextual_query_understanding(state: SQLState):
+    """Rewrite user's query in context using conversation memory."""
+    rewritten = llm.invoke(_contextual_query_prompt(state)).content.strip()
+    return _contextual_query_update(state, rewritten)
+
+async def acontextual_query_understanding(state: SQLState):
+    """Async contextual_query_understanding."""
+    rewritten = (await llm.ainvoke(_contextual_query_prompt(state))).content.strip()
+    return _contextual_query_update(state, rewritten)
+
+VAGUE_CONDITIONS_PROMPT = """
     Analyze the following user query and identify ONLY truly vague or underspecified conditions.
     
     **CRITICAL RULES**:
-    1. You must analyze the ACTUAL user query provided below: "{user_query}"
+    1. You must analyze the ACTUAL user query given at the end of this message.
     2. Do NOT use example values. Only return vague conditions that actually exist in THIS user query.
     3. ONLY flag conditions that are genuinely vague - conditions with specific values (numbers, distances, feature types) are NOT vague.
     
@@ -334,8 +550,6 @@ def resolve_vague_conditions(state: SQLState):
     - "Parcels over 20 acres" → CLEAR (has specific size)
     - "In Worcester county" → CLEAR (has specific location)
     
-    Schema information: {SCHEMA_TEXT}
-    
     Respond ONLY as JSON in this format (only include vague conditions that actually exist in the user query):
     {{{{
       "vague_conditions": [
@@ -351,62 +565,49 @@ def resolve_vague_conditions(state: SQLState):
     {{{{
       "vague_conditions": []
     }}}}
+
+    Schema information: {SCHEMA_TEXT}
+
+    User query: "{user_query}"
     """
 
-    # Use ChatPromptTemplate for better prompt handling
-    from langchain_core.prompts import ChatPromptTemplate
-    from langchain_core.output_parsers import JsonOutputParser
-    
+def _vague_conditions_chain():
     prompt_template = ChatPromptTemplate.from_messages([
         ("system", "You are a SQL query analyzer. Analyze the ACTUAL user query for vague conditions. Do NOT use example values - only analyze the real user query provided."),
-        ("human", prompt_template_str)
+        ("human", VAGUE_CONDITIONS_PROMPT)
     ])
-    
-    parser = JsonOutputParser()
-    chain = prompt_template | llm | parser
-    
-    try:
-        result = chain.invoke({"SCHEMA_TEXT": SCHEMA_TEXT, "user_query": user_query})
-        # JsonOutputParser should return a dict, but check if it's an AIMessage
-        if hasattr(result, 'content'):
-            # It's an AIMessage, parse the content
-            import json
-            data = json.loads(result.content)
-        elif isinstance(result, dict):
-            # It's already a dict
-            data = result
-        else:
-            # Try to convert to dict
-            data = dict(result) if hasattr(result, '__dict__') else {}
-        vague_conditions = data.get("vague_conditions", []) if isinstance(data, dict) else []
-    except Exception as e:
-        print(f"Error parsing vague conditions with JsonOutputParser: {e}")
-        import traceback
-        traceback.print_exc()
-        # Fallback: try direct LLM call with manual JSON parsing
-        try:
-            # Format the prompt with actual values
-            formatted_prompt = prompt_template_str.format(SCHEMA_TEXT=SCHEMA_TEXT, user_query=user_query)
-            response = llm.invoke(formatted_prompt)
-            # Extract content if it's an AIMessage
-            if hasattr(response, 'content'):
-                response_text = response.content.strip()
-            else:
-                response_text = str(response).strip()
-            import json
-            # Try to extract JSON from markdown if present
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
-            data = json.loads(response_text)
-            vague_conditions = data.get("vague_conditions", []) if isinstance(data, dict) else []
-        except Exception as e2:
-            print(f"Error in fallback parsing: {e2}")
-            import traceback
-            traceback.print_exc()
-            vague_conditions = []
-
+    return prompt_template | llm | JsonOutputParser()
+
+def _parse_vague_conditions(result) -> List[Dict[str, str]]:
+    # JsonOutputParser should return a dict, but check if it's an AIMessage
+    if hasattr(result, 'content'):
+        # It's an AIMessage, parse the content
+        import json
+        data = json.loads(result.content)
+    elif isinstance(result, dict):
+        # It's already a dict
+        data = result
+    else:
+        # Try to convert to dict
+        data = dict(result) if hasattr(result, '__dict__') else {}
+    return data.get("vague_conditions", []) if isinstance(data, dict) else []
+
+def _parse_vague_conditions_fallback(response) -> List[Dict[str, str]]:
+    # Extract content if it's an AIMessage
+    if hasattr(response, 'content'):
+        response_text = response.content.strip()
+    else:
+        response_text = str(response).strip()
+    import json
+    # Try to extract JSON from markdown if present
+    if "```json" in response_text:
+        response_text = response_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in response_text:
+        response_text = response_text.split("```")[1].split("```")[0].strip()
+    data = json.loads(response_text)
+    return data.get("vague_conditions", []) if isinstance(data, dict) else []
+
+def _vague_conditions_update(vague_conditions: List[Dict[str, str]]):
     if not vague_conditions:
         # No vague items detected → proceed directly
         return {
@@ -432,13 +633,181 @@ def resolve_vague_conditions(state: SQLState):
         "vague_conditions": vague_conditions,
     }
 
+def resolve_vague_conditions(state: SQLState):
+    """
+    Detect vague or underspecified conditions in the user's query.
+    Attempt to infer reasonable replacements using schema + geography context.
+    Ask user to confirm or refine.
+    """
+    inputs = {"SCHEMA_TEXT": schema_index.schema_for(state.get("user_query")), "user_query": state.get("user_query", "")}
+    try:
+        vague_conditions = _parse_vague_conditions(_vague_conditions_chain().invoke(inputs))
+    except Exception as e:
+        print(f"Error parsing vague conditions with JsonOutputParser: {e}")
+        import traceback
+        traceback.print_exc()
+        # Fallback: try direct LLM call with manual JSON parsing
+        try:
+            # Format the prompt with actual values
+            response = llm.invoke(VAGUE_CONDITIONS_PROMPT.format(**inputs))
+            vague_conditions = _parse_vague_conditions_fallback(response)
+        except Exception as e2:
+            print(f"Error in fallback parsing: {e2}")
+            import traceback
+            traceback.print_exc()
+            vague_conditions = []
+    return _vague_conditions_update(vague_conditions)
+
+async def aresolve_vague_conditions(state: SQLState):
+    """Async resolve_vague_conditions."""
+    inputs = {"SCHEMA_TEXT": schema_index.schema_for(state.get("user_query")), "user_query": state.get("user_query", "")}
+    try:
+        vague_conditions = _parse_vague_conditions(await _vague_conditions_chain().ainvoke(inputs))
+    except Exception as e:
+        print(f"Error parsing vague conditions with JsonOutputParser: {e}")
+        import traceback
+        traceback.print_exc()
+        try:
+            response = await llm.ainvoke(VAGUE_CONDITIONS_PROMPT.format(**inputs))
+            vague_conditions = _parse_vague_conditions_fallback(response)
+        except Exception as e2:
+            print(f"Error in fallback parsing: {e2}")
+            import traceback
+            traceback.print_exc()
+            vague_conditions = []
+    return _vague_conditions_update(vague_conditions)
+
+
+# Front-end nodes that only read user_query/conversation and can run concurrently
+FRONT_END_NODES = {
+    "topic_filter": topic_filter,
+    "contextual_query_understanding": contextual_query_understanding,
+    "resolve_vague_conditions": resolve_vague_conditions,
+}
+
+def parallel_front_end(state: SQLState):
+    """
+    Fan out topic_filter, contextual_query_understanding and resolve_vague_conditions,
+    then join their updates before generate_sql.
+    If topic_filter rejects the query, return immediately and abandon the other calls.
+    """
+    futures = {submit_llm_work(timed(node, name), state): name for name, node in FRONT_END_NODES.items()}
+    outputs = {}
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            outputs[futures[future]] = future.result()
+        topic_output = outputs.get("topic_filter")
+        if topic_output and topic_output.get("relevant_query_topic") is False:
+            for future in pending:
+                future.cancel()  # Not-yet-started calls are dropped; in-flight results are discarded
+            return topic_output
+
+    return _merge_front_end_outputs(outputs)
+
+ASYNC_FRONT_END_NODES = {
+    "topic_filter": atopic_filter,
+    "contextual_query_understanding": acontextual_query_understanding,
+    "resolve_vague_conditions": aresolve_vague_conditions,
+}
+
+async def aparallel_front_end(state: SQLState):
+    """Async parallel_front_end; a topic rejection cancels the in-flight LLM calls."""
+    tasks = {asyncio.create_task(timed(node, name)(state)): name for name, node in ASYNC_FRONT_END_NODES.items()}
+    outputs = {}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                outputs[tasks[task]] = task.result()
+            topic_output = outputs.get("topic_filter")
+            if topic_output and topic_output.get("relevant_query_topic") is False:
+                return topic_output
+    finally:
+        for task in pending:
+            task.cancel()
+    return _merge_front_end_outputs(outputs)
+
+def _merge_front_end_outputs(outputs: Dict[str, Dict[str, Any]]):
+    # Merge in serial order so the conversation reads the same as the serial graph
+    merged = {}
+    conversation = []
+    for name in FRONT_END_NODES:
+        output = dict(outputs[name])
+        conversation.extend(output.pop("conversation", []))
+        merged.update(output)
+    merged["conversation"] = conversation
+    return merged
+
+# --- FUSED FRONT END ---
+# FUSED_FRONT_END=true replaces the three front-end calls with one structured-output call
+class VagueCondition(BaseModel):
+    original: str = Field(description="Exact vague phrase from the latest query")
+    suggested_replacement: str = Field(description="Concrete interpretation of the phrase")
+    reasoning: str = Field(description="Why this interpretation was chosen")
+
+class FrontEndAnalysis(BaseModel):
+    """Relevance, self-contained rewrite and vague conditions of the latest query"""
+    solar_query: bool = Field(description="True if the query is about parcel search for solar siting")
+    message: Optional[str] = Field(None, description="Message for the user when solar_query is false")
+    rewritten_query: str = Field(description="The latest query rewritten to be self-contained")
+    vague_conditions: List[VagueCondition] = Field(default_factory=list)
+
+def _fused_front_end_chain():
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You analyze parcel search queries for a solar site selection tool. Analyze only the actual latest query, never the examples."),
+        ("human", fused_front_end_template),
+    ])
+    return prompt | llm.with_structured_output(FrontEndAnalysis)
+
+def _fused_front_end_inputs(state: SQLState):
+    user_query = state.get("user_query", "")
+    return {
+        "schema": schema_index.schema_for(user_query),
+        "conversation": format_conversation(state.get("conversation")) or "(none)",
+        "user_query": user_query,
+    }
+
+def _fused_front_end_update(state: SQLState, analysis: FrontEndAnalysis):
+    # Same updates as the three separate nodes, merged as parallel_front_end does
+    topic_data = {"solar_query": analysis.solar_query}
+    if analysis.message:
+        topic_data["message"] = analysis.message
+    topic_output = _topic_filter_update(topic_data)
+    if topic_output.get("relevant_query_topic") is False:
+        return topic_output
+    return _merge_front_end_outputs({
+        "topic_filter": topic_output,
+        "contextual_query_understanding": _contextual_query_update(state, analysis.rewritten_query.strip() or state.get("user_query", "")),
+        "resolve_vague_conditions": _vague_conditions_update([cond.model_dump() for cond in analysis.vague_conditions]),
+    })
+
+def fused_front_end(state: SQLState):
+    """
+    topic_filter, contextual_query_understanding and resolve_vague_conditions in a single
+    structured-output LLM call. Falls back to the separate calls if it fails.
+    """
+    try:
+        analysis = _fused_front_end_chain().invoke(_fused_front_end_inputs(state))
+    except Exception as e:
+        print(f"Fused front end failed, using the separate calls: {e}")
+        return parallel_front_end(state)
+    return _fused_front_end_update(state, analysis)
+
+async def afused_front_end(state: SQLState):
+    """Async fused_front_end."""
+    try:
+        analysis = await _fused_front_end_chain().ainvoke(_fused_front_end_inputs(state))
+    except Exception as e:
+        print(f"Fused front end failed, using the separate calls: {e}")
+        return await aparallel_front_end(state)
+    return _fused_front_end_update(state, analysis)
 
-def generate_sql_explanation(sql_query: str, user_query: str) -> str:
-    """Generate a natural language explanation of what the SQL query does"""
-    if not sql_query:
-        return ""
-    
-    prompt = f"""Translate the following SQL query into a clear, natural language explanation of what it does. 
+
+def _sql_explanation_prompt(sql_query: str, user_query: str) -> str:
+    return f"""Translate the following SQL query into a clear, natural language explanation of what it does. 
 Explain it as if you're describing your thought process to a user who asked: "{user_query}"
 
 SQL Query:
@@ -451,20 +820,49 @@ Provide a concise explanation (2-4 sentences) that describes:
 
 Keep it simple and avoid technical jargon. Focus on what the query is looking for, not SQL syntax.
 """
+
+def generate_sql_explanation(sql_query: str, user_query: str) -> str:
+    """Generate a natural language explanation of what the SQL query does"""
+    if not sql_query:
+        return ""
     
     try:
-        response = llm.invoke(prompt)
+        response = llm.invoke(_sql_explanation_prompt(sql_query, user_query))
         explanation = response.content if hasattr(response, 'content') else str(response)
         return explanation.strip()
     except Exception as e:
         print(f"Error generating SQL explanation: {e}")
         return ""
 
-
-def generate_sql(state: SQLState):
-    """Generate SQL from the natural language query."""
-    expanded_query = state.get("expanded_query", "")
+async def agenerate_sql_explanation(sql_query: str, user_query: str) -> str:
+    """Async generate_sql_explanation."""
+    if not sql_query:
+        return ""
     
+    try:
+        response = await llm.ainvoke(_sql_explanation_prompt(sql_query, user_query))
+        explanation = response.content if hasattr(response, 'content') else str(response)
+        return explanation.strip()
+    except Exception as e:
+        print(f"Error generating SQL explanation: {e}")
+        return ""
+
+
+def lookup_cached_sql(state: SQLState):
+    """Serve previously validated SQL for the same expanded query, skipping generate_sql."""
+    cached = sql_cache.get(sql_cache_key(state.get("expanded_query")))
+    if cached:
+        print("⚡ SQL cache hit")
+        sql_query, sql_params, filter_spec = cached
+        if filter_spec is not None:
+            # Compiled again so the search can be narrowed to this session's previous results
+            update = _filter_spec_sql_update(state, FilterSpec.model_validate(filter_spec))
+            return {**update, "sql_cache_hit": True} if update is not None else {"sql_cache_hit": False}
+        return {"sql_query": sql_query, "sql_params": sql_params, "filter_spec": None, "sql_cache_hit": True}
+    return {"sql_cache_hit": False}
+
+
+def _generate_sql_chain():
     prompt = ChatPromptTemplate.from_messages(
         [
             # "**CRITICAL**: ALWAYS include the 'ST_AsGeoJSON(geometry)::json as geometry' field from parcel_details database table in your SELECT clause."
@@ -474,50 +872,217 @@ def generate_sql(state: SQLState):
             ("human", write_sql_template),
         ]
     )
-    chain = prompt | llm | StrOutputParser()
-    response = chain.invoke({"tables": SCHEMA_TEXT, "user_query": expanded_query})
-    
+    return prompt | llm | StrOutputParser()
+
+def _filter_spec_chain():
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", "You translate parcel search questions into structured filters. Never guess a filter the question doesn't ask for."),
+            ("human", filter_spec_template),
+        ]
+    )
+    return prompt | llm.with_structured_output(FilterSpec)
+
+def _generate_sql_inputs(state: SQLState):
+    expanded_query = state.get("expanded_query", "")
+    return {"tables": schema_index.schema_for(expanded_query), "user_query": expanded_query}
+
+def _refinement_parcel_ids(state: SQLState, spec: FilterSpec) -> Optional[List[str]]:
+    """The previous result set if spec only narrows the search that produced it, else None"""
+    base = state.get("refinement_base")
+    if not REFINEMENT_ENABLED or not base:
+        return None
+    if not narrows(FilterSpec.model_validate(base["filter_spec"]), spec):
+        return None
+    return get_result_set(base["result_id"])
+
+def _filter_spec_sql_update(state: SQLState, spec: FilterSpec):
+    """sql_query/sql_params compiled from a filter spec, or None if the spec can't be compiled"""
+    parcel_ids = _refinement_parcel_ids(state, spec)
+    compiled = compile_filter_spec(spec, parcel_ids)
+    if compiled is None:
+        return None
+    if state.get("refinement_base") and REFINEMENT_ENABLED:
+        if parcel_ids is None:
+            refinement_stats["full_queries"] += 1
+        else:
+            refinement_stats["refined"] += 1
+            print(f"⚡ Refinement: searching within the previous {len(parcel_ids)} results")
+    sql, params = compiled
+    return {"sql_query": sql, "sql_params": params, "filter_spec": spec.model_dump()}
+
+def _compile_filter_spec(state: SQLState, spec: Optional[FilterSpec]):
+    update = _filter_spec_sql_update(state, spec) if spec is not None else None
+    if update is None:
+        filter_spec_stats["fallbacks"] += 1
+        print(f"Filter spec not usable, generating SQL instead: {getattr(spec, 'unsupported_reason', None)}")
+        return None
+    filter_spec_stats["compiled"] += 1
+    return update
+
+def _generate_sql_update(response: str, start_time: float):
     sql = clean_sql(response)
     # sql = ensure_geometry_as_geojson(sql)
-    return {"sql_query": sql}
+    return _timed_sql_update({"sql_query": sql, "sql_params": None, "filter_spec": None}, start_time)
 
+def _timed_sql_update(update: Dict[str, Any], start_time: float):
+    sql_generation_timing["calls"] += 1
+    sql_generation_timing["seconds"] += time.perf_counter() - start_time
+    return update
 
-def execute_sql(state: SQLState):
-    con = engine.connect()
-    rows, error = run_query(state["sql_query"], con)
-    con.close()
-    
-    # Convert RowMapping objects to plain dictionaries for serialization
-    # This is necessary because the checkpointer needs to serialize the state
-    # RowMapping objects from SQLAlchemy are not JSON/msgpack serializable
-    if rows:
-        serializable_rows = [dict(row) for row in rows]
-        rows = serializable_rows
-    
-    return {"results": rows, "error": error}
+def generate_sql(state: SQLState):
+    """Generate SQL from the natural language query."""
+    start_time = time.perf_counter()
+    if SQL_GENERATION_MODE == "filter_spec":
+        try:
+            update = _compile_filter_spec(state, _filter_spec_chain().invoke({"user_query": state.get("expanded_query", "")}))
+        except Exception as e:
+            print(f"Error generating filter spec: {e}")
+            update = _compile_filter_spec(state, None)
+        if update is not None:
+            return _timed_sql_update(update, start_time)
+    response = _generate_sql_chain().invoke(_generate_sql_inputs(state))
+    return _generate_sql_update(response, start_time)
+
+async def agenerate_sql(state: SQLState):
+    """Async generate_sql."""
+    start_time = time.perf_counter()
+    if SQL_GENERATION_MODE == "filter_spec":
+        try:
+            update = _compile_filter_spec(state, await _filter_spec_chain().ainvoke({"user_query": state.get("expanded_query", "")}))
+        except Exception as e:
+            print(f"Error generating filter spec: {e}")
+            update = _compile_filter_spec(state, None)
+        if update is not None:
+            return _timed_sql_update(update, start_time)
+    response = await _generate_sql_chain().ainvoke(_generate_sql_inputs(state))
+    return _generate_sql_update(response, start_time)
 
-def check_unmatched_conditions(state: SQLState):
-    """
-    Check if user's filtering conditions match what's available in the database.
-    Warn user if they requested features that don't exist in the database.
-    """
+
+def _plan_check_update(state: SQLState, error: Optional[str]):
+    if error:
+        print(f"🚫 {error.splitlines()[0]}")
+        return {"error": error, "last_failed_sql": rendered_sql(state)}
+    return {"error": None}
+
+def check_sql_plan(state: SQLState):
+    """EXPLAIN the generated SQL and reject pathological plans before they cost execution time."""
+    return _plan_check_update(state, check_plan(query_engine, state["sql_query"], state.get("sql_params")))
+
+async def acheck_sql_plan(state: SQLState):
+    """Async check_sql_plan."""
+    return _plan_check_update(state, await acheck_plan(async_engine, state["sql_query"], state.get("sql_params")))
+
+
+def _stream_rows(config: Optional[RunnableConfig]) -> bool:
+    # Set per request by api_server; batches are surfaced to astream_events as custom events
+    return bool((config or {}).get("configurable", {}).get("stream_rows"))
+
+def _page_size(config: Optional[RunnableConfig]) -> int:
+    # Results are paged through a result handle when set (> 0); set per request by api_server
+    return int((config or {}).get("configurable", {}).get("page_size") or 0)
+
+def _paged_update(state: SQLState, parcel_ids, page, error):
+    if parcel_ids is None and not error:
+        # The query couldn't be paged by parcel_id; page holds all of its rows
+        return _execute_sql_update(state, page, error)
+    discard_result_rows(state.get("result_ref"))
+    if error:
+        return {"results": None, "result_ref": None, "result_count": 0, "result_handle": None, "error": error}
+    return {
+        "results": preview_rows(page),
+        "result_ref": store_result_rows(page),
+        "result_count": len(parcel_ids),
+        "result_handle": register_result_set(parcel_ids),
+        "error": None,
+    }
+
+def _detail_level(config: Optional[RunnableConfig]) -> str:
+    # Geometry variant to return (see db_actions.geometry_lod); set per request by api_server
+    return (config or {}).get("configurable", {}).get("detail_level") or "full"
+
+def execute_sql(state: SQLState, config: RunnableConfig):
+    # The unmatched-conditions check only needs the query and SQL, so run it alongside execution.
+    # Fast-path SQL only uses features the parser knows exist, so it needs no check.
+    if not state.get("fast_path"):
+        start_unmatched_check(state, config)
+
+    if _page_size(config):
+        parcel_ids, page, error = execute_read_only_paged(
+            query_engine, state["sql_query"], _page_size(config), _detail_level(config), state.get("sql_params")
+        )
+        return _paged_update(state, parcel_ids, page, error)
+
+    if _stream_rows(config):
+        streamed = stream_read_only(
+            query_engine, state["sql_query"],
+            lambda batch: dispatch_custom_event("parcels_batch", {"rows": batch}, config=config),
+            detail_level=_detail_level(config), sql_params=state.get("sql_params"),
+        )
+        if streamed.error and streamed.row_count:
+            # The client already has rows from this attempt; tell it to drop them before the repair
+            dispatch_custom_event("parcels_reset", {}, config=config)
+        return _execute_sql_update(state, streamed.preview, streamed.error, streamed.row_count, streamed.parcel_ids)
+
+    rows, error = execute_read_only(query_engine, state["sql_query"], _detail_level(config), state.get("sql_params"))
+    return _execute_sql_update(state, rows, error)
+
+async def aexecute_sql(state: SQLState, config: RunnableConfig):
+    """Async execute_sql on the asyncpg engine."""
+    if not state.get("fast_path"):
+        astart_unmatched_check(state, config)
+
+    if _page_size(config):
+        parcel_ids, page, error = await aexecute_read_only_paged(
+            async_engine, state["sql_query"], _page_size(config), _detail_level(config), state.get("sql_params")
+        )
+        return _paged_update(state, parcel_ids, page, error)
+
+    if _stream_rows(config):
+        async def on_batch(batch):
+            await adispatch_custom_event("parcels_batch", {"rows": batch}, config=config)
+
+        streamed = await astream_read_only(
+            async_engine, state["sql_query"], on_batch, detail_level=_detail_level(config), sql_params=state.get("sql_params")
+        )
+        if streamed.error and streamed.row_count:
+            await adispatch_custom_event("parcels_reset", {}, config=config)
+        return _execute_sql_update(state, streamed.preview, streamed.error, streamed.row_count, streamed.parcel_ids)
+
+    rows, error = await aexecute_read_only(async_engine, state["sql_query"], _detail_level(config), state.get("sql_params"))
+    return _execute_sql_update(state, rows, error)
+
+def _execute_sql_update(state: SQLState, rows, error, row_count: Optional[int] = None, parcel_ids=None):
+    # The rows stay out of the state: every later node checkpoints it, and serializing
+    # thousands of geometries each time costs more than the nodes themselves.
+    # A repair attempt replaces the rows of the previous attempt.
+    discard_result_rows(state.get("result_ref"))
+    if row_count is None:
+        row_count = len(rows) if rows else 0
+    result_handle = None
+    if REFINEMENT_ENABLED and state.get("filter_spec") and not error and row_count <= REFINEMENT_MAX_PARCELS:
+        # Kept as the base a narrowing follow-up is evaluated against
+        result_handle = register_result_set(parcel_ids if parcel_ids is not None else [row.get("parcel_id") for row in rows or []])
+    return {
+        "results": preview_rows(rows),
+        "result_ref": store_result_rows(rows),
+        "result_count": row_count,
+        "result_handle": result_handle,
+        "error": error,
+    }
+
+def _unmatched_conditions_chain(state: SQLState):
     user_query = state.get("user_query", "")
     expanded_query = state.get("expanded_query", "")
-    sql_query = state.get("sql_query", "")
+    sql_query = rendered_sql(state)
     results = state.get("results", [])
     
+    # Static instructions and the schema catalog come first so they form a stable, cacheable prompt prefix
     check_prompt = f"""
     Analyze the user's query and identify any filtering conditions that request features NOT available in the database.
     
-    User's original query: "{user_query}"
-    Expanded query: "{expanded_query}"
-    SQL query: "{sql_query}"
-    
-    Database schema (this shows all available features and their class values):
-    {SCHEMA_TEXT}
-    
     **IMPORTANT RULES**:
-    1. Use the database schema above to determine what features are available. Look at the column comments which describe the available class values (e.g., "substation" or "power_line" for infrastructure, "wetland" or "forest" for land_cover, etc.).
+    1. Use the database schema below to determine what features are available. Look at the column comments which describe the available class values (e.g., "substation" or "power_line" for infrastructure, "wetland" or "forest" for land_cover, etc.).
     2. If the user asks for features that are semantically similar to available features (e.g., "power stations" → "substation", "power lines" → "power_line"), these are MATCHED and should NOT be flagged.
     3. Only flag features that have NO equivalent in the database schema (e.g., "hospitals", "schools", "buildings" when referring to specific building types that are not in the schema).
     4. If the user asks to exclude features that don't exist (e.g., "without hospitals"), this should be flagged as a warning.
@@ -540,6 +1105,13 @@ def check_unmatched_conditions(state: SQLState):
       "unmatched_conditions": [],
       "has_unmatched": false
     }}}}
+
+    Database schema (this shows all available features and their class values):
+    {schema_index.catalog()}
+
+    User's original query: "{user_query}"
+    Expanded query: "{expanded_query}"
+    SQL query: "{sql_query}"
     """
     
     from langchain_core.prompts import ChatPromptTemplate
@@ -551,37 +1123,43 @@ def check_unmatched_conditions(state: SQLState):
     ])
     
     parser = JsonOutputParser()
-    chain = prompt_template | llm | parser
+    return prompt_template | llm | parser
+
+def _unmatched_conditions_update(result):
+    # Handle both dict and AIMessage
+    if hasattr(result, 'content'):
+        import json
+        data = json.loads(result.content)
+    elif isinstance(result, dict):
+        data = result
+    else:
+        data = dict(result) if hasattr(result, '__dict__') else {}
     
-    try:
-        result = chain.invoke({})
-        # Handle both dict and AIMessage
-        if hasattr(result, 'content'):
-            import json
-            data = json.loads(result.content)
-        elif isinstance(result, dict):
-            data = result
+    has_unmatched = data.get("has_unmatched", False) if isinstance(data, dict) else False
+    unmatched_conditions = data.get("unmatched_conditions", []) if isinstance(data, dict) else []
+    
+    if has_unmatched and unmatched_conditions:
+        # Build short, simple warning message
+        features = [cond['requested_feature'] for cond in unmatched_conditions]
+        if len(features) == 1:
+            warning_message = f"⚠️ Note: \"{features[0]}\" is not available in the database."
         else:
-            data = dict(result) if hasattr(result, '__dict__') else {}
-        
-        has_unmatched = data.get("has_unmatched", False) if isinstance(data, dict) else False
-        unmatched_conditions = data.get("unmatched_conditions", []) if isinstance(data, dict) else []
-        
-        if has_unmatched and unmatched_conditions:
-            # Build short, simple warning message
-            features = [cond['requested_feature'] for cond in unmatched_conditions]
-            if len(features) == 1:
-                warning_message = f"⚠️ Note: \"{features[0]}\" is not available in the database."
-            else:
-                features_str = ", ".join([f'"{f}"' for f in features[:-1]]) + f', and "{features[-1]}"'
-                warning_message = f"⚠️ Note: {features_str} are not available in the database."
-            
-            return {
-                "unmatched_conditions_warning": warning_message
-            }
-        
-        return {"unmatched_conditions_warning": None}
+            features_str = ", ".join([f'"{f}"' for f in features[:-1]]) + f', and "{features[-1]}"'
+            warning_message = f"⚠️ Note: {features_str} are not available in the database."
         
+        return {
+            "unmatched_conditions_warning": warning_message
+        }
+    
+    return {"unmatched_conditions_warning": None}
+
+def check_unmatched_conditions(state: SQLState):
+    """
+    Check if user's filtering conditions match what's available in the database.
+    Warn user if they requested features that don't exist in the database.
+    """
+    try:
+        return _unmatched_conditions_update(_unmatched_conditions_chain(state).invoke({}))
     except Exception as e:
         print(f"Error checking unmatched conditions: {e}")
         import traceback
@@ -589,49 +1167,134 @@ def check_unmatched_conditions(state: SQLState):
         # Don't fail the query if this check fails
         return {"unmatched_conditions_warning": None}
 
-def validate_sql(state: SQLState):
+async def acheck_unmatched_conditions(state: SQLState):
+    """Async check_unmatched_conditions."""
+    try:
+        return _unmatched_conditions_update(await _unmatched_conditions_chain(state).ainvoke({}))
+    except Exception as e:
+        print(f"Error checking unmatched conditions: {e}")
+        import traceback
+        traceback.print_exc()
+        return {"unmatched_conditions_warning": None}
+
+# In-flight unmatched-condition checks, keyed by (thread_id, run_id) → (sql_query, future or asyncio task).
+# run_id identifies one search, so concurrent searches in a session (a resubmit, a second tab) keep
+# their own checks; display_results removes the entry of its search on every path.
+pending_unmatched_checks: Dict[tuple, Any] = {}
+
+def _check_key(config: Optional[RunnableConfig]) -> tuple:
+    configurable = (config or {}).get("configurable", {})
+    return str(configurable.get("thread_id", "")), str(configurable.get("run_id", ""))
+
+def start_unmatched_check(state: SQLState, config: Optional[RunnableConfig]) -> None:
+    """Start check_unmatched_conditions in the background for the current SQL."""
+    discard_unmatched_check(config)
+    future = submit_llm_work(timed(check_unmatched_conditions, "check_unmatched_conditions"), dict(state))
+    pending_unmatched_checks[_check_key(config)] = (rendered_sql(state), future)
+
+def collect_unmatched_check(state: SQLState, config: Optional[RunnableConfig], block: bool) -> Dict[str, Any]:
+    """
+    Get the unmatched-conditions check for the current SQL.
+    Returns {} if there is nothing to collect, or if block=False and the check is still
+    running (it then stays pending for a later node).
+    """
+    key = _check_key(config)
+    pending = pending_unmatched_checks.get(key)
+    if not pending or pending[0] != rendered_sql(state):
+        return {}  # Already collected, or never started for this SQL
+    future = pending[1]
+    if not block and not future.done():
+        return {}
+    pending_unmatched_checks.pop(key, None)
+    return future.result()
+
+def astart_unmatched_check(state: SQLState, config: Optional[RunnableConfig]) -> None:
+    """Async start_unmatched_check: runs the check as a task on the current event loop."""
+    discard_unmatched_check(config)
+    task = asyncio.create_task(timed(acheck_unmatched_conditions, "check_unmatched_conditions")(dict(state)))
+    pending_unmatched_checks[_check_key(config)] = (rendered_sql(state), task)
+
+async def acollect_unmatched_check(state: SQLState, config: Optional[RunnableConfig], block: bool) -> Dict[str, Any]:
+    """Async collect_unmatched_check."""
+    key = _check_key(config)
+    pending = pending_unmatched_checks.get(key)
+    if not pending or pending[0] != rendered_sql(state):
+        return {}
+    task = pending[1]
+    if not block and not task.done():
+        return {}
+    pending_unmatched_checks.pop(key, None)
+    return await task
+
+def discard_unmatched_check(config: Optional[RunnableConfig]) -> None:
+    pending = pending_unmatched_checks.pop(_check_key(config), None)
+    if pending:
+        pending[1].cancel()
+
+def validate_sql(state: SQLState, config: RunnableConfig):
     """
     Validate SQL before accepting results:
-    - Check syntax via EXPLAIN
+    - Check syntax and plan cost via EXPLAIN (done before execution by check_sql_plan)
     - Check non-empty results
     - Check for unmatched conditions (features requested that don't exist in DB)
     - Use LLM to confirm the results make sense
     """
-    sql_query = state.get("sql_query", "")
-    results = state.get("results")
+    # The unmatched-conditions check explains empty results, so only wait for it then.
+    # With results, use the answer if it's ready; otherwise display_results collects it.
+    unmatched_check = collect_unmatched_check(state, config, block=not state.get("result_count"))
+    return _validation_update(state, unmatched_check.get("unmatched_conditions_warning"))
+
+async def avalidate_sql(state: SQLState, config: RunnableConfig):
+    """Async validate_sql."""
+    unmatched_check = await acollect_unmatched_check(state, config, block=not state.get("result_count"))
+    return _validation_update(state, unmatched_check.get("unmatched_conditions_warning"))
+
+ZERO_RESULTS_ERROR = "Query executed successfully but returned 0 results."
 
-    # 1️⃣ Check SQL syntax using EXPLAIN
-    # try:
-    #     with engine.connect() as conn:
-    #         conn.execute(text(f"EXPLAIN {sql_query}"))
-    # except Exception as e:
-    #     return {"error": f"SQL syntax error: {e}", "last_failed_sql": sql_query}
+def _validation_update(state: SQLState, unmatched_warning: Optional[str]):
+    sql_query = rendered_sql(state)
+    result_count = state.get("result_count")
 
-    # 2️⃣ Check for unmatched conditions (features requested that don't exist in DB)
-    unmatched_check = check_unmatched_conditions(state)
-    unmatched_warning = unmatched_check.get("unmatched_conditions_warning")
+    # 1️⃣ SQL syntax and plan cost are checked with EXPLAIN before execution (check_sql_plan)
+
+    # 2️⃣ Execution errors (e.g. statement_timeout) go to repair_sql as they are
+    if state.get("error"):
+        return {"error": state["error"], "last_failed_sql": sql_query}
 
     # 3️⃣ Check for empty results
-    if not results or len(results) == 0:
+    if not result_count:
         # If there are unmatched conditions, include that in the error message
         if unmatched_warning:
             return {
-                "error": f"Query executed successfully but returned 0 results. {unmatched_warning}",
+                "error": f"{ZERO_RESULTS_ERROR} {unmatched_warning}",
                 "last_failed_sql": sql_query,
                 "unmatched_conditions_warning": unmatched_warning,
             }
         return {
-            "error": "Query executed successfully but returned 0 results.",
+            "error": ZERO_RESULTS_ERROR,
             "last_failed_sql": sql_query,
         }
     
-    # If we have results but unmatched conditions, include warning
+    # Only SQL that returned results is cached for reuse; compiled searches are cached as their
+    # spec, since the SQL of a refinement is tied to this session's previous results
+    filter_spec = state.get("filter_spec")
+    if filter_spec:
+        sql_cache.set(sql_cache_key(state.get("expanded_query")), (None, None, filter_spec))
+    else:
+        sql_cache.set(sql_cache_key(state.get("expanded_query")), (state.get("sql_query"), state.get("sql_params"), None))
+
+    refinement = {}
+    if filter_spec and state.get("result_handle") and result_count <= REFINEMENT_MAX_PARCELS:
+        refinement = {"refinement_base": {"result_id": state["result_handle"], "filter_spec": filter_spec}}
+
+    # 4️⃣ If we have results but unmatched conditions, include warning
     if unmatched_warning:
         return {
-            "unmatched_conditions_warning": unmatched_warning
+            "unmatched_conditions_warning": unmatched_warning,
+            **refinement,
         }
 
-    # # 3️⃣ Validate alignment with user intent
+    # # 5️⃣ Validate alignment with user intent
     # # Use the first few rows to check correctness
     # preview = state.results[:3]
     # validation_prompt = f"""
@@ -655,59 +1318,57 @@ def validate_sql(state: SQLState):
     #     return {"error": "Results appear misaligned with user intent.", "last_failed_sql": state.sql_query}
 
     # ✅ All good
-    return {"error": None}
+    return {"error": None, **refinement}
 
 
-def repair_sql(state: SQLState):
-    """If SQL failed or failed validation, ask the LLM to fix it."""
-    error = state.get("error")
-    if not error:
-        return state
-
-    last_failed_sql = state.get("last_failed_sql", "")
-    attempt = state.get("attempt", 0)
-    
-    prompt = f"""
+def _repair_sql_prompt(state: SQLState) -> str:
+    return f"""
     The following SQL query failed validation.
 
     SQL:
-    {last_failed_sql}
+    {state.get("last_failed_sql", "")}
 
     Error or problem:
-    {error}
+    {state.get("error")}
 
     Please correct the SQL and return only the fixed statement.
     """
-    response = llm.invoke(prompt).content.strip()
+
+def _repair_sql_update(state: SQLState, response: str):
     fixed = clean_sql(response)
     # fixed = ensure_geometry_as_geojson(fixed)
     
-    return {"sql_query": fixed, "error": None, "attempt": attempt + 1}
+    # The repaired SQL is written from the rendered statement, so it has no bind parameters, and
+    # it is no longer the fast path's SQL (display_results explains it with the LLM)
+    return {"sql_query": fixed, "sql_params": None, "filter_spec": None, "fast_path": False, "error": None, "attempt": state.get("attempt", 0) + 1}
 
+def repair_sql(state: SQLState):
+    """If SQL failed or failed validation, ask the LLM to fix it."""
+    if not state.get("error"):
+        return state
+    response = llm.invoke(_repair_sql_prompt(state)).content.strip()
+    return _repair_sql_update(state, response)
 
+async def arepair_sql(state: SQLState):
+    """Async repair_sql."""
+    if not state.get("error"):
+        return state
+    response = (await llm.ainvoke(_repair_sql_prompt(state))).content.strip()
+    return _repair_sql_update(state, response)
 
-def display_results(state: SQLState):
-    """Final display node."""
+
+
+def _display_conversation(state: SQLState):
+    """Add topic filter, vague condition and error messages to the conversation if missing."""
     error = state.get("error")
-    results = state.get("results")
     conversation = state.get("conversation", [])
     vague_conditions = state.get("vague_conditions", [])
     topic_filter_message = state.get("topic_filter_message")
-    unmatched_warning = state.get("unmatched_conditions_warning")
     
     # If topic filter failed, add the error message
     if topic_filter_message:
-        # Check if message is already in conversation (handle both dict and AIMessage)
-        message_exists = False
-        if conversation:
-            last_msg = conversation[-1]
-            if isinstance(last_msg, dict):
-                last_content = last_msg.get("content", "")
-            elif hasattr(last_msg, 'content'):
-                last_content = last_msg.content
-            else:
-                last_content = str(last_msg)
-            message_exists = (last_content == topic_filter_message)
+        # Check if message is already in conversation
+        message_exists = bool(conversation) and message_role_content(conversation[-1])[1] == topic_filter_message
         
         if not message_exists:
             conversation.append({"role": "assistant", "content": topic_filter_message})
@@ -716,18 +1377,7 @@ def display_results(state: SQLState):
     # Just ensure it's there
     if vague_conditions and len(vague_conditions) > 0:
         # Check if the vague conditions message is already in conversation
-        # Handle both dict and AIMessage objects
-        vague_message_exists = False
-        for msg in conversation:
-            if isinstance(msg, dict):
-                content = msg.get("content", "")
-            elif hasattr(msg, 'content'):
-                content = msg.content
-            else:
-                content = str(msg)
-            if "vague language" in content:
-                vague_message_exists = True
-                break
+        vague_message_exists = any("vague language" in message_role_content(msg)[1] for msg in conversation)
         if not vague_message_exists:
             # Build the message (should already be there, but just in case)
             message_lines = ["I noticed that your query contains some vague language:"]
@@ -743,35 +1393,26 @@ def display_results(state: SQLState):
     
     # If there's an error and it's not already in conversation, add it
     if error:
-        # Check if error is already in conversation (handle both dict and AIMessage)
-        error_exists = False
-        if conversation:
-            last_msg = conversation[-1]
-            if isinstance(last_msg, dict):
-                last_content = last_msg.get("content", "")
-            elif hasattr(last_msg, 'content'):
-                last_content = last_msg.content
-            else:
-                last_content = str(last_msg)
-            error_exists = (last_content == error)
+        # Check if error is already in conversation
+        error_exists = bool(conversation) and message_role_content(conversation[-1])[1] == error
         
         if not error_exists:
             conversation.append({"role": "assistant", "content": error})
     
     # Don't add unmatched conditions warning to conversation - it will be added to summary in api_server.py
     # This prevents duplication
-    
-    # Generate SQL explanation if we have results and a SQL query
-    sql_explanation = None
-    sql_query = state.get("sql_query")
-    user_query = state.get("user_query", "")
-    if results and sql_query and not error:
-        sql_explanation = generate_sql_explanation(sql_query, user_query)
+    return conversation
+
+def _display_update(state: SQLState, conversation, sql_explanation: Optional[str], unmatched_check: Dict[str, Any]):
+    error = state.get("error")
+    result_count = state.get("result_count")
+    vague_conditions = state.get("vague_conditions", [])
+    unmatched_warning = unmatched_check.get("unmatched_conditions_warning", state.get("unmatched_conditions_warning"))
     
     if error:
         print("❌ Query failed:", error)
-    elif results:
-        print(f"✅ Returned {len(results)} results")
+    elif result_count:
+        print(f"✅ Returned {result_count} results")
         if unmatched_warning:
             print(f"⚠️ Unmatched conditions warning: {unmatched_warning[:100]}...")
     elif vague_conditions:
@@ -781,23 +1422,90 @@ def display_results(state: SQLState):
     
     return {
         "conversation": conversation,
-        "sql_explanation": sql_explanation
+        "sql_explanation": sql_explanation,
+        "unmatched_conditions_warning": unmatched_warning
     }
 
+def _should_explain(state: SQLState) -> bool:
+    # Generate SQL explanation if we have results and a SQL query
+    return bool(state.get("result_count") and state.get("sql_query") and not state.get("error"))
+
+def display_results(state: SQLState, config: RunnableConfig):
+    """Final display node."""
+    conversation = _display_conversation(state)
+    sql_explanation = None
+    unmatched_check = {}
+    if _should_explain(state) and state.get("fast_path"):
+        # The parser describes its own conditions
+        sql_explanation = state.get("sql_explanation")
+    elif _should_explain(state):
+        sql_explanation = generate_sql_explanation(rendered_sql(state), state.get("user_query", ""))
+        # The unmatched-conditions check has been running since execute_sql; it is
+        # normally finished by now, so this wait adds no extra LLM round-trip
+        unmatched_check = collect_unmatched_check(state, config, block=True)
+    # Drop this search's check on every path (collect leaves it when it was started for other SQL)
+    discard_unmatched_check(config)
+    return _display_update(state, conversation, sql_explanation, unmatched_check)
+
+async def adisplay_results(state: SQLState, config: RunnableConfig):
+    """Async display_results."""
+    conversation = _display_conversation(state)
+    sql_explanation = None
+    unmatched_check = {}
+    if _should_explain(state) and state.get("fast_path"):
+        sql_explanation = state.get("sql_explanation")
+    elif _should_explain(state):
+        sql_explanation = await agenerate_sql_explanation(rendered_sql(state), state.get("user_query", ""))
+        unmatched_check = await acollect_unmatched_check(state, config, block=True)
+    discard_unmatched_check(config)
+    return _display_update(state, conversation, sql_explanation, unmatched_check)
+
 
 # --- GRAPH CONSTRUCTION ---
-graph = StateGraph(SQLState)
+# PARALLEL_FRONT_END=true runs topic_filter, contextual_query_understanding and
+# resolve_vague_conditions concurrently in a single fan-out/fan-in node
+PARALLEL_FRONT_END = os.getenv("PARALLEL_FRONT_END", "false").lower() == "true"
+# FUSED_FRONT_END=true does the same three steps in one structured-output call (takes precedence)
+FUSED_FRONT_END = os.getenv("FUSED_FRONT_END", "false").lower() == "true"
 
-graph.add_node("topic_filter", topic_filter)
-graph.add_node("resolve_vague_conditions", resolve_vague_conditions)
-graph.add_node("contextual_query_understanding", contextual_query_understanding)
-graph.add_node("generate_sql", generate_sql)
-graph.add_node("execute_sql", execute_sql)
-graph.add_node("validate_sql", validate_sql)
-graph.add_node("repair_sql", repair_sql)
-graph.add_node("display_results", display_results)
+graph = StateGraph(SQLState)
 
-graph.set_entry_point("topic_filter")
+def node(sync_fn, async_fn):
+    """Pick the sync or async implementation of a node based on ASYNC_NODES, timed under the sync name."""
+    return _stop_if_cancelled(timed(async_fn if ASYNC_NODES else sync_fn, sync_fn.__name__))
+
+def _stop_if_cancelled(fn):
+    """Refuse to start a node once the search's client has disconnected (see cancellation.py)."""
+    # functools.wraps keeps the signature LangGraph inspects to decide whether to pass config
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_node(*args, **kwargs):
+            raise_if_cancelled()
+            return await fn(*args, **kwargs)
+        return async_node
+
+    @functools.wraps(fn)
+    def sync_node(*args, **kwargs):
+        raise_if_cancelled()
+        return fn(*args, **kwargs)
+    return sync_node
+
+graph.add_node("parse_fast_path", node(parse_fast_path, aparse_fast_path))
+if FUSED_FRONT_END:
+    graph.add_node("fused_front_end", node(fused_front_end, afused_front_end))
+elif PARALLEL_FRONT_END:
+    graph.add_node("parallel_front_end", node(parallel_front_end, aparallel_front_end))
+else:
+    graph.add_node("topic_filter", node(topic_filter, atopic_filter))
+    graph.add_node("resolve_vague_conditions", node(resolve_vague_conditions, aresolve_vague_conditions))
+    graph.add_node("contextual_query_understanding", node(contextual_query_understanding, acontextual_query_understanding))
+graph.add_node("lookup_cached_sql", _stop_if_cancelled(timed(lookup_cached_sql, "lookup_cached_sql")))
+graph.add_node("generate_sql", node(generate_sql, agenerate_sql))
+graph.add_node("check_sql_plan", node(check_sql_plan, acheck_sql_plan))
+graph.add_node("execute_sql", node(execute_sql, aexecute_sql))
+graph.add_node("validate_sql", node(validate_sql, avalidate_sql))
+graph.add_node("repair_sql", node(repair_sql, arepair_sql))
+graph.add_node("display_results", node(display_results, adisplay_results))
 
 # Conditional routing after topic filter
 def route_after_topic_filter(state: SQLState):
@@ -809,18 +1517,6 @@ def route_after_topic_filter(state: SQLState):
     # If topic is relevant, go to contextual_query_understanding first
     return "contextual_query_understanding"
 
-graph.add_conditional_edges(
-    "topic_filter",
-    route_after_topic_filter,
-    {
-        "contextual_query_understanding": "contextual_query_understanding",
-        "display_results": "display_results"
-    }
-)
-
-# Direct edge: contextual_query_understanding → resolve_vague_conditions
-graph.add_edge("contextual_query_understanding", "resolve_vague_conditions")
-
 # Conditional routing after resolve_vague_conditions
 def route_after_vague_conditions(state: SQLState):
     """Route after vague conditions: continue if none detected, ask user if detected."""
@@ -830,29 +1526,116 @@ def route_after_vague_conditions(state: SQLState):
     if vague_conditions and len(vague_conditions) > 0:
         return "display_results"
     
-    # No vague conditions detected, proceed to generate_sql
+    # No vague conditions detected, check the SQL cache before generating
+    return "lookup_cached_sql"
+
+# Conditional routing after the joined front-end stage
+def route_after_front_end(state: SQLState):
+    """Route after the parallel or fused front end: stop on an off-topic query or vague conditions, otherwise continue."""
+    if state.get("relevant_query_topic") is False:
+        return "display_results"
+    return route_after_vague_conditions(state)
+
+# First node of the LLM front end
+FRONT_END_ENTRY = "fused_front_end" if FUSED_FRONT_END else "parallel_front_end" if PARALLEL_FRONT_END else "topic_filter"
+
+# Conditional routing after the fast-path parser
+def route_after_fast_path(state: SQLState):
+    """Route after the fast path: execute parsed SQL directly, otherwise start the LLM front end."""
+    if state.get("fast_path"):
+        return "execute_sql"
+    return FRONT_END_ENTRY
+
+graph.set_entry_point("parse_fast_path")
+graph.add_conditional_edges(
+    "parse_fast_path",
+    route_after_fast_path,
+    {
+        "execute_sql": "execute_sql",
+        FRONT_END_ENTRY: FRONT_END_ENTRY,
+    }
+)
+
+if FUSED_FRONT_END or PARALLEL_FRONT_END:
+    graph.add_conditional_edges(
+        FRONT_END_ENTRY,
+        route_after_front_end,
+        {
+            "lookup_cached_sql": "lookup_cached_sql",
+            "display_results": "display_results"
+        }
+    )
+else:
+    graph.add_conditional_edges(
+        "topic_filter",
+        route_after_topic_filter,
+        {
+            "contextual_query_understanding": "contextual_query_understanding",
+            "display_results": "display_results"
+        }
+    )
+
+    # Direct edge: contextual_query_understanding → resolve_vague_conditions
+    graph.add_edge("contextual_query_understanding", "resolve_vague_conditions")
+
+    graph.add_conditional_edges(
+        "resolve_vague_conditions",
+        route_after_vague_conditions,
+        {
+            "lookup_cached_sql": "lookup_cached_sql",
+            "display_results": "display_results"
+        }
+    )
+
+# Conditional routing after the SQL cache lookup
+def route_after_sql_cache(state: SQLState):
+    """Route after cache lookup: execute cached SQL directly on a hit, generate on a miss."""
+    if state.get("sql_cache_hit"):
+        return "execute_sql"
     return "generate_sql"
 
 graph.add_conditional_edges(
-    "resolve_vague_conditions",
-    route_after_vague_conditions,
+    "lookup_cached_sql",
+    route_after_sql_cache,
     {
-        "generate_sql": "generate_sql",
-        "display_results": "display_results"
+        "execute_sql": "execute_sql",
+        "generate_sql": "generate_sql"
     }
 )
-graph.add_edge("generate_sql", "execute_sql")
+graph.add_edge("generate_sql", "check_sql_plan")
 graph.add_edge("execute_sql", "validate_sql")
 
 # Conditional routing: if validation fails → repair_sql (with attempt limit)
 MAX_REPAIR_ATTEMPTS = 3
 
+# Conditional routing after the planner check
+def route_after_plan_check(state: SQLState):
+    """Route after the planner check: execute an accepted plan, otherwise repair (with attempt limit)."""
+    if not state.get("error"):
+        return "execute_sql"
+    if state.get("attempt", 0) < MAX_REPAIR_ATTEMPTS:
+        return "repair_sql"
+    return "display_results"
+
+graph.add_conditional_edges(
+    "check_sql_plan",
+    route_after_plan_check,
+    {
+        "execute_sql": "execute_sql",
+        "repair_sql": "repair_sql",
+        "display_results": "display_results"
+    }
+)
+
 def route_after_validate(state: SQLState):
     """Route after validation: repair if error and under attempt limit, otherwise display results"""
     error = state.get("error")
     attempt = state.get("attempt", 0)
     
-    if error and attempt < MAX_REPAIR_ATTEMPTS:
+    # Fast-path and compiled filter-spec SQL is exact, so no results is the answer rather than a bad
+    # query; an execution error (timeout, missing table, ...) is still repaired by the LLM
+    exact_sql = state.get("fast_path") or state.get("filter_spec")
+    if error and attempt < MAX_REPAIR_ATTEMPTS and not (exact_sql and error.startswith(ZERO_RESULTS_ERROR)):
         return "repair_sql"
     else:
         return "display_results"
@@ -866,11 +1649,21 @@ graph.add_conditional_edges(
     }
 )
 
-graph.add_edge("repair_sql", "execute_sql")
+graph.add_edge("repair_sql", "check_sql_plan")
 graph.add_edge("display_results", END)
 
-# Compile with MemorySaver for checkpointing (required for api_server.py)
-memory = MemorySaver()
+# Compile with a bounded checkpointer (required for api_server.py): sessions expire after
+# SESSION_TTL_SECONDS idle, the least recently used beyond SESSION_MAX_COUNT are evicted,
+# and with SESSION_STORE_PATH set evicted sessions are kept in SQLite instead of dropped
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH") or None
+memory = BoundedMemorySaver(
+    max_sessions=int(os.getenv("SESSION_MAX_COUNT", "500")),
+    ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "7200")),
+    sqlite_path=SESSION_STORE_PATH,
+    compact_interval_seconds=float(os.getenv("SESSION_COMPACT_INTERVAL_SECONDS", "600")),
+)
+if SESSION_STORE_PATH:
+    atexit.register(memory.flush)
 app = graph.compile(checkpointer=memory)
 
 
@@ -881,7 +1674,10 @@ if __name__ == "__main__":
         "user_query": "Find me all sites in Franklin county that are more than 20 acres and are not close to wetlands.",
         "expanded_query": None,
         "sql_query": None,
+        "sql_params": None,
+        "filter_spec": None,
         "results": None,
+        "result_ref": None,
         "error": None,
         "last_failed_sql": None,
         "attempt": 0,
@@ -0,0 +1,99 @@
+"""
+Times exclusion and overlap queries against the original geographic_features layers and
+their dissolved, subdivided *_subdivided companions. Both versions of each query must
+return the same parcels.
+
+Run from backend/: python tests/constraint_layer_benchmark.py
+"""
+from sqlalchemy import create_engine, text
+import dotenv
+import os
+import statistics
+import time
+dotenv.load_dotenv()
+user, password, host, port, db_name = os.environ["DB_USER"], os.environ["DB_PASSWORD"], "localhost", "5432", os.environ["DB_NAME"]
+
+engine = create_engine(f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db_name}")
+
+REPEATS = int(os.getenv("BENCHMARK_REPEATS", "3"))
+
+# Each query is written once with {layer} placeholders and run against both layer sets
+QUERIES = [
+    {
+        "name": "20+ acres in Franklin county, no wetlands",
+        "sql": """
+            SELECT pd.parcel_id
+            FROM parcels.parcel_details pd
+            WHERE pd.area_acres >= 20 AND pd.county_name = 'FRANKLIN'
+            AND NOT EXISTS (
+                SELECT 1 FROM {land_cover} lc
+                WHERE lc.class = 'wetland' AND ST_Intersects(pd.geometry_26986, lc.geometry_26986)
+            )
+            """
+    },
+    {
+        "name": "20+ acres in Worcester county, not in a floodplain or NHESP habitat",
+        "sql": """
+            SELECT pd.parcel_id
+            FROM parcels.parcel_details pd
+            WHERE pd.area_acres >= 20 AND pd.county_name = 'WORCESTER'
+            AND NOT EXISTS (
+                SELECT 1 FROM {flood_zones} fz WHERE ST_Intersects(pd.geometry_26986, fz.geometry_26986)
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM {priority_habitats} ph WHERE ST_Intersects(pd.geometry_26986, ph.geometry_26986)
+            )
+            """
+    },
+    {
+        "name": "30+ acres in Plymouth county, at least 2 km from wetlands",
+        "sql": """
+            SELECT pd.parcel_id
+            FROM parcels.parcel_details pd
+            WHERE pd.area_acres >= 30 AND pd.county_name = 'PLYMOUTH'
+            AND NOT EXISTS (
+                SELECT 1 FROM {land_cover} lc
+                WHERE lc.class = 'wetland' AND ST_DWithin(pd.geometry_26986, lc.geometry_26986, 2000)
+            )
+            """
+    },
+    {
+        "name": "15+ acres in Hampshire county touching open space or prime farmland",
+        "sql": """
+            SELECT pd.parcel_id
+            FROM parcels.parcel_details pd
+            WHERE pd.area_acres >= 15 AND pd.county_name = 'HAMPSHIRE'
+            AND (
+                EXISTS (SELECT 1 FROM {open_spaces} os WHERE ST_Intersects(pd.geometry_26986, os.geometry_26986))
+                OR EXISTS (SELECT 1 FROM {prime_farmland_soils} pf WHERE ST_Intersects(pd.geometry_26986, pf.geometry_26986))
+            )
+            """
+    },
+]
+
+LAYERS = ["land_cover", "flood_zones", "open_spaces", "priority_habitats", "prime_farmland_soils"]
+ORIGINAL = {layer: f"geographic_features.{layer}" for layer in LAYERS}
+SUBDIVIDED = {layer: f"geographic_features.{layer}_subdivided" for layer in LAYERS}
+
+
+def time_query(con, sql):
+    """Median wall time in seconds over REPEATS runs, plus the set of parcel_ids returned"""
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        parcel_ids = set(con.execute(text(sql)).scalars().all())
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), parcel_ids
+
+
+if __name__ == "__main__":
+    with engine.connect() as con:
+        print(f"{'query':<72} {'original':>10} {'subdivided':>11} {'speedup':>8}")
+        for query in QUERIES:
+            original_time, original_ids = time_query(con, query["sql"].format(**ORIGINAL))
+            subdivided_time, subdivided_ids = time_query(con, query["sql"].format(**SUBDIVIDED))
+
+            assert original_ids == subdivided_ids, f"Results differ for: {query['name']}"
+
+            speedup = original_time / subdivided_time if subdivided_time else float("inf")
+            print(f"{query['name']:<72} {original_time:>9.2f}s {subdivided_time:>10.2f}s {speedup:>7.1f}x")
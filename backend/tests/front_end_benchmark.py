@@ -0,0 +1,67 @@
+"""
+Times the three-call front end (topic_filter → contextual_query_understanding →
+resolve_vague_conditions, as run by the serial graph) against the single fused_front_end
+call, and reports where their relevance and vague-condition verdicts differ.
+
+Run from backend/: python tests/front_end_benchmark.py
+"""
+from sql_agent import (
+    topic_filter, contextual_query_understanding, resolve_vague_conditions, fused_front_end,
+)
+import os
+import statistics
+import time
+
+REPEATS = int(os.getenv("BENCHMARK_REPEATS", "3"))
+
+PREVIOUS_TURN = [
+    {"role": "user", "content": "Find parcels over 20 acres in Franklin county"},
+    {"role": "assistant", "content": "Find parcels over 20 acres in Franklin county"},
+]
+
+QUERIES = [
+    {"name": "specific first turn", "user_query": "Parcels over 20 acres in Franklin county within 1 mile of a substation"},
+    {"name": "vague first turn", "user_query": "Large parcels near transmission lines in Western Massachusetts"},
+    {"name": "off topic", "user_query": "What is the weather today in New York?"},
+    {"name": "follow-up", "user_query": "actually I want parcels greater than 30 acres", "conversation": PREVIOUS_TURN},
+]
+
+
+def serial_front_end(state):
+    """The updates of the serial graph's front end, stopping where its routing would"""
+    update = topic_filter(state)
+    if update.get("relevant_query_topic") is False:
+        return update
+    contextual = contextual_query_understanding(state)
+    vague = resolve_vague_conditions(state)
+    return {**update, **contextual, **vague}
+
+
+def time_front_end(front_end, state):
+    """Median wall time in seconds over REPEATS runs, plus the last update"""
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        update = front_end(dict(state))
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), update
+
+
+def verdict(update):
+    return (update.get("relevant_query_topic") is not False, len(update.get("vague_conditions") or []))
+
+
+if __name__ == "__main__":
+    print(f"{'query':<24} {'serial':>8} {'fused':>8} {'speedup':>8}  verdicts (relevant, vague)")
+    for query in QUERIES:
+        state = {"user_query": query["user_query"], "conversation": query.get("conversation", [])}
+        serial_time, serial_update = time_front_end(serial_front_end, state)
+        fused_time, fused_update = time_front_end(fused_front_end, state)
+
+        speedup = serial_time / fused_time if fused_time else float("inf")
+        match = "same" if verdict(serial_update) == verdict(fused_update) else "DIFFERENT"
+        print(f"{query['name']:<24} {serial_time:>7.2f}s {fused_time:>7.2f}s {speedup:>7.1f}x  "
+              f"{verdict(serial_update)} vs {verdict(fused_update)} {match}")
+        if serial_update.get("expanded_query") or fused_update.get("expanded_query"):
+            print(f"    serial rewrite: {serial_update.get('expanded_query')}")
+            print(f"    fused rewrite:  {fused_update.get('expanded_query')}")
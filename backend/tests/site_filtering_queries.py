@@ -173,7 +173,8 @@ if __name__ == "__main__":
         # Use invoke_app helper function with a thread_id for checkpointing
         results_dict = app.invoke(query, config=config)
 
-        len_results = len(results_dict['results'])
+        # The state holds only a preview of the rows; result_count is the full row count
+        len_results = results_dict['result_count'] or 0
 
         ground_truth, error = run_query(query['sql'], con)
         len_ground_truth = len(ground_truth)
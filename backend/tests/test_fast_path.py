@@ -0,0 +1,25 @@
+"""
+Run from backend/: python -m pytest tests/test_fast_path.py
+"""
+from fast_path import FastPathParser
+
+parser = FastPathParser(["Amherst"])
+
+
+def where_clause(query):
+    return parser.parse(query)[0].split("\nWHERE ")[1]
+
+
+def test_disjunctions_go_to_the_llm():
+    assert parser.parse("parcels over 20 acres or under 5 acres") is None
+    assert parser.parse("parcels in Franklin county or over 50 acres") is None
+    assert parser.parse("parcels within 1 mile of a substation or within 1 mile of a power line") is None
+
+
+def test_or_inside_a_recognized_phrase_is_still_handled():
+    assert "pd.county_name IN ('FRANKLIN', 'HAMPSHIRE')" in where_clause("parcels over 20 acres in Franklin or Hampshire county")
+    assert "pd.area_acres >= 20" in where_clause("parcels 20 acres or more in Amherst")
+
+
+def test_conditions_are_anded():
+    assert where_clause("parcels more than 20 acres in Franklin county") == "pd.area_acres > 20\n  AND pd.county_name = 'FRANKLIN';"
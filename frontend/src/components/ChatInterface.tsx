@@ -13,6 +13,7 @@ interface Message {
 }
 
 interface Parcel {
+  parcel_id?: string;
   address: string;
   county: string;
   acreage: number;
@@ -40,6 +41,9 @@ const SUGGESTED_PROMPTS = [
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
 
+// Streamed batches are shown on the map at most this often; every update re-renders all polygons
+const STREAM_MAP_UPDATE_MS = 1000;
+
 const ChatInterface = ({ onParcelsFound }: ChatInterfaceProps) => {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState("");
@@ -57,6 +61,14 @@ const ChatInterface = ({ onParcelsFound }: ChatInterfaceProps) => {
     setMessages(prev => [...prev, userMessage]);
     setInput("");
     setIsLoading(true);
+    // Pending map update for streamed parcels (see STREAM_MAP_UPDATE_MS)
+    let mapUpdateTimer: ReturnType<typeof setTimeout> | null = null;
+    const cancelMapUpdate = () => {
+      if (mapUpdateTimer !== null) {
+        clearTimeout(mapUpdateTimer);
+        mapUpdateTimer = null;
+      }
+    };
 
     try {
       console.log(`Sending request to ${API_BASE_URL}/api/search`);
@@ -69,7 +81,10 @@ const ChatInterface = ({ onParcelsFound }: ChatInterfaceProps) => {
         },
         body: JSON.stringify({ 
           query,
-          session_id: sessionId || undefined
+          session_id: sessionId || undefined,
+          stream: true,
+          // Simplified boundaries; full resolution is fetched when a parcel is clicked
+          detail: "medium"
         }),
       });
 
@@ -101,6 +116,16 @@ const ChatInterface = ({ onParcelsFound }: ChatInterfaceProps) => {
       const decoder = new TextDecoder();
       let buffer = '';
       let data: any = null;
+      // Parcels received so far in parcels_batch events
+      let streamedParcels: Parcel[] = [];
+      const scheduleMapUpdate = () => {
+        if (mapUpdateTimer !== null) return;
+        mapUpdateTimer = setTimeout(() => {
+          mapUpdateTimer = null;
+          // A new array so React sees the change
+          onParcelsFound(streamedParcels.slice());
+        }, STREAM_MAP_UPDATE_MS);
+      };
 
       if (!reader) {
         throw new Error('Response body is not readable');
@@ -123,6 +148,15 @@ const ChatInterface = ({ onParcelsFound }: ChatInterfaceProps) => {
               if (event.type === 'status') {
                 // Update current step
                 setCurrentStep(event.step);
+              } else if (event.type === 'parcels_batch') {
+                // Show parcels on the map as they arrive, batching map updates
+                streamedParcels.push(...event.parcels);
+                scheduleMapUpdate();
+              } else if (event.type === 'parcels_reset') {
+                // The query is being repaired; drop rows from the failed attempt
+                cancelMapUpdate();
+                streamedParcels = [];
+                onParcelsFound([]);
               } else if (event.type === 'result') {
                 // Final result received
                 data = event;
@@ -153,6 +187,13 @@ const ChatInterface = ({ onParcelsFound }: ChatInterfaceProps) => {
         throw new Error('No data received from server');
       }
 
+      // Streamed results only carry the summary; the parcels came in earlier batches
+      // and are passed to the map once below
+      cancelMapUpdate();
+      if (data.streamed) {
+        data.parcels = streamedParcels;
+      }
+
       console.log('Response from API:', data);
 
       // Store session ID for conversation continuity
@@ -224,6 +265,7 @@ const ChatInterface = ({ onParcelsFound }: ChatInterfaceProps) => {
       };
       setMessages(prev => [...prev, assistantErrorMessage]);
     } finally {
+      cancelMapUpdate();
       setIsLoading(false);
       setCurrentStep(null);
     }
@@ -15,6 +15,7 @@ L.Icon.Default.mergeOptions({
 });
 
 interface Parcel {
+  parcel_id?: string;
   address: string;
   county: string;
   acreage: number;
@@ -29,6 +30,8 @@ interface Parcel {
   };
 }
 
+const API_BASE_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
+
 interface MapViewProps {
   parcels: Parcel[];
   selectedParcel?: Parcel | null;
@@ -206,6 +209,33 @@ const MapView = ({ parcels, selectedParcel }: MapViewProps) => {
   // Basemap toggle state
   const [mapType, setMapType] = useState<"map" | "satellite">("map");
 
+  // Search results carry simplified geometry; full-resolution boundaries are loaded per parcel on click
+  const [fullGeometries, setFullGeometries] = useState<Record<string, Parcel["geometry"]>>({});
+
+  const loadFullGeometry = async (parcel: Parcel) => {
+    const parcelId = parcel.parcel_id;
+    if (!parcelId || fullGeometries[parcelId]) return;
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/parcels/${encodeURIComponent(parcelId)}`);
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const data = await response.json();
+      setFullGeometries(prev => ({ ...prev, [parcelId]: data.geometry }));
+    } catch (error) {
+      console.error(`MapView: Failed to load full geometry for parcel ${parcelId}:`, error);
+    }
+  };
+
+  const displayParcels = useMemo(
+    () => parcels.map(parcel =>
+      parcel.parcel_id && fullGeometries[parcel.parcel_id]
+        ? { ...parcel, geometry: fullGeometries[parcel.parcel_id] }
+        : parcel
+    ),
+    [parcels, fullGeometries]
+  );
+
   // Render parcel polygons - simplified and more robust
   const parcelPolygons = useMemo(() => {
     if (!parcels || parcels.length === 0) {
@@ -228,7 +258,7 @@ const MapView = ({ parcels, selectedParcel }: MapViewProps) => {
       isSelected: boolean;
     }> = [];
     
-    parcels.forEach((parcel, index) => {
+    displayParcels.forEach((parcel, index) => {
       // Skip if no geometry
       if (!parcel.geometry || !parcel.geometry.coordinates) {
         console.warn(`MapView: Parcel ${index} has no geometry`, {
@@ -277,7 +307,7 @@ const MapView = ({ parcels, selectedParcel }: MapViewProps) => {
           key: `${parcelKey}-${index}`,
           parcel,
           positions,
-          isSelected: selectedParcel === parcel
+          isSelected: selectedParcel === parcels[index]
         });
         
         console.log(`MapView: Successfully added polygon for parcel ${index}`);
@@ -291,7 +321,7 @@ const MapView = ({ parcels, selectedParcel }: MapViewProps) => {
     
     console.log(`MapView: Total polygons to render: ${polygons.length}`);
     return polygons;
-  }, [parcels, selectedParcel]);
+  }, [parcels, displayParcels, selectedParcel]);
 
   return (
     <div className="relative w-full h-full rounded-lg overflow-hidden" style={{ minHeight: "400px", height: "100%" }}>
@@ -346,6 +376,9 @@ const MapView = ({ parcels, selectedParcel }: MapViewProps) => {
                   weight: isSelected ? 3 : 2,
                 }}
                 eventHandlers={{
+                  click: () => {
+                    loadFullGeometry(parcel);
+                  },
                   add: () => {
                     console.log(`MapView: Polygon ${key} added to map`);
                   }
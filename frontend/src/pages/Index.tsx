@@ -8,6 +8,7 @@ import MapView from "@/components/MapView";
 import { HelpCircle } from "lucide-react";
 
 interface Parcel {
+  parcel_id?: string;
   address: string;
   county: string;
   acreage: number;